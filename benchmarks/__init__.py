@@ -0,0 +1,3 @@
+"""BromineCoreのベンチマーク
+
+`python -m benchmarks`で実行できます。"""
@@ -0,0 +1,43 @@
+import argparse
+from typing import Any
+
+from benchmarks.bench import cases, run_case_process
+from benchmarks.recording import load, synthetic
+
+
+def _format(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def _run(args: argparse.Namespace) -> None:
+    frames = load(args.file) if args.file else synthetic(args.count, reactions=args.reactions)
+    names = args.case or list(cases())
+
+    columns = [
+        "events_per_sec", "p50_ms", "p99_ms", "peak_traced_mb", "max_rss_mb", "reconnect_ms", "cpu_s", "bytes_on_wire"
+    ]
+    print(" ".join(f"{i:>16}" for i in ["case", *columns]))
+    for name in names:
+        result = run_case_process(name, frames, args.rate, args.speed, args.subnotes, args.memory)
+        print(" ".join(f"{i:>16}" for i in [name, *(_format(result[c]) for c in columns)]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="録画したストリーミングを流してBromineを計測する")
+    parser.add_argument("--file", default=None, help="recorderで録画したファイル、指定しない場合は合成したノート")
+    parser.add_argument("--count", type=int, default=20000, help="合成するノートの数")
+    parser.add_argument("--rate", type=float, default=None, help="一秒に流すフレームの数")
+    parser.add_argument("--speed", type=float, default=None, help="録画した時の間隔を再現して流す速さ(1.0で等速)")
+    parser.add_argument("--reactions", type=float, default=0.1, help="合成したノートに挟むnoteUpdatedの割合")
+    parser.add_argument("--subnotes", type=int, default=1000, help="再接続の計測で再送させるキャプチャの数")
+    parser.add_argument("--memory", action="store_true", help="tracemallocでメモリを測る(遅くなります)")
+    parser.add_argument("--case", action="append", default=[], help="計測する設定の名前(複数指定可)")
+    _run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import asyncio
+import multiprocessing
+import resource
+import statistics
+import time
+import tracemalloc
+from multiprocessing.connection import Connection
+from typing import Any, Optional
+
+from brcore import Bromine
+from brcore.codec import JsonCodec, OrjsonCodec, MsgspecCodec
+from brcore.connection import ConnectionOptions
+from brcore.dispatch import DispatchScheduler
+from brcore.reconnect import FixedDelay
+
+from benchmarks.recording import Recording
+from benchmarks.server import ServerProcess
+
+
+__all__ = ["cases", "run_case", "run_case_process"]
+
+
+def cases() -> dict[str, dict[str, Any]]:
+    """計測する設定の一覧"""
+    cases: dict[str, dict[str, Any]] = {
+        "json": {"codec": JsonCodec()},
+        "json+lazy": {"codec": JsonCodec(), "lazy_decode": True},
+        "json+scheduler": {"codec": JsonCodec(), "scheduler": DispatchScheduler()},
+        # 圧縮あり(websocketsのデフォルト)となしの比較
+        "json+deflate": {"codec": JsonCodec(), "connection_options": ConnectionOptions(compression=True)},
+        "json+nodeflate": {"codec": JsonCodec(), "connection_options": ConnectionOptions(compression=False)},
+    }
+    for name, codec in (("orjson", OrjsonCodec), ("msgspec", MsgspecCodec)):
+        try:
+            cases[name] = {"codec": codec()}
+            cases[f"{name}+lazy"] = {"codec": codec(), "lazy_decode": True}
+        except ImportError:
+            pass
+    return cases
+
+
+def _cpu_time() -> float:
+    """このプロセスが使ったCPU時間(サーバーは別のプロセスなので入らない)"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run_case(frames: Recording,
+                   options: dict[str, Any],
+                   rate: Optional[float] = None,
+                   speed: Optional[float] = None,
+                   subnotes: int = 1000,
+                   trace_memory: bool = False,
+                   timeout: float = 120.0,
+                   server_options: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    """一つの設定でBromine.mainに録画を流して計測する
+
+    Parameters
+    ----------
+    frames: Recording
+        流すフレーム
+    options: dict[str, Any]
+        Bromineに渡す引数
+    rate: :obj:`float`, optional
+        一秒に流すフレームの数、指定しない場合は全力で流す
+    speed: :obj:`float`, optional
+        録画した時の間隔を再現して流す速さ、rateを指定した場合はそちらが優先されます
+    subnotes: :obj:`int`, default 1000
+        再接続の計測の時に再送させるノートのキャプチャの数
+    trace_memory: :obj:`bool`, default False
+        tracemallocでメモリの最大使用量を測るかどうか(遅くなります)
+    timeout: :obj:`float`, default 120.0
+        全部受け取るまで待つ秒数
+    server_options: :obj:`dict[str, Any]`, optional
+        websockets.serveに渡す引数
+
+    Returns
+    -------
+    dict[str, Any]
+        events/sec, ディスパッチのレイテンシ(p50, p99), メモリ, 再接続にかかった時間,
+        流している間のCPU時間と実際に流れたバイト数等
+
+    Note
+    ----
+    サーバーは別のプロセスで動かすので、cpu_sはBromine側だけのCPU時間です。
+
+    max_rss_mbはこのプロセスが始まってからの最大なので、設定ごとに比べる時は
+    設定ごとにプロセスを分けて呼んでください(`python -m benchmarks`はそうしています)。"""
+    channels = {channel for _, channel, _ in frames if channel is not None}
+    # noteUpdatedが来るノートは全部キャプチャしておく
+    captures = list(dict.fromkeys(
+        body["body"]["id"] for _, channel, body in frames if channel is None and body.get("type") == "noteUpdated"
+    ))
+    expected = sum(
+        1 for _, channel, body in frames if channel is not None or body.get("type") == "noteUpdated"
+    )
+
+    async with ServerProcess(**(server_options or {})) as server:
+        latencies: list[float] = []
+        done = asyncio.Event()
+
+        async def handler(body: dict[str, Any]) -> None:
+            if (sent_at := body["body"].get("_sentAt")) is not None:
+                latencies.append(time.perf_counter() - sent_at)
+            if len(latencies) >= expected:
+                done.set()
+
+        async def noop(body: dict[str, Any]) -> None:
+            pass
+
+        brm = Bromine(server.instance, secure_connect=False, reconnect_policy=FixedDelay(0.0), **options)
+        for channel in channels:
+            brm.ws_connect(channel, handler)
+        for noteid in captures:
+            brm.ws_subnote(noteid, handler)
+        for i in range(subnotes):
+            brm.ws_subnote(f"bench{i}", noop)
+        await server.load(frames)
+
+        if trace_memory:
+            tracemalloc.start()
+        main_task = asyncio.create_task(brm.main())
+        try:
+            for channel in channels:
+                await server.wait_subscribers(channel, 1)
+            await server.wait_received("subNote", len(captures) + subnotes)
+
+            stats = await server.stats()
+            cpu_start = _cpu_time()
+            start = time.perf_counter()
+            await server.replay(rate, stamp=True, speed=speed)
+            await asyncio.wait_for(done.wait(), timeout)
+            elapsed = time.perf_counter() - start
+            cpu = _cpu_time() - cpu_start
+            peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+            after = await server.stats()
+
+            # 再接続して全部送り直すまでの時間
+            reconnect_start = time.perf_counter()
+            await server.drop_connections()
+            await server.wait_received("subNote", after["received"].get("subNote", 0) + len(captures) + subnotes)
+            reconnect_time = time.perf_counter() - reconnect_start
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+            main_task.cancel()
+            try:
+                await main_task
+            except asyncio.CancelledError:
+                pass
+
+    return {
+        "events": len(latencies),
+        "events_per_sec": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 0.5) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "peak_traced_mb": peak / 2**20 if peak is not None else None,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "reconnect_ms": reconnect_time * 1000,
+        "cpu_s": cpu,
+        "payload_bytes": after["bytes_sent"] - stats["bytes_sent"],
+        "bytes_on_wire": after["wire_bytes"] - stats["wire_bytes"],
+    }
+
+
+def _run_case_child(conn: Connection, name: str, frames: Recording, args: tuple[Any, ...]) -> None:
+    """run_case_processの子プロセスで動く関数"""
+    conn.send(asyncio.run(run_case(frames, cases()[name], *args)))
+    conn.close()
+
+
+def run_case_process(name: str, frames: Recording, *args: Any) -> dict[str, Any]:
+    """casesの設定の一つを新しいプロセスでrun_caseする
+
+    max_rss_mbが前に計測した設定の分を含まないように、設定ごとにプロセスを分けるためのものです。
+
+    Parameters
+    ----------
+    name: str
+        casesの設定の名前
+    frames: Recording
+        流すフレーム
+    *args: Any
+        run_caseに渡すrate以降の引数
+
+    Returns
+    -------
+    dict[str, Any]
+        run_caseの結果"""
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_run_case_child, args=(child, name, frames, args))
+    process.start()
+    child.close()
+    try:
+        return parent.recv()
+    finally:
+        process.join()
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import Optional
+
+import websockets
+
+from benchmarks.recording import Recording, save
+
+
+__all__ = ["record"]
+
+
+async def record(instance: str,
+                 channels: list[str],
+                 duration: float,
+                 token: Optional[str] = None,
+                 secure_connect: bool = True,
+                 capture: int = 0) -> Recording:
+    """本物のインスタンスのストリーミングを録画する
+
+    Parameters
+    ----------
+    instance: str
+        インスタンス名
+    channels: list[str]
+        録画するチャンネル名
+    duration: float
+        録画する秒数
+    token: :obj:`str`, optional
+        トークン
+    secure_connect: :obj:`bool`, default True
+        セキュアな接続をするかどうか
+    capture: :obj:`int`, default 0
+        流れてきたノートを最初からいくつキャプチャするか(noteUpdatedも録画するため)"""
+    url = f"{'wss' if secure_connect else 'ws'}://{instance}/streaming"
+    if token is not None:
+        url += f"?i={token}"
+
+    frames: Recording = []
+    async with websockets.connect(url) as ws:
+        # 識別id: チャンネル名
+        ids: dict[str, str] = {}
+        for channel in channels:
+            id = str(uuid.uuid4())
+            ids[id] = channel
+            await ws.send(json.dumps({"type": "connect", "body": {"channel": channel, "id": id, "params": {}}}))
+
+        loop = asyncio.get_running_loop()
+        end = loop.time() + duration
+        last = time.perf_counter()
+        captured = 0
+        while (remain := end - loop.time()) > 0:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), remain)
+            except asyncio.TimeoutError:
+                break
+            now = time.perf_counter()
+            frame = json.loads(raw)
+            if frame["type"] == "channel" and frame["body"].get("id") in ids:
+                body = frame["body"]
+                frames.append((now - last, ids[body["id"]], {"type": body["type"], "body": body["body"]}))
+                if body["type"] == "note" and captured < capture:
+                    captured += 1
+                    await ws.send(json.dumps({"type": "subNote", "body": {"id": body["body"]["id"]}}))
+            else:
+                frames.append((now - last, None, frame))
+            last = now
+    return frames
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="misskeyのストリーミングを録画する")
+    parser.add_argument("instance")
+    parser.add_argument("output")
+    parser.add_argument("--channel", action="append", default=[], help="録画するチャンネル名(複数指定可)")
+    parser.add_argument("--duration", type=float, default=60.0, help="録画する秒数")
+    parser.add_argument("--token", default=None)
+    parser.add_argument("--capture", type=int, default=0, help="キャプチャしてnoteUpdatedも録画するノートの数")
+    args = parser.parse_args()
+
+    frames = asyncio.run(
+        record(args.instance, args.channel or ["localTimeline"], args.duration, args.token, capture=args.capture)
+    )
+    save(args.output, frames)
+    print(f"recorded {len(frames)} frames to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
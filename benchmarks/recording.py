@@ -0,0 +1,91 @@
+import gzip
+import json
+import random
+import string
+from typing import Any, Iterator, Optional
+
+
+__all__ = ["Recording", "load", "save", "synthetic"]
+
+
+# tuple[前のフレームからの秒数, チャンネル名(channel以外の時None), 情報]
+Recording = list[tuple[float, Optional[str], dict[str, Any]]]
+
+
+def save(path: str, frames: Recording) -> None:
+    """録画したフレームをgzipしたjson linesで保存する"""
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for frame in frames:
+            f.write(json.dumps(frame, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
+
+
+def iter_load(path: str) -> Iterator[tuple[float, Optional[str], dict[str, Any]]]:
+    """保存したフレームを一つずつ読む"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            delta, channel, body = json.loads(line)
+            yield delta, channel, body
+
+
+def load(path: str) -> Recording:
+    """保存したフレームを全部読む"""
+    return list(iter_load(path))
+
+
+def _random_text(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice(string.ascii_letters + " ") for _ in range(length))
+
+
+def synthetic(count: int, channel: str = "localTimeline", seed: int = 0, reactions: float = 0.0) -> Recording:
+    """録画がない時用の、それっぽいノートのフレームを作る
+
+    Parameters
+    ----------
+    count: int
+        作るフレームの数
+    channel: :obj:`str`, default "localTimeline"
+        チャンネル名
+    seed: :obj:`int`, default 0
+        乱数のシード
+    reactions: :obj:`float`, default 0.0
+        ノートの後に、それより前のノートへのnoteUpdated(reacted)を挟む割合"""
+    rng = random.Random(seed)
+    frames: Recording = []
+    for i in range(count):
+        user_id = f"u{rng.randrange(500):04d}"
+        note = {
+            "id": f"9{i:09d}",
+            "createdAt": "2024-01-01T00:00:00.000Z",
+            "userId": user_id,
+            "user": {
+                "id": user_id,
+                "name": _random_text(rng, 8),
+                "username": user_id,
+                "host": None if rng.random() < 0.7 else "example.com",
+                "avatarUrl": f"https://example.com/avatar/{user_id}.webp",
+                "emojis": {},
+            },
+            "text": _random_text(rng, rng.randrange(10, 280)),
+            "cw": None,
+            "visibility": "public",
+            "renoteCount": rng.randrange(5),
+            "repliesCount": rng.randrange(5),
+            "reactionCount": 0,
+            "reactions": {},
+            "fileIds": [],
+            "files": [],
+            "replyId": None,
+            "renoteId": None,
+        }
+        frames.append((0.0, channel, {"type": "note", "body": note}))
+        if rng.random() < reactions:
+            frames.append((0.0, None, {
+                "type": "noteUpdated",
+                "body": {
+                    "id": f"9{rng.randrange(i + 1):09d}",
+                    "type": "reacted",
+                    "body": {"reaction": "👍", "emoji": None, "userId": f"u{rng.randrange(500):04d}"},
+                },
+            }))
+    return frames
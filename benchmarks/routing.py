@@ -0,0 +1,154 @@
+"""受信ループの振り分けだけを計測する
+
+websocketやデコードの重さを除くために小さいフレームを使い、
+タスクを作らないInlineHandlerで受け取ります。
+
+`--compare`をつけると、RoutingTableの代わりに以前の入れ子の辞書(type -> id -> 振り分け先)で
+同じフレームを振り分けた場合も計測します。
+
+`python -m benchmarks.routing`で実行できます。"""
+import argparse
+import json
+import time
+from typing import Any, Optional
+
+from brcore import Bromine
+from brcore.codec import JsonCodec
+from brcore.routing import ALLMATCH, Route, RoutingTable
+from brcore.util import BackgroundTasks, InlineHandler
+
+
+__all__ = ["run_routing"]
+
+
+class _Counter(InlineHandler):
+    def __init__(self) -> None:
+        self.count = 0
+
+    def push(self, body: Any) -> None:
+        self.count += 1
+        return None
+
+
+class _NestedTable:
+    """比べる用の、以前の入れ子の辞書での引き方"""
+
+    def __init__(self, table: RoutingTable) -> None:
+        # type: dict[id, Route]
+        self.__table: dict[str, dict[str, Route]] = {}
+        for route in table:
+            self.__table.setdefault(route.type, {})[route.id] = route
+
+    def lookup(self, type: str, id: Optional[str]) -> Optional[Route]:
+        if (id_dict := self.__table.get(type)) is None:
+            return None
+        if id and id in id_dict:
+            return id_dict[id]
+        return id_dict.get(ALLMATCH)
+
+
+def _frames(channels: list[str], notes: list[str], count: int) -> list[str]:
+    """チャンネル、キャプチャ、どこにも当てはまらないものを混ぜたフレーム"""
+    frames = []
+    for i in range(count):
+        if i % 4 == 3:
+            body = {"id": notes[i % len(notes)], "type": "reacted", "body": {"reaction": ":a:"}}
+            frames.append(json.dumps({"type": "noteUpdated", "body": body}))
+        elif i % 16 == 2:
+            frames.append(json.dumps({"type": "emojiAdded", "body": {"emoji": {"name": "a"}}}))
+        else:
+            body = {"id": channels[i % len(channels)], "type": "note", "body": {"id": f"{i}"}}
+            frames.append(json.dumps({"type": "channel", "body": body}))
+    return frames
+
+
+def run_routing(channels: int = 100,
+                notes: int = 10000,
+                count: int = 200000,
+                lazy_decode: bool = True,
+                fanout: int = 1,
+                repeat: int = 3,
+                nested: bool = False) -> dict[str, float]:
+    """振り分けの速さを計測する
+
+    Parameters
+    ----------
+    channels: :obj:`int`, default 100
+        接続するチャンネルの数
+    notes: :obj:`int`, default 10000
+        キャプチャするノートの数
+    count: :obj:`int`, default 200000
+        流すフレームの数
+    lazy_decode: :obj:`bool`, default True
+        Bromineのlazy_decode
+    fanout: :obj:`int`, default 1
+        一つのチャンネルに付けるハンドラーの数
+    repeat: :obj:`int`, default 3
+        計測する回数、一番速かったものを返す
+    nested: :obj:`bool`, default False
+        以前の入れ子の辞書で振り分けるかどうか(比べる用)
+
+    Returns
+    -------
+    dict[str, float]
+        frames_per_sec, delivered, lookup_ns
+
+        lookup_ns はデコードを除いた、振り分け先を引くだけにかかった一フレームあたりの時間です。"""
+    brm = Bromine("localhost", secure_connect=False, codec=JsonCodec(), lazy_decode=lazy_decode)
+    counter = _Counter()
+    channel_ids = [brm.ws_connect("localTimeline", counter) for _ in range(channels)]
+    if fanout > 1:
+        for id in channel_ids:
+            for _ in range(fanout - 1):
+                brm.ws_add_handler(id, counter)
+    note_ids = [f"note{i}" for i in range(notes)]
+    for note_id in note_ids:
+        brm.ws_subnote(note_id, counter)
+    brm._add_ws_type_id("emojiAdded", "ALLMATCH", counter)
+    if nested:
+        # 引き方だけを入れ替える
+        brm._Bromine__routes.lookup = _NestedTable(brm._Bromine__routes).lookup
+
+    frames = _frames(channel_ids, note_ids, count)
+    # 内部の振り分けだけを測るためにprivateなメソッドを直接呼ぶ
+    route = brm._Bromine__route
+    lookup = brm._Bromine__routes.lookup
+    codec = JsonCodec()
+    background_tasks = BackgroundTasks()
+    best = best_lookup = float("inf")
+    for _ in range(repeat):
+        counter.count = 0
+        start = time.perf_counter()
+        for raw in frames:
+            route(raw, background_tasks)
+        best = min(best, time.perf_counter() - start)
+
+        # 受信ループと同じくデコードしたばかりの(ハッシュを計算していない)文字列で引く
+        keys = [codec.peek(raw)[:2] for raw in frames]
+        start = time.perf_counter()
+        for type_, id in keys:
+            lookup(type_, id)
+        best_lookup = min(best_lookup, time.perf_counter() - start)
+    return {"frames_per_sec": count / best, "delivered": counter.count, "lookup_ns": best_lookup / count * 1e9}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="受信ループの振り分けだけを計測する")
+    parser.add_argument("--channels", type=int, default=100, help="接続するチャンネルの数")
+    parser.add_argument("--notes", type=int, default=10000, help="キャプチャするノートの数")
+    parser.add_argument("--count", type=int, default=200000, help="流すフレームの数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測する回数、一番速かったものを表示する")
+    parser.add_argument("--compare", action="store_true", help="以前の入れ子の辞書でも計測する")
+    args = parser.parse_args()
+
+    cases = [("eager", False, 1, False), ("lazy", True, 1, False), ("lazy+fanout4", True, 4, False)]
+    if args.compare:
+        cases[2:2] = [("nested eager", False, 1, True), ("nested lazy", True, 1, True)]
+    print(f"{'case':>16} {'frames_per_sec':>16} {'lookup_ns':>10} {'delivered':>10}")
+    for name, lazy, fanout, nested in cases:
+        result = run_routing(args.channels, args.notes, args.count, lazy, fanout, args.repeat, nested)
+        print(f"{name:>16} {result['frames_per_sec']:>16.0f} {result['lookup_ns']:>10.0f} {result['delivered']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import asyncio
+import json
+import multiprocessing
+import time
+from multiprocessing.connection import Connection
+from typing import Any, Optional
+
+import websockets
+
+from benchmarks.recording import Recording
+
+
+__all__ = ["StreamingServer", "ServerProcess"]
+
+
+class StreamingServer:
+    """misskeyの`/streaming`の代わりをするローカルのwebsocketサーバー
+
+    connect, disconnect, subNote, unsubNoteを理解して、
+    録画したフレームを接続しているチャンネルの識別idに書き換えて流します。
+
+    Parameters
+    ----------
+    host: :obj:`str`, default "localhost"
+        待ち受けるホスト
+    port: :obj:`int`, default 0
+        待ち受けるポート、0の場合空いているポート
+    **serve_options: Any
+        websockets.serveに渡す引数"""
+
+    def __init__(self, host: str = "localhost", port: int = 0, **serve_options: Any) -> None:
+        self.__host = host
+        self.__port = port
+        self.__serve_options = serve_options
+        self.__server: Optional[Any] = None
+        self.__connections: set[Any] = set()
+        # チャンネル名: set[tuple[connection, 識別id]]
+        self.__channels: dict[str, set[tuple[Any, str]]] = {}
+        # ノートID: キャプチャしているconnection
+        self.__notes: dict[str, set[Any]] = {}
+        # 接続が増えた時に起こすやつ
+        self.__changed = asyncio.Event()
+
+        # 受け取った情報の数(type: 数)
+        self.received: dict[str, int] = {}
+        # 送ったバイト数(圧縮前のメッセージの大きさ)
+        self.bytes_sent = 0
+        # 実際にソケットに書いたバイト数(圧縮後、フレームのヘッダー込み)
+        self.wire_bytes = 0
+
+    @property
+    def instance(self) -> str:
+        """Bromineに渡すインスタンス名"""
+        return f"{self.__host}:{self.__port}"
+
+    async def start(self) -> None:
+        self.__server = await websockets.serve(self.__handler, self.__host, self.__port, **self.__serve_options)
+        self.__port = next(iter(self.__server.sockets)).getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+    async def __aenter__(self) -> "StreamingServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.stop()
+
+    def subscribers(self, channel: str) -> int:
+        """チャンネルに接続している数"""
+        return len(self.__channels.get(channel, ()))
+
+    async def wait_subscribers(self, channel: str, count: int) -> None:
+        """チャンネルに接続している数がcount以上になるまで待つ"""
+        while self.subscribers(channel) < count:
+            self.__changed.clear()
+            await self.__changed.wait()
+
+    async def wait_received(self, type: str, count: int) -> None:
+        """type情報の情報をcount個受け取るまで待つ"""
+        while self.received.get(type, 0) < count:
+            await asyncio.sleep(0.001)
+
+    async def drop_connections(self) -> None:
+        """全ての接続を切る(再接続の計測用)"""
+        for ws in list(self.__connections):
+            await ws.close(code=1012, reason="restart")
+
+    async def replay(self,
+                     frames: Recording,
+                     rate: Optional[float] = None,
+                     stamp: bool = False,
+                     speed: Optional[float] = None) -> int:
+        """録画したフレームを流す
+
+        Parameters
+        ----------
+        frames: Recording
+            録画したフレーム
+        rate: :obj:`float`, optional
+            一秒に流すフレームの数、指定しない場合は全力で流す
+        stamp: :obj:`bool`, default False
+            ノートに送った時間(`_sentAt`、time.perf_counter)を書き込むかどうか
+        speed: :obj:`float`, optional
+            録画した時のフレームの間隔を再現して流す速さ(1.0で録画した時と同じ)
+
+            rateを指定した場合はそちらが優先されます。
+
+        Returns
+        -------
+        int
+            送ったフレームの数
+
+        Note
+        ----
+        noteUpdatedはそのノートをキャプチャしている接続にだけ流します。
+
+        time.perf_counterはLinux, macOS, Windowsではプロセスをまたいで比べられるので、
+        サーバーを別のプロセスで動かしても`_sentAt`からレイテンシを計算できます。"""
+        sent = 0
+        interval = 1 / rate if rate is not None else 0.0
+        start = time.perf_counter()
+        # 録画した時間で何秒目のフレームか
+        offset = 0.0
+        for delta, channel, body in frames:
+            offset += delta
+            if rate is None and speed is not None:
+                if (wait := start + offset / speed - time.perf_counter()) > 0:
+                    await asyncio.sleep(wait)
+            if channel is None and body.get("type") == "noteUpdated":
+                note = body.get("body", {})
+                targets = list(self.__notes.get(note.get("id"), ()))
+                if not targets:
+                    continue
+                if stamp and isinstance(note.get("body"), dict):
+                    body = {**body, "body": {**note, "body": {**note["body"], "_sentAt": time.perf_counter()}}}
+                messages = [json.dumps(body)] * len(targets)
+            elif channel is None:
+                messages = [json.dumps(body)]
+                targets = list(self.__connections)
+            else:
+                subs = self.__channels.get(channel, ())
+                if not subs:
+                    continue
+                if stamp and isinstance(body.get("body"), dict):
+                    body = {**body, "body": {**body["body"], "_sentAt": time.perf_counter()}}
+                targets = []
+                messages = []
+                for ws, id in subs:
+                    targets.append(ws)
+                    messages.append(json.dumps({"type": "channel", "body": {"id": id, **body}}))
+
+            for ws, message in zip(targets, messages):
+                try:
+                    await ws.send(message)
+                except websockets.ConnectionClosed:
+                    continue
+                self.bytes_sent += len(message)
+            sent += 1
+
+            if interval:
+                if (wait := start + sent * interval - time.perf_counter()) > 0:
+                    await asyncio.sleep(wait)
+            elif sent % 100 == 0:
+                # 受信側にも処理させる
+                await asyncio.sleep(0)
+        return sent
+
+    def __count_writes(self, transport: Any) -> None:
+        """ソケットに書いたバイト数を数えるようにする"""
+        write = transport.write
+        writelines = transport.writelines
+
+        def counted_write(data: bytes) -> None:
+            self.wire_bytes += len(data)
+            write(data)
+
+        def counted_writelines(datas: Any) -> None:
+            datas = list(datas)
+            self.wire_bytes += sum(len(i) for i in datas)
+            writelines(datas)
+
+        transport.write = counted_write
+        transport.writelines = counted_writelines
+
+    async def __handler(self, ws: Any) -> None:
+        self.__connections.add(ws)
+        self.__count_writes(ws.transport)
+        try:
+            async for message in ws:
+                frame = json.loads(message)
+                type_, body = frame["type"], frame.get("body", {})
+                self.received[type_] = self.received.get(type_, 0) + 1
+                if type_ == "connect":
+                    self.__channels.setdefault(body["channel"], set()).add((ws, body["id"]))
+                    self.__changed.set()
+                elif type_ == "disconnect":
+                    for subs in self.__channels.values():
+                        subs.discard((ws, body["id"]))
+                elif type_ == "subNote":
+                    self.__notes.setdefault(body["id"], set()).add(ws)
+                elif type_ == "unsubNote":
+                    self.__notes.get(body["id"], set()).discard(ws)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.__connections.discard(ws)
+            for subs in self.__channels.values():
+                for sub in [i for i in subs if i[0] is ws]:
+                    subs.discard(sub)
+            for watchers in self.__notes.values():
+                watchers.discard(ws)
+
+
+def _serve(conn: Connection, serve_options: dict[str, Any]) -> None:
+    """ServerProcessの中で動く関数、パイプから来た命令を順番に実行する"""
+    async def _main() -> None:
+        loop = asyncio.get_running_loop()
+        frames: Recording = []
+        async with StreamingServer(**serve_options) as server:
+            conn.send(server.instance)
+            while True:
+                command, args = await loop.run_in_executor(None, conn.recv)
+                if command == "stop":
+                    break
+                if command == "load":
+                    frames = args[0]
+                    result = len(frames)
+                elif command == "replay":
+                    result = await server.replay(frames, *args)
+                elif command == "stats":
+                    result: Any = {
+                        "received": server.received, "bytes_sent": server.bytes_sent, "wire_bytes": server.wire_bytes
+                    }
+                else:
+                    result = await getattr(server, command)(*args)
+                conn.send(result)
+        conn.send(None)
+
+    asyncio.run(_main())
+
+
+class ServerProcess:
+    """StreamingServerを別のプロセスで動かすやつ
+
+    計測するプロセスのCPU時間やメモリにサーバーの分が入らないようにするためのものです。
+    StreamingServerと同じ名前のメソッドを持ちますが、受け取った数等はstatsで取ってきます。
+    フレームを送る時間が計測に入らないように、流すフレームは先にloadで渡しておきます。
+
+    Parameters
+    ----------
+    **serve_options: Any
+        StreamingServerに渡す引数"""
+
+    def __init__(self, **serve_options: Any) -> None:
+        self.__serve_options = serve_options
+        self.__process: Optional[multiprocessing.process.BaseProcess] = None
+        self.__conn: Optional[Connection] = None
+        self.__instance = ""
+        # 命令は一つずつ
+        self.__lock = asyncio.Lock()
+
+    @property
+    def instance(self) -> str:
+        """Bromineに渡すインスタンス名"""
+        return self.__instance
+
+    async def start(self) -> None:
+        # forkだとイベントループの状態を引き継いでしまうのでspawn
+        context = multiprocessing.get_context("spawn")
+        self.__conn, child = context.Pipe()
+        self.__process = context.Process(target=_serve, args=(child, self.__serve_options), daemon=True)
+        self.__process.start()
+        child.close()
+        self.__instance = await asyncio.get_running_loop().run_in_executor(None, self.__conn.recv)
+
+    async def stop(self) -> None:
+        if self.__process is None:
+            return
+        try:
+            await self.__call("stop")
+        except (EOFError, OSError):
+            pass
+        await asyncio.get_running_loop().run_in_executor(None, self.__process.join, 5)
+        if self.__process.is_alive():
+            self.__process.kill()
+        self.__conn.close()
+        self.__process = None
+
+    async def __aenter__(self) -> "ServerProcess":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.stop()
+
+    async def wait_subscribers(self, channel: str, count: int) -> None:
+        await self.__call("wait_subscribers", channel, count)
+
+    async def wait_received(self, type: str, count: int) -> None:
+        await self.__call("wait_received", type, count)
+
+    async def drop_connections(self) -> None:
+        await self.__call("drop_connections")
+
+    async def load(self, frames: Recording) -> None:
+        """replayで流すフレームをサーバーのプロセスに送っておく"""
+        await self.__call("load", frames)
+
+    async def replay(self, rate: Optional[float] = None, stamp: bool = False, speed: Optional[float] = None) -> int:
+        """loadしたフレームを流す、引数はStreamingServer.replayと同じ"""
+        return await self.__call("replay", rate, stamp, speed)
+
+    async def stats(self) -> dict[str, Any]:
+        """received, bytes_sent, wire_bytes"""
+        return await self.__call("stats")
+
+    async def __call(self, command: str, *args: Any) -> Any:
+        async with self.__lock:
+            loop = asyncio.get_running_loop()
+            self.__conn.send((command, args))
+            return await loop.run_in_executor(None, self.__conn.recv)
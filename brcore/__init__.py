@@ -1,5 +1,15 @@
 from brcore.core import (
     Bromine,
 )
+from brcore.cluster import (
+    BromineCluster,
+)
+from brcore.manager import (
+    BromineManager,
+)
+from brcore.hub import (
+    BromineHub,
+    HubClient,
+)
 
-__all__ = ["Bromine"]
+__all__ = ["Bromine", "BromineCluster", "BromineManager", "BromineHub", "HubClient"]
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from functools import partial
+from http.client import HTTPConnection, HTTPSConnection
+from typing import Any, Awaitable, Callable, Optional
+
+from brcore.enum import (
+    ExceptionTexts,
+    MisskeyChannelNames
+)
+
+
+__all__ = ["Backfill", "TIMELINE_ENDPOINTS"]
+
+
+# チャンネル名: 取りこぼしを取りに行くAPIのエンドポイント
+TIMELINE_ENDPOINTS = {
+    MisskeyChannelNames.HOME_TIMELINE: "notes/timeline",
+    MisskeyChannelNames.LOCAL_TIMELINE: "notes/local-timeline",
+    MisskeyChannelNames.HYBRID_TIMELINE: "notes/hybrid-timeline",
+    MisskeyChannelNames.GLOBAL_TIMELINE: "notes/global-timeline",
+}
+
+
+class _HTTPPool:
+    """keep-aliveで使い回すHTTPコネクションの集まり
+
+    http.clientはスレッドセーフではないので、使っている間は一つのスレッドが専有します。"""
+
+    def __init__(self, host: str, secure: bool, size: int, timeout: float) -> None:
+        self.__host = host
+        self.__connection_class = HTTPSConnection if secure else HTTPConnection
+        self.__size = size
+        self.__timeout = timeout
+        self.__idle: list[HTTPConnection] = []
+        self.__lock = threading.Lock()
+
+    def post(self, path: str, body: dict[str, Any]) -> Any:
+        """POSTしてjsonを返す、別スレッドで実行されることを想定"""
+        with self.__lock:
+            conn = self.__idle.pop() if self.__idle else None
+        if conn is None:
+            conn = self.__connection_class(self.__host, timeout=self.__timeout)
+
+        try:
+            conn.request("POST", path, body=json.dumps(body), headers={"Content-Type": "application/json"})
+            res = conn.getresponse()
+            data = res.read()
+        except Exception:
+            # 壊れたコネクションは使い回さない
+            conn.close()
+            raise
+
+        with self.__lock:
+            if len(self.__idle) < self.__size:
+                self.__idle.append(conn)
+            else:
+                conn.close()
+
+        if res.status // 100 != 2:
+            raise RuntimeError(ExceptionTexts.HTTP_STATUS_INVALID, res.status, path)
+        return json.loads(data)
+
+    def close(self) -> None:
+        with self.__lock:
+            for conn in self.__idle:
+                conn.close()
+            self.__idle.clear()
+
+
+class _Track:
+    """チャンネルごとの最後に見たノートと、届いたノートの記録"""
+    __slots__ = ("endpoint", "params", "last_id", "seen", "seen_order")
+
+    def __init__(self, endpoint: str, params: dict[str, Any], seen_size: int) -> None:
+        self.endpoint = endpoint
+        self.params = params
+        self.last_id: Optional[str] = None
+        self.seen: set[str] = set()
+        self.seen_order: deque[str] = deque(maxlen=seen_size)
+
+
+class Backfill:
+    """再接続した時に、切れていた間のノートをAPIから取ってくるやつ
+
+    Bromineに渡すと、タイムラインのチャンネルごとに最後に見たノートのidを記録して、
+    再接続した時にそれより新しいノートをAPIからページごとに取ってきて同じ非同期関数に渡します。
+
+    Parameters
+    ----------
+    limit: :obj:`int`, default 100
+        一回のリクエストで取るノートの数
+    max_pages: :obj:`int`, default 10
+        一回の再接続で取りに行くページ数の上限
+    pool_size: :obj:`int`, default 2
+        使い回すHTTPコネクションの数
+    seen_size: :obj:`int`, default 1000
+        重複を弾くためにチャンネルごとに覚えておくノートの数
+    timeout: :obj:`float`, default 10.0
+        HTTPリクエストのタイムアウト(秒)
+
+    Raises
+    ------
+    ValueError
+        引数が正の値でない時
+
+    Note
+    ----
+    取ってきたノートは古い順に渡されます。
+    その間に受信したノートとは重複しないようにしますが、順番は前後することがあります。"""
+
+    def __init__(self,
+                 limit: int = 100,
+                 max_pages: int = 10,
+                 pool_size: int = 2,
+                 seen_size: int = 1000,
+                 timeout: float = 10.0) -> None:
+        if min(limit, max_pages, pool_size, seen_size, timeout) <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__limit = limit
+        self.__max_pages = max_pages
+        self.__pool_size = pool_size
+        self.__seen_size = seen_size
+        self.__timeout = timeout
+
+        self.__pool: Optional[_HTTPPool] = None
+        self.__token: Optional[str] = None
+        # 識別id: _Track
+        self.__tracks: dict[str, _Track] = {}
+
+        self.__logger = logging.getLogger("Bromine")
+        self.__log = partial(self.__logger.log, logging.DEBUG)
+
+    @property
+    def limit(self) -> int:
+        """一回のリクエストで取るノートの数"""
+        return self.__limit
+
+    @property
+    def max_pages(self) -> int:
+        """一回の再接続で取りに行くページ数の上限"""
+        return self.__max_pages
+
+    def configure(self, instance: str, token: Optional[str], secure_connect: bool) -> None:
+        """接続先を設定する
+
+        Bromineに渡した時に呼ばれるので普通は触らなくても大丈夫です。"""
+        if self.__pool is not None:
+            self.__pool.close()
+        self.__pool = _HTTPPool(instance, secure_connect, self.__pool_size, self.__timeout)
+        self.__token = token
+
+    def track(self, id: str, channel: str, params: dict[str, Any]) -> bool:
+        """チャンネルを記録し始める
+
+        Returns
+        -------
+        bool
+            取りこぼしを取りに行けるチャンネルだったかどうか"""
+        if (endpoint := TIMELINE_ENDPOINTS.get(channel)) is None:
+            return False
+        self.__tracks[id] = _Track(endpoint, params, self.__seen_size)
+        return True
+
+    def untrack(self, id: str) -> None:
+        """チャンネルの記録をやめる"""
+        self.__tracks.pop(id, None)
+
+    def last_id(self, id: str) -> Optional[str]:
+        """チャンネルで最後に見たノートのid"""
+        track = self.__tracks.get(id)
+        return track.last_id if track is not None else None
+
+    def observe(self, id: str, body: Any) -> bool:
+        """チャンネルに来た情報を記録する
+
+        Parameters
+        ----------
+        id: str
+            識別id
+        body: Any
+            チャンネルの情報(`{"id", "type", "body"}`)
+
+        Returns
+        -------
+        bool
+            渡すべき情報かどうか、すでに渡したノートの時False"""
+        if (track := self.__tracks.get(id)) is None or body.get("type") != "note":
+            return True
+        return self.__mark(track, body["body"]["id"])
+
+    async def fill(self, id: str, deliver: Callable[[dict[str, Any]], Awaitable[None]]) -> int:
+        """最後に見たノートより新しいノートを取ってきて渡す
+
+        Parameters
+        ----------
+        id: str
+            識別id
+        deliver: Callable[[dict[str, Any]], Awaitable[None]]
+            チャンネルの情報の形にしたノートを受け取る関数
+
+            渡したノートを見たことにするには、その中でobserveを呼んでください。
+
+        Returns
+        -------
+        int
+            渡したノートの数"""
+        if (track := self.__tracks.get(id)) is None or track.last_id is None or self.__pool is None:
+            # まだ一つも見てないので取りに行く基準がない
+            return 0
+
+        loop = asyncio.get_running_loop()
+        delivered = 0
+        since_id = track.last_id
+        for _ in range(self.__max_pages):
+            request = {**track.params, "sinceId": since_id, "limit": self.__limit}
+            if self.__token is not None:
+                request["i"] = self.__token
+            try:
+                notes = await loop.run_in_executor(None, self.__pool.post, f"/api/{track.endpoint}", request)
+            except Exception as e:
+                self.__log(f"backfill failed. id: {id}, error: {type(e)}, args: {e.args}")
+                break
+
+            # misskeyのidは同じ長さなら文字列の順番で古い順に並ぶ
+            notes.sort(key=lambda note: note["id"])
+            for note in notes:
+                # 見たことにするのは振り分ける側(observe)
+                if note["id"] not in track.seen:
+                    await deliver({"id": id, "type": "note", "body": note})
+                    delivered += 1
+            if len(notes) < self.__limit or self.__tracks.get(id) is not track:
+                break
+            since_id = notes[-1]["id"]
+
+        self.__log(f"backfill finished. id: {id}, count: {delivered}")
+        return delivered
+
+    def close(self) -> None:
+        """HTTPコネクションを閉じる"""
+        if self.__pool is not None:
+            self.__pool.close()
+
+    def tracked_ids(self) -> tuple[str, ...]:
+        """記録しているチャンネルの識別id"""
+        return tuple(self.__tracks)
+
+    def __mark(self, track: _Track, note_id: str) -> bool:
+        """ノートを見たことにする、すでに見ていた時False"""
+        if note_id in track.seen:
+            return False
+        if len(track.seen_order) == track.seen_order.maxlen:
+            track.seen.discard(track.seen_order[0])
+        track.seen_order.append(note_id)
+        track.seen.add(note_id)
+        if track.last_id is None or note_id > track.last_id:
+            track.last_id = note_id
+        return True
@@ -0,0 +1,126 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Coroutine, Optional
+
+from brcore.util import (
+    BackgroundTasks,
+    InlineHandler
+)
+from brcore.enum import (
+    ExceptionTexts
+)
+
+
+__all__ = ["BatchCollector"]
+
+
+class BatchCollector(InlineHandler):
+    """情報をまとめてから非同期関数に渡すハンドラー
+
+    個数が`max_size`に達するか、最初の情報が来てから`max_latency`秒経つと
+    溜まった情報をリストにして非同期関数を一回だけ実行します。
+
+    Parameters
+    ----------
+    func: CoroutineFunction
+        情報のリストを受け取る非同期関数
+    max_size: int
+        一回に渡す情報の最大数
+    max_latency: float
+        最初の情報が来てから渡すまでの最大の秒数
+
+    Raises
+    ------
+    TypeError
+        非同期関数funcがcoroutinefunctionでない時
+    ValueError
+        max_sizeかmax_latencyが正の値でない時
+
+    Note
+    ----
+    Bromine.ws_connect_batchで作った場合、まとめた情報は他のハンドラーと同じように
+    スケジューラー、HandlerGuard、Metricsを通して実行されます。"""
+
+    def __init__(self,
+                 func: Callable[[list[Any]], Coroutine[Any, Any, None]],
+                 max_size: int,
+                 max_latency: float) -> None:
+        if not asyncio.iscoroutinefunction(func):
+            raise TypeError(ExceptionTexts.FUNCTION_NOT_COROUTINEFUNC)
+        if max_size <= 0 or max_latency <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+
+        self.__func = func
+        self.__max_size = max_size
+        self.__max_latency = max_latency
+
+        self.__buffer: list[Any] = []
+        self.__timer: Optional[asyncio.TimerHandle] = None
+        # まとめた情報を渡す関数(bindで設定される)
+        self.__deliver: Optional[Callable[[list[Any]], None]] = None
+        self.__run: Optional[Callable[[list[Any]], Awaitable[None]]] = None
+        # bindされていない時に使うタスクの集合
+        self.__tasks = BackgroundTasks()
+
+    @property
+    def max_size(self) -> int:
+        """一回に渡す情報の最大数"""
+        return self.__max_size
+
+    @property
+    def max_latency(self) -> float:
+        """最初の情報が来てから渡すまでの最大の秒数"""
+        return self.__max_latency
+
+    @property
+    def buffered(self) -> int:
+        """溜まっている情報の数"""
+        return len(self.__buffer)
+
+    def bind(self,
+             deliver: Callable[[list[Any]], None],
+             run: Callable[[list[Any]], Awaitable[None]]) -> None:
+        """まとめた情報の渡し方を設定する、Bromine.ws_connect_batchで呼ばれるので普通は触らなくても大丈夫です
+
+        Parameters
+        ----------
+        deliver: Callable[[list[Any]], None]
+            まとめた情報を実行するように予約する関数
+        run: Callable[[list[Any]], Awaitable[None]]
+            まとめた情報をすぐに実行して終わるまで待つ関数(aclose用)"""
+        self.__deliver = deliver
+        self.__run = run
+
+    def push(self, body: Any) -> None:
+        self.__buffer.append(body)
+        if len(self.__buffer) >= self.__max_size:
+            self.flush()
+        elif self.__timer is None:
+            # 最初の一個なので時間切れの予約をする
+            self.__timer = asyncio.get_running_loop().call_later(self.__max_latency, self.flush)
+
+    def flush(self) -> None:
+        """溜まっている情報をすぐに渡す"""
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        if self.__buffer:
+            batch, self.__buffer = self.__buffer, []
+            if self.__deliver is not None:
+                self.__deliver(batch)
+            else:
+                self.__tasks.add(asyncio.create_task(self.__func(batch)))
+
+    def close(self) -> None:
+        """溜まっている情報を渡し切る"""
+        self.flush()
+
+    async def aclose(self) -> None:
+        """溜まっている情報を渡し切って、実行し終わるまで待つ
+
+        メイン関数が終わる時に、最後の情報がキャンセルされないようにするためのものです。"""
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        if self.__buffer:
+            batch, self.__buffer = self.__buffer, []
+            await (self.__run if self.__run is not None else self.__func)(batch)
@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from brcore.enum import (
+    ExceptionTexts
+)
+
+
+__all__ = ["CaptureLimiter"]
+
+
+class CaptureLimiter:
+    """ノートのキャプチャに期限と数の上限をつけるやつ
+
+    最後にnoteUpdatedが来た(もしくはキャプチャした)時間を覚えておき、
+    期限が切れたものや、数が上限を超えた時に一番使われていないものからキャプチャを解除します。
+
+    Parameters
+    ----------
+    ttl: :obj:`float`, optional
+        最後に反応があってからキャプチャを解除するまでの秒数
+    max_count: :obj:`int`, optional
+        キャプチャする数の上限
+    on_expire: :obj:`Callable[[str], None]`, optional
+        キャプチャを解除した時にノートIDを受け取る関数
+
+        受信ループの中やws_subnoteの中で呼ばれるので、重い処理はしないでください。
+
+    Raises
+    ------
+    ValueError
+        ttlかmax_countが正の値でない時"""
+
+    def __init__(self,
+                 ttl: Optional[float] = None,
+                 max_count: Optional[int] = None,
+                 on_expire: Optional[Callable[[str], None]] = None) -> None:
+        if (ttl is not None and ttl <= 0) or (max_count is not None and max_count <= 0):
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__ttl = ttl
+        self.__max_count = max_count
+        self.on_expire = on_expire
+        # ノートID: 最後に反応があった時間
+        self.__activity: OrderedDict[str, float] = OrderedDict()
+        self.__expired = 0
+
+    @property
+    def ttl(self) -> Optional[float]:
+        """最後に反応があってからキャプチャを解除するまでの秒数"""
+        return self.__ttl
+
+    @property
+    def max_count(self) -> Optional[int]:
+        """キャプチャする数の上限"""
+        return self.__max_count
+
+    @property
+    def expired(self) -> int:
+        """今までに解除した数"""
+        return self.__expired
+
+    def __len__(self) -> int:
+        return len(self.__activity)
+
+    def add(self, noteid: str) -> list[str]:
+        """キャプチャしたことを記録する
+
+        Returns
+        -------
+        list[str]
+            数の上限を超えたので解除するべきノートID"""
+        self.__activity[noteid] = time.monotonic()
+        self.__activity.move_to_end(noteid)
+        evicted = []
+        if self.__max_count is not None:
+            while len(self.__activity) > self.__max_count:
+                evicted.append(self.__activity.popitem(last=False)[0])
+        self.__expired += len(evicted)
+        return evicted
+
+    def touch(self, noteid: str) -> None:
+        """反応があったことを記録する"""
+        if noteid in self.__activity:
+            self.__activity[noteid] = time.monotonic()
+            self.__activity.move_to_end(noteid)
+
+    def remove(self, noteid: str) -> None:
+        """記録を消す"""
+        self.__activity.pop(noteid, None)
+
+    def collect_expired(self) -> list[str]:
+        """期限が切れたノートIDを取り出す"""
+        if self.__ttl is None:
+            return []
+        limit = time.monotonic() - self.__ttl
+        expired = []
+        while self.__activity:
+            noteid, last = next(iter(self.__activity.items()))
+            if last >= limit:
+                break
+            self.__activity.popitem(last=False)
+            expired.append(noteid)
+        self.__expired += len(expired)
+        return expired
@@ -0,0 +1,348 @@
+import asyncio
+import uuid
+import logging
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, NoReturn, Optional, Union, Coroutine
+
+from brcore.core import (
+    Bromine
+)
+from brcore.capture import (
+    CaptureLimiter
+)
+from brcore.filters import (
+    NoteFilter
+)
+from brcore.enum import (
+    ExceptionTexts,
+    Priority
+)
+
+
+__all__ = ["BromineCluster"]
+
+
+class _Subscription:
+    """クラスターが管理する接続の情報"""
+    __slots__ = (
+        "kind", "shard", "channel", "func", "executor", "callback", "note_filter", "typed", "priority", "params"
+    )
+
+    def __init__(self,
+                 kind: str,
+                 shard: int,
+                 channel: Optional[str],
+                 func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]],
+                 executor: Optional[Executor],
+                 callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]],
+                 note_filter: Optional[NoteFilter],
+                 typed: bool,
+                 priority: str,
+                 params: dict[str, Any]) -> None:
+        # "channel"か"note"
+        self.kind = kind
+        # どのBromineに載っているか
+        self.shard = shard
+        self.channel = channel
+        self.func = func
+        self.executor = executor
+        self.callback = callback
+        self.note_filter = note_filter
+        self.typed = typed
+        self.priority = priority
+        self.params = params
+
+
+class BromineCluster:
+    """複数のwebsocketに接続を振り分けるBromine
+
+    Bromineと同じ感じでws_connectやws_subnoteを使えます。
+    チャンネルやノートのキャプチャは一番接続の少ないwebsocketに振り分けられます。
+
+    Parameters
+    ----------
+    instance: str
+        インスタンス名
+    token: :obj:`str`, optional
+        トークン
+    connections: :obj:`int`, default 2
+        websocketの数
+    secure_connect: :obj:`bool`, default True
+        セキュアな接続をするかどうか
+    **options: Any
+        それぞれのBromineに渡す引数
+
+    Raises
+    ------
+    ValueError
+        connectionsが正の値でない時、もしくはjournalを渡した時
+
+    Note
+    ----
+    Journalは一つのBromineでしか使えないので、journalは渡せません。
+
+    capture_limiterを渡した場合、それぞれのBromineに同じ設定の別のCaptureLimiterを渡します。
+    max_countはwebsocketの数で割った数(切り上げ)がそれぞれの上限になります。
+    解除されたキャプチャはクラスターからも取り除かれてから、渡したCaptureLimiterのon_expireが呼ばれます。"""
+
+    def __init__(self,
+                 instance: str,
+                 token: Optional[str] = None,
+                 connections: int = 2,
+                 *,
+                 secure_connect: bool = True,
+                 **options: Any) -> None:
+        if connections <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        if options.get("journal") is not None:
+            raise ValueError(ExceptionTexts.JOURNAL_ALREADY_BOUND)
+
+        # 共有するとどのBromineのキャプチャか分からなくなるので、それぞれに作る
+        self.__capture_limiter: Optional[CaptureLimiter] = options.pop("capture_limiter", None)
+        self.__shards = [
+            Bromine(instance, token, secure_connect=secure_connect,
+                    capture_limiter=self.__shard_capture_limiter(connections), **options)
+            for _ in range(connections)
+        ]
+        # 識別id: _Subscription
+        self.__subscriptions: dict[str, _Subscription] = {}
+        # 接続の数
+        self.__loads = [0] * connections
+
+        # logger作成
+        self.__logger = logging.getLogger("Bromine")
+        self.__log = partial(self.__logger.log, logging.DEBUG)
+
+        for shard in self.__shards:
+            # 再接続したときに偏りを直す
+            shard.add_comeback(self.__comeback_rebalance)
+
+    @property
+    def shards(self) -> tuple[Bromine, ...]:
+        """中で動いているBromine達"""
+        return tuple(self.__shards)
+
+    @property
+    def loads(self) -> tuple[int, ...]:
+        """それぞれのwebsocketが持っている接続の数"""
+        return tuple(self.__loads)
+
+    @property
+    def is_running(self) -> bool:
+        """メイン関数が実行中かどうか"""
+        return any(shard.is_running for shard in self.__shards)
+
+    @property
+    def expect_info_func(self) -> Union[Callable[[dict[str, Any]], Coroutine[Any, Any, None]], None]:
+        """謎の場所からくる情報を受け取る非同期関数
+
+        全てのwebsocketで共通です。"""
+        return self.__shards[0].expect_info_func
+
+    @expect_info_func.setter
+    def expect_info_func(self, func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]]) -> None:
+        for shard in self.__shards:
+            shard.expect_info_func = func
+
+    @expect_info_func.deleter
+    def expect_info_func(self) -> None:
+        for shard in self.__shards:
+            del shard.expect_info_func
+
+    async def main(self) -> NoReturn:
+        """処理を開始する関数"""
+        self.__log(f"start cluster main. connections: {len(self.__shards)}")
+        tasks = [asyncio.create_task(shard.main()) for shard in self.__shards]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # どれかが死んだら全部止める
+            for task in tasks:
+                task.cancel()
+            self.__log("finish cluster main.")
+
+    def ws_connect(self,
+                   channel: str,
+                   func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]],
+                   id: Optional[str] = None,
+                   executor: Optional[Executor] = None,
+                   callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]] = None,
+                   note_filter: Optional[NoteFilter] = None,
+                   typed: bool = False,
+                   priority: str = Priority.NORMAL,
+                   **params: Any) -> str:
+        """channelに接続する関数
+
+        引数はBromine.ws_connectと同じです。
+
+        Returns
+        -------
+        str
+            識別id
+
+        Raises
+        -------
+        TypeError
+            非同期関数funcがcoroutinefunctionでない時
+        ValueError
+            idがすでに予約済みの場合、もしくはpriorityが不適の時"""
+        if id is None:
+            id = str(uuid.uuid4())
+        elif id in self.__subscriptions:
+            raise ValueError(ExceptionTexts.ID_ALREADY_RESERVED)
+
+        sub = _Subscription("channel", self.__least_loaded(), channel, func, executor, callback,
+                            note_filter, typed, priority, params)
+        self.__attach(id, sub)
+        return id
+
+    def ws_disconnect(self, id: str) -> None:
+        """チャンネルを接続解除する関数
+
+        Parameters
+        ----------
+        id: str
+            識別id
+
+        Raises
+        ------
+        ValueError
+            識別idが不適のとき"""
+        if (sub := self.__subscriptions.get(id)) is None or sub.kind != "channel":
+            raise ValueError(ExceptionTexts.ID_INVALID)
+        self.__detach(id, sub)
+        self.__subscriptions.pop(id)
+
+    def ws_subnote(self,
+                   noteid: str,
+                   func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]],
+                   executor: Optional[Executor] = None,
+                   callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]] = None,
+                   typed: bool = False) -> None:
+        """投稿をキャプチャする関数
+
+        引数はBromine.ws_subnoteと同じです。
+
+        Raises
+        ------
+        TypeError
+            非同期関数funcがcoroutinefunctionでない時
+        ValueError
+            もうすでにキャプチャしている時"""
+        if noteid in self.__subscriptions:
+            raise ValueError(ExceptionTexts.ID_ALREADY_RESERVED)
+
+        sub = _Subscription("note", self.__least_loaded(), None, func, executor, callback, None, typed, Priority.NORMAL, {})
+        self.__attach(noteid, sub)
+
+    def ws_unsubnote(self, noteid: str) -> None:
+        """ノートのキャプチャを解除する関数
+
+        Parameters
+        ----------
+        noteid: str
+            キャプチャのを解除するノートID
+
+        Raises
+        ------
+        ValueError
+            ノートIDがまだキャプチャされていないものの時"""
+        if (sub := self.__subscriptions.get(noteid)) is None or sub.kind != "note":
+            raise ValueError(ExceptionTexts.ID_INVALID)
+        self.__detach(noteid, sub)
+        self.__subscriptions.pop(noteid)
+
+    def ws_connect_deco(self, channel: str):
+        """ws_connectのデコレーター版
+
+        Parameters
+        ----------
+        channel: str
+            チャンネル名"""
+        if not isinstance(channel, str):
+            raise TypeError(ExceptionTexts.DECO_ARG_INVALID)
+
+        def _wrap(func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]]):
+            self.ws_connect(channel=channel, func=func)
+            return func
+
+        return _wrap
+
+    def ws_subnote_deco(self, noteid: str):
+        """ws_subnoteのデコレーター版
+
+        Parameters
+        ----------
+        noteid: str
+            ノートのid"""
+        if not isinstance(noteid, str):
+            raise TypeError(ExceptionTexts.DECO_ARG_INVALID)
+
+        def _wrap(func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]]):
+            self.ws_subnote(noteid=noteid, func=func)
+            return func
+
+        return _wrap
+
+    def rebalance(self) -> int:
+        """websocketごとの接続の数の偏りを直す
+
+        Returns
+        -------
+        int
+            移動した接続の数"""
+        moved = 0
+        while max(self.__loads) - min(self.__loads) > 1:
+            src = self.__loads.index(max(self.__loads))
+            dst = self.__loads.index(min(self.__loads))
+            id, sub = next((i, s) for i, s in self.__subscriptions.items() if s.shard == src)
+            self.__detach(id, sub)
+            sub.shard = dst
+            self.__attach(id, sub)
+            moved += 1
+        if moved:
+            self.__log(f"rebalance cluster. moved: {moved}, loads: {self.__loads}")
+        return moved
+
+    def __shard_capture_limiter(self, connections: int) -> Optional[CaptureLimiter]:
+        """Bromine一つ分のCaptureLimiterを作る"""
+        if (limiter := self.__capture_limiter) is None:
+            return None
+        max_count = -(-limiter.max_count // connections) if limiter.max_count is not None else None
+        return CaptureLimiter(limiter.ttl, max_count, self.__on_expire)
+
+    def __on_expire(self, noteid: str) -> None:
+        """Bromineがキャプチャを解除した時にクラスターからも取り除く"""
+        if (sub := self.__subscriptions.pop(noteid, None)) is not None:
+            self.__loads[sub.shard] -= 1
+        self.__log(f"cluster capture expired. id: {noteid}, loads: {self.__loads}")
+        if self.__capture_limiter.on_expire is not None:
+            self.__capture_limiter.on_expire(noteid)
+
+    async def __comeback_rebalance(self) -> None:
+        """comebackしたときに偏りを直すやつ"""
+        self.rebalance()
+
+    def __least_loaded(self) -> int:
+        return self.__loads.index(min(self.__loads))
+
+    def __attach(self, id: str, sub: _Subscription) -> None:
+        """接続をBromineに載せる"""
+        shard = self.__shards[sub.shard]
+        if sub.kind == "channel":
+            shard.ws_connect(sub.channel, sub.func, id, sub.executor, sub.callback, sub.note_filter, sub.typed,
+                             sub.priority, **sub.params)
+        else:
+            shard.ws_subnote(id, sub.func, sub.executor, sub.callback, sub.typed)
+        self.__subscriptions[id] = sub
+        self.__loads[sub.shard] += 1
+
+    def __detach(self, id: str, sub: _Subscription) -> None:
+        """接続をBromineから降ろす"""
+        shard = self.__shards[sub.shard]
+        if sub.kind == "channel":
+            shard.ws_disconnect(id)
+        else:
+            shard.ws_unsubnote(id)
+        self.__loads[sub.shard] -= 1
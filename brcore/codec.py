@@ -0,0 +1,123 @@
+import re
+import json
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+
+__all__ = ["JsonCodec", "OrjsonCodec", "MsgspecCodec", "get_default_codec"]
+
+
+# misskeyのフレームは`{"type":"...","body":{"id":"...",...}}`の順で来るので
+# 先頭だけ見てtype情報とbody.idを取り出す
+_PEEK_STR = re.compile(r'\{"type":"([^"\\]*)","body":(?:\{"id":"([^"\\]*)")?')
+_PEEK_BYTES = re.compile(rb'\{"type":"([^"\\]*)","body":(?:\{"id":"([^"\\]*)")?')
+# body.idで振り分けるので、idが取り出せなかったら全体をデコードするtype情報
+_PEEK_ID_TYPES = frozenset(("channel", "noteUpdated"))
+
+
+class JsonCodec:
+    """標準ライブラリのjsonを使うコーデック
+
+    独自のコーデックを作る場合はこれを継承して`loads`と`dumps`を上書きしてください"""
+    name = "json"
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """websocketから来た情報をデコードする"""
+        return json.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        """websocketへ送る情報をエンコードする
+
+        websocketにはテキストフレームで送るので必ずstrを返してください"""
+        return json.dumps(obj)
+
+    def peek(self, data: Union[str, bytes]) -> tuple[str, Optional[str], Optional[dict[str, Any]]]:
+        """type情報とbody.idだけを取り出す
+
+        Parameters
+        ----------
+        data: Union[str, bytes]
+            websocketから来た生の情報
+
+        Returns
+        -------
+        tuple[str, Optional[str], Optional[dict[str, Any]]]
+            type情報, body.id, デコード済みの情報
+
+        Note
+        ----
+        先頭から取り出せなかった場合は全体をデコードして、デコード済みの情報を返します。
+        channelとnoteUpdatedはbody.idが取り出せなかった場合(idが先頭にない、エスケープを含む等)も同じです。
+
+        取り出せた場合デコード済みの情報はNoneになるので、必要になったら`loads`してください。"""
+        if isinstance(data, str):
+            match = _PEEK_STR.match(data)
+            if match is not None and (match.group(2) is not None or match.group(1) not in _PEEK_ID_TYPES):
+                return match.group(1), match.group(2), None
+        else:
+            match = _PEEK_BYTES.match(data)
+            if match is not None:
+                type_, id_ = match.group(1).decode(), match.group(2)
+                if id_ is not None:
+                    return type_, id_.decode(), None
+                if type_ not in _PEEK_ID_TYPES:
+                    return type_, None, None
+
+        # 先頭の形が違うので普通にデコードする
+        frame = self.loads(data)
+        body = frame.get("body")
+        id_ = body.get("id") if isinstance(body, dict) else None
+        return frame["type"], id_, frame
+
+
+class OrjsonCodec(JsonCodec):
+    """orjsonを使うコーデック"""
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+    def dumps(self, obj: Any) -> str:
+        return orjson.dumps(obj).decode()
+
+
+class MsgspecCodec(JsonCodec):
+    """msgspecを使うコーデック"""
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        if msgspec is None:
+            raise ImportError("msgspec is not installed")
+        self.__decoder = msgspec.json.Decoder()
+        self.__encoder = msgspec.json.Encoder()
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return self.__decoder.decode(data)
+
+    def dumps(self, obj: Any) -> str:
+        return self.__encoder.encode(obj).decode()
+
+
+def get_default_codec() -> JsonCodec:
+    """インストールされている中で一番速いコーデックを返す
+
+    msgspec, orjson, jsonの順で探します"""
+    if msgspec is not None:
+        return MsgspecCodec()
+    elif orjson is not None:
+        return OrjsonCodec()
+    else:
+        return JsonCodec()
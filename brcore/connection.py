@@ -0,0 +1,70 @@
+from typing import Any, Optional
+
+from brcore.enum import (
+    ExceptionTexts
+)
+
+
+__all__ = ["ConnectionOptions"]
+
+
+class ConnectionOptions:
+    """websocketの接続の設定
+
+    Bromineのconnection_optionsに渡すとwebsockets.connectに渡されます。
+    指定しなかった項目はwebsocketsのデフォルトのままです。
+
+    Parameters
+    ----------
+    compression: :obj:`bool`, optional
+        permessage-deflateで圧縮するかどうか
+
+        圧縮すると通信量は大きく減りますが、展開する分CPUを使います。
+    max_size: :obj:`int`, optional
+        受け取るメッセージの大きさの上限(bytes)
+    max_queue: :obj:`int`, optional
+        読まれていないメッセージを溜めておく数の上限
+    write_limit: :obj:`int`, optional
+        書き込みバッファの大きさの上限(bytes)
+    open_timeout: :obj:`float`, optional
+        接続するまで待つ秒数
+    **extra: Any
+        その他websockets.connectに渡す引数
+
+        インストールされているwebsocketsが受け付けない引数を渡すと、接続する時にTypeErrorになります。
+
+    Raises
+    ------
+    ValueError
+        大きさや秒数が正の値でない時"""
+
+    def __init__(self,
+                 compression: Optional[bool] = None,
+                 max_size: Optional[int] = None,
+                 max_queue: Optional[int] = None,
+                 write_limit: Optional[int] = None,
+                 open_timeout: Optional[float] = None,
+                 **extra: Any) -> None:
+        for value in (max_size, max_queue, write_limit, open_timeout):
+            if value is not None and value <= 0:
+                raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.compression = compression
+        self.max_size = max_size
+        self.max_queue = max_queue
+        self.write_limit = write_limit
+        self.open_timeout = open_timeout
+        self.extra = extra
+
+    def to_kwargs(self) -> dict[str, Any]:
+        """websockets.connectに渡す引数にする"""
+        kwargs: dict[str, Any] = {}
+        if self.compression is not None:
+            kwargs["compression"] = "deflate" if self.compression else None
+        for name in ("max_size", "max_queue", "write_limit", "open_timeout"):
+            if (value := getattr(self, name)) is not None:
+                kwargs[name] = value
+        kwargs.update(self.extra)
+        return kwargs
+
+    def __repr__(self) -> str:
+        return f"ConnectionOptions({', '.join(f'{k}={v!r}' for k, v in self.to_kwargs().items())})"
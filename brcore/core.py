@@ -1,23 +1,93 @@
-import json
 import asyncio
+import gzip
+import json
+import time
 import uuid
 import logging
+from collections import deque
+from concurrent.futures import Executor
 from functools import partial
-from typing import Any, Callable, NoReturn, Optional, Union, Coroutine
+from typing import Any, Awaitable, Callable, Hashable, Iterable, NoReturn, Optional, Union, Coroutine
 
 import websockets
 
 from brcore.util import (
-    BackgroundTasks
+    BackgroundTasks,
+    InlineHandler,
+    executor_handler
+)
+from brcore.batch import (
+    BatchCollector
+)
+from brcore.stream import (
+    ChannelStream
+)
+from brcore.codec import (
+    JsonCodec,
+    get_default_codec
+)
+from brcore.dispatch import (
+    DispatchScheduler
+)
+from brcore.metrics import (
+    Metrics
+)
+from brcore.backfill import (
+    Backfill
+)
+from brcore.capture import (
+    CaptureLimiter
+)
+from brcore.connection import (
+    ConnectionOptions
+)
+from brcore.guard import (
+    HandlerGuard
+)
+from brcore.journal import (
+    Journal
+)
+from brcore.dedup import (
+    DedupCache
+)
+from brcore.routing import (
+    Route,
+    RoutingTable
+)
+from brcore.filters import (
+    NoteFilter
+)
+from brcore.models import (
+    decode_channel_event,
+    decode_note_updated,
+    typed_handler
+)
+from brcore.reconnect import (
+    FixedDelay,
+    ReconnectPolicy
 )
 from brcore.enum import (
-    ExceptionTexts
+    ExceptionTexts,
+    Priority
 )
 
 
 __all__ = ["Bromine"]
 
 
+if int(websockets.__version__.split(".")[0]) >= 14:
+    # 14からwebsockets.connectは新しいクライアントになり、InvalidStatusを投げる
+    _InvalidStatus = websockets.InvalidStatus
+
+    def _status_code(e: Exception) -> int:
+        return e.response.status_code
+else:
+    _InvalidStatus = websockets.InvalidStatusCode
+
+    def _status_code(e: Exception) -> int:
+        return e.status_code
+
+
 class Bromine:
     """misskeyのwebsocketAPIを使いやすくしたクラス
 
@@ -33,20 +103,149 @@ class Bromine:
         セキュアな接続をするかどうか
 
         これはローカルで構築したインスタンス等セキュアな接続が
-        不可能な場所で使うもので通常は切る必要がありません。"""
-
-    def __init__(self, instance: str, token: Optional[str] = None, *, secure_connect: bool = True) -> None:
+        不可能な場所で使うもので通常は切る必要がありません。
+    codec: :obj:`JsonCodec`, optional
+        jsonのエンコード、デコードに使うコーデック
+
+        指定しない場合、msgspec, orjson, jsonの中でインストールされているものを使います。
+    lazy_decode: :obj:`bool`, default False
+        type情報とbody.idだけを先に読み、振り分け先がある時だけ全体をデコードするかどうか
+    scheduler: :obj:`DispatchScheduler`, optional
+        振り分けた情報を実行するタスクの数を制限するスケジューラー
+
+        指定しない場合、情報が来るたびに上限なくタスクを作ります。
+    send_rate: :obj:`float`, optional
+        一秒間にwebsocketへ送る情報の数の上限
+
+        指定しない場合、溜まっている情報を間隔を空けずに送ります。
+    metrics: :obj:`Metrics`, optional
+        受信した数や処理時間等を記録するやつ
+
+        指定しない場合は何も記録しません。
+    heartbeat_interval: :obj:`float`, optional
+        接続中にpingを送る間隔(秒)
+
+        指定しない場合、接続した時しかpingを送りません。
+    pong_timeout: :obj:`float`, default 10.0
+        pingを送ってからpongが返ってくるのを待つ秒数、過ぎると再接続します
+    idle_timeout: :obj:`float`, optional
+        何も受信しないまま過ぎると再接続する秒数
+    reconnect_policy: :obj:`ReconnectPolicy`, optional
+        再接続するまでの待ち時間を決めるやつ
+
+        指定しない場合、cooltime秒待ち、5回より多く連続で失敗すると更に30秒待ちます。
+    backfill: :obj:`Backfill`, optional
+        再接続した時に、切れていた間のタイムラインのノートをAPIから取ってくるやつ
+    dedup: :obj:`DedupCache`, optional
+        複数のチャンネルから同じノートが来た時に一回だけ渡すためのキャッシュ
+
+        指定した場合、渡すノートの情報の`sources`に来たチャンネルの識別idの集合(:obj:`SourceView`)が入ります。
+        最初の一つを渡した後に他のチャンネルから来たものも、このビューに後から増えていきます。
+
+        指定しない場合、同じノートが来たチャンネルの数だけ渡されます。
+    capture_limiter: :obj:`CaptureLimiter`, optional
+        ノートのキャプチャに期限と数の上限をつけるやつ
+
+        指定しない場合、キャプチャはws_unsubnoteするまで残り続けます。
+    journal: :obj:`Journal`, optional
+        ハンドラーが追いつかない時に情報をディスクに逃がすやつ
+
+        指定しない場合、ハンドラーが追いつくまでタスクがメモリに溜まり続けます。
+
+        他のBromineと同じJournalは使えません。
+    connection_options: :obj:`ConnectionOptions`, optional
+        圧縮やメッセージの大きさの上限等、websocketの接続の設定
+
+        指定しない場合、websocketsのデフォルトのままです。
+    guard: :obj:`HandlerGuard`, optional
+        ハンドラーに時間制限をつけ、失敗が多いハンドラーへの情報を一時的に捨てるやつ
+
+        指定しない場合、ハンドラーの例外はタスクと一緒に消えます。"""
+
+    def __init__(self,
+                 instance: str,
+                 token: Optional[str] = None,
+                 *,
+                 secure_connect: bool = True,
+                 codec: Optional[JsonCodec] = None,
+                 lazy_decode: bool = False,
+                 scheduler: Optional[DispatchScheduler] = None,
+                 send_rate: Optional[float] = None,
+                 metrics: Optional[Metrics] = None,
+                 heartbeat_interval: Optional[float] = None,
+                 pong_timeout: float = 10.0,
+                 idle_timeout: Optional[float] = None,
+                 reconnect_policy: Optional[ReconnectPolicy] = None,
+                 backfill: Optional[Backfill] = None,
+                 dedup: Optional[DedupCache] = None,
+                 capture_limiter: Optional[CaptureLimiter] = None,
+                 journal: Optional[Journal] = None,
+                 connection_options: Optional[ConnectionOptions] = None,
+                 guard: Optional[HandlerGuard] = None) -> None:
         self.__COOL_TIME = 5
 
+        # jsonのエンコード、デコードをするやつ
+        self.__codec = codec if codec is not None else get_default_codec()
+        self.__lazy_decode = lazy_decode
+        # タスクの数を制限するやつ
+        self.__scheduler = scheduler
+
         # 値を保持するキューとか
         # uuid:tuple[isblock, coroutinefunc]
         self.__on_comebacks: dict[str, tuple[bool, Callable[[], Coroutine[Any, Any, None]]]] = {}
         # send_queueはここで作るとエラーが出るので型ヒントのみ
         self.__send_queue: asyncio.Queue[tuple[str, dict]]
-        # type: dict[id, coroutinefunc]
-        self.__ws_type_id_dict: dict[str, dict[str, Callable[[dict[str, Any]], Coroutine[Any, Any, None]]]] = {}
+        # 実行中のバックグラウンドタスクの集合、mainで作るので型ヒントのみ
+        self.__background_tasks: BackgroundTasks
+        # tuple[type, id]: 振り分け先
+        self.__routes = RoutingTable()
         # tuple[type, id]: body
         self.__ws_on_comebacks: dict[tuple[str, str], dict[str, Any]] = {}
+        # 相関id: list[tuple[返事を待っているFuture, 返事のtype(bodyのtype)]]
+        self.__pending_requests: dict[str, list[tuple[asyncio.Future, Optional[str]]]] = {}
+
+        # websockets.connectに渡す設定
+        self.__connection_options = connection_options if connection_options is not None else ConnectionOptions()
+
+        # ハンドラーを見張るやつ
+        self.__guard = guard
+        if metrics is not None and guard is not None:
+            metrics.gauge("guard_errors", lambda: guard.errors)
+            metrics.gauge("guard_open_circuits", lambda: len(guard.open_keys))
+
+        # 送る速さの上限
+        if send_rate is not None and send_rate <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__send_rate = send_rate
+        # 再接続の情報を送り始めた時間と、送り切るのにかかった時間
+        self.__resubscribe_start: Optional[float] = None
+        self.__last_resubscribe_time: Optional[float] = None
+
+        # 色々記録するやつ
+        self.__metrics = metrics
+        if metrics is not None:
+            metrics.gauge("send_queue_length", lambda: self.__send_queue.qsize() if self.__is_running else 0)
+            if scheduler is not None:
+                metrics.gauge("dispatch_queue_depth", lambda: scheduler.pending)
+                metrics.gauge("dispatch_in_flight", lambda: scheduler.in_flight)
+                metrics.gauge("dispatch_dropped", lambda: scheduler.dropped)
+
+        # 死んだ接続を見つけるための設定
+        for value in (heartbeat_interval, pong_timeout, idle_timeout):
+            if value is not None and value <= 0:
+                raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__heartbeat_interval = heartbeat_interval
+        self.__pong_timeout = pong_timeout
+        self.__idle_timeout = idle_timeout
+        # 最後に受信した時間(idle_timeoutが設定されている時用)
+        self.__last_recv = 0.0
+        # 受信ループがハンドラー待ちで止まっているかどうか(止まっている間は無通信とみなさない)
+        self.__recv_blocked = False
+        # 最近のpingのレイテンシ
+        self.__latencies: deque[float] = deque(maxlen=20)
+
+        # 再接続の待ち方
+        self.__reconnect_policy = reconnect_policy
 
         # 実行中かどうかの変数
         self.__is_running: bool = False
@@ -69,6 +268,30 @@ class Bromine:
         # 再接続する奴を設定
         self.add_comeback(self.__ws_comeback_reconnect, block=True)
 
+        # 重複を弾くやつ
+        self.__dedup = dedup
+        if metrics is not None and dedup is not None:
+            metrics.gauge("dedup_hit_rate", lambda: dedup.hit_rate)
+
+        # キャプチャを自動で解除するやつ
+        self.__capture_limiter = capture_limiter
+        if metrics is not None and capture_limiter is not None:
+            metrics.gauge("captures", lambda: len(capture_limiter))
+
+        # ディスクに逃がすやつ
+        self.__journal = journal
+        if journal is not None:
+            # 共有すると他のBromineの情報を取り出して捨ててしまう
+            journal.bind(self)
+        if metrics is not None and journal is not None:
+            metrics.gauge("journal_backlog_bytes", lambda: journal.backlog_bytes)
+
+        # 取りこぼしを取ってくるやつ
+        self.__backfill = backfill
+        if backfill is not None:
+            backfill.configure(instance, token, secure_connect)
+            self.add_comeback(self.__ws_comeback_backfill)
+
     @property
     def loglevel(self) -> int:
         """現在のログレベル"""
@@ -88,7 +311,91 @@ class Bromine:
         if time > 0:
             self.__COOL_TIME = time
         else:
-            ValueError("負の値です")
+            raise ValueError("負の値です")
+
+    @property
+    def reconnect_policy(self) -> Optional[ReconnectPolicy]:
+        """再接続するまでの待ち時間を決めるやつ
+
+        Noneの場合はcooltimeを使った今まで通りの待ち方をします"""
+        return self.__reconnect_policy
+
+    @reconnect_policy.setter
+    def reconnect_policy(self, policy: Optional[ReconnectPolicy]) -> None:
+        self.__reconnect_policy = policy
+
+    @property
+    def codec(self) -> JsonCodec:
+        """jsonのエンコード、デコードに使うコーデック"""
+        return self.__codec
+
+    @property
+    def scheduler(self) -> Optional[DispatchScheduler]:
+        """振り分けた情報を実行するタスクの数を制限するスケジューラー"""
+        return self.__scheduler
+
+    @property
+    def send_rate(self) -> Optional[float]:
+        """一秒間にwebsocketへ送る情報の数の上限"""
+        return self.__send_rate
+
+    @send_rate.setter
+    def send_rate(self, rate: Optional[float]) -> None:
+        if rate is not None and rate <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__send_rate = rate
+
+    @property
+    def last_resubscribe_time(self) -> Optional[float]:
+        """最後に再接続した時、接続の情報を送り切るのにかかった秒数"""
+        return self.__last_resubscribe_time
+
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        """受信した数や処理時間等を記録するやつ"""
+        return self.__metrics
+
+    @property
+    def latency(self) -> Optional[float]:
+        """最近のpingのレイテンシの平均(秒)、まだ測っていない時はNone"""
+        if not self.__latencies:
+            return None
+        return sum(self.__latencies) / len(self.__latencies)
+
+    @property
+    def latencies(self) -> tuple[float, ...]:
+        """最近のpingのレイテンシ(秒)、古い順"""
+        return tuple(self.__latencies)
+
+    @property
+    def backfill(self) -> Optional[Backfill]:
+        """再接続した時に、切れていた間のノートをAPIから取ってくるやつ"""
+        return self.__backfill
+
+    @property
+    def dedup(self) -> Optional[DedupCache]:
+        """複数のチャンネルから同じノートが来た時に一回だけ渡すためのキャッシュ"""
+        return self.__dedup
+
+    @property
+    def capture_limiter(self) -> Optional[CaptureLimiter]:
+        """ノートのキャプチャに期限と数の上限をつけるやつ"""
+        return self.__capture_limiter
+
+    @property
+    def guard(self) -> Optional[HandlerGuard]:
+        """ハンドラーに時間制限とサーキットブレーカーをつけるやつ"""
+        return self.__guard
+
+    @property
+    def connection_options(self) -> ConnectionOptions:
+        """websocketの接続の設定、変えた場合は次に接続する時から使われます"""
+        return self.__connection_options
+
+    @property
+    def journal(self) -> Optional[Journal]:
+        """ハンドラーが追いつかない時に情報をディスクに逃がすやつ"""
+        return self.__journal
 
     @property
     def is_running(self) -> bool:
@@ -120,12 +427,37 @@ class Bromine:
         # send_queueをinitで作るとattached to a different loopとかいうゴミでるのでここで宣言
         self.__send_queue = asyncio.Queue()
         # バックグラウンドタスクの集合
-        backgrounds = BackgroundTasks()
+        backgrounds = self.__background_tasks = BackgroundTasks()
+
+        if self.__scheduler is not None:
+            self.__scheduler.attach()
+        if self.__capture_limiter is not None and self.__capture_limiter.ttl is not None:
+            # 期限切れのキャプチャを掃除するやつ
+            backgrounds.add(asyncio.create_task(self.__capture_sweep_d()))
+        drain: Optional[asyncio.Task] = None
+        if self.__journal is not None:
+            # ディスクに逃がしたものを取り出すやつ(前回の残りもここで取り出す)
+            drain = asyncio.create_task(self.__journal_drain_d(backgrounds))
+            backgrounds.add(drain)
 
         try:
             await asyncio.create_task(self.__runner(backgrounds))
         finally:
+            # まとめて渡すハンドラーの残りはキャンセルする前に渡し切る
+            await self.__close_batches()
             backgrounds.tasks_cancel()
+            for route in self.__routes:
+                route.close()
+            if self.__scheduler is not None:
+                # 他のBromineと共有している時は最後の一つが終わった時だけ止まる
+                self.__scheduler.detach()
+            if self.__backfill is not None:
+                self.__backfill.close()
+            if drain is not None:
+                # 取り出している途中のものを振り分けた分だけcommitさせてから閉じる
+                await asyncio.gather(drain, return_exceptions=True)
+            if self.__journal is not None:
+                self.__journal.close()
             self.__is_running = False
             self.__log("finish main.")
 
@@ -138,14 +470,20 @@ class Bromine:
         wsd: Union[None, asyncio.Task] = None
         # comebacks(asyncio.gather)
         comebacks: Union[None, asyncio.Future] = None
+        # heartbeat_daemon(__heartbeat_d)
+        hbd: Union[None, asyncio.Task] = None
+        loop = asyncio.get_running_loop()
 
         while True:
+            # 再接続の前に起きた例外
+            error: Optional[BaseException] = None
             try:
-                async with websockets.connect(self.__WS_URL) as ws:
+                async with websockets.connect(self.__WS_URL, **self.__connection_options.to_kwargs()) as ws:
                     # ちゃんと通ってるかpingで確認
                     ping_wait = await ws.ping()
                     pong_latency = await ping_wait
                     self.__log(f"websocket connect success. latency: {pong_latency}s")
+                    self.__record_latency(pong_latency)
 
                     # comebacksの処理
                     cmbs: list[Coroutine[Any, Any, None]] = []
@@ -163,45 +501,56 @@ class Bromine:
                     # 送るdaemonの作成
                     wsd = asyncio.create_task(self.__ws_send_d(ws))
 
+                    # 死んだ接続を見つけるdaemonの作成
+                    if self.__heartbeat_interval is not None or self.__idle_timeout is not None:
+                        self.__last_recv = loop.time()
+                        hbd = asyncio.create_task(self.__heartbeat_d(ws))
+
                     # 接続に成功したということでfail_countを0に
                     connect_fail_count = 0
                     while True:
                         # データ受け取り
-                        data = json.loads(await ws.recv())
-                        if (type_ := data["type"]) in self.__ws_type_id_dict:
-                            if (id := data["body"].get("id")) and id in self.__ws_type_id_dict[type_]:
-                                background_tasks.add(asyncio.create_task(self.__ws_type_id_dict[type_][id](data["body"])))
-                            elif (wild_func := self.__ws_type_id_dict[type_].get("ALLMATCH")):
-                                # ワイルドカードがある時
-                                background_tasks.add(asyncio.create_task(wild_func(data["body"])))
-                            else:
-                                # type情報には載ってるけどidが一致しない...どういう状況だ？
-                                # expect_info_funcに流しておく
-                                if self.__expect_info_func is not None:
-                                    background_tasks.add(asyncio.create_task(self.__expect_info_func(data)))
-                        else:
-                            # 謎の場所からきた物
-                            if self.__expect_info_func is not None:
-                                background_tasks.add(asyncio.create_task(self.__expect_info_func(data)))
+                        raw = await ws.recv()
+                        if self.__idle_timeout is not None:
+                            self.__last_recv = loop.time()
+                        if self.__journal is not None and self.__spill(raw, background_tasks):
+                            # ディスクに逃がしたので後で振り分ける
+                            continue
+                        if (wait := self.__route(raw, background_tasks)) is not None:
+                            # ストリームの待ち行列が一杯なので空くまで受信を止める
+                            self.__recv_blocked = True
+                            try:
+                                await wait
+                            finally:
+                                self.__recv_blocked = False
+                            if self.__idle_timeout is not None:
+                                # 止まっていた時間は無通信に数えない
+                                self.__last_recv = loop.time()
 
             except asyncio.exceptions.TimeoutError as e:
                 # 接続がタイムアウトしたとき
                 self.__log(f"error occured: Timeout {e}")
-                self.__runner_exception_wait(connect_fail_count)
+                error = e
 
             except websockets.ConnectionClosed as e:
                 # websocketが勝手に切れたりしたとき
                 self.__log(f"error occured: Websocket Error [{e}]")
-                self.__runner_exception_wait(connect_fail_count)
+                error = e
 
-            except websockets.exceptions.InvalidStatusCode as e:
-                # ステータスコードが変な時
-                self.__log(f"error occured: Invalid Status Code [{e.status_code}]")
-                if e.status_code // 100 == 4:
+            except _InvalidStatus as e:
+                # ステータスコードが変な時(インスタンスの再起動中の502, 503とか)
+                status_code = _status_code(e)
+                self.__log(f"error occured: Invalid Status Code [{status_code}]")
+                if status_code // 100 == 4:
                     # 400番台
                     raise e
                 else:
-                    await self.__runner_exception_wait(connect_fail_count)
+                    error = e
+
+            except OSError as e:
+                # サーバーが落ちてて接続できない時とか
+                self.__log(f"error occured: Connection Error [{e}]")
+                error = e
 
             except Exception as e:
                 # 予定外のエラー発生時。
@@ -210,6 +559,8 @@ class Bromine:
 
             finally:
                 connect_fail_count += 1  # ここが処理されるのは何か例外が起きたときなので
+                if self.__metrics is not None:
+                    self.__metrics.inc("reconnects_total")
                 # 再接続する際、いろいろ初期化する
                 if isinstance(wsd, asyncio.Task):
                     # __ws_send_dを止める
@@ -219,6 +570,17 @@ class Bromine:
                     except asyncio.CancelledError:
                         pass
                     wsd = None
+                if isinstance(hbd, asyncio.Task):
+                    # __heartbeat_dを止める
+                    hbd.cancel()
+                    try:
+                        await hbd
+                    except asyncio.CancelledError:
+                        pass
+                    except Exception as e:
+                        # 再接続するのでログに出すだけ
+                        self.__log(f"heartbeat daemon error: {type(e)}, args: {e.args}")
+                    hbd = None
                 if comebacks is not None:
                     # ブロックしないcomebacksがもし生きていたら殺す
                     comebacks.cancel()
@@ -227,14 +589,322 @@ class Bromine:
                     except asyncio.CancelledError:
                         pass
                     comebacks = None
+                if self.__pending_requests:
+                    # 返事は来ないのでrequestを諦めさせる
+                    self.__log(f"fail pending requests. count: {len(self.__pending_requests)}")
+                    for waiters in self.__pending_requests.values():
+                        for future, _ in waiters:
+                            if not future.done():
+                                future.set_exception(ConnectionError(ExceptionTexts.REQUEST_CONNECTION_LOST))
+                    self.__pending_requests.clear()
+
+            # 後片付けが終わってから再接続まで待つ
+            await self.__runner_exception_wait(connect_fail_count, error)
+
+    async def __capture_sweep_d(self) -> NoReturn:
+        """期限切れのキャプチャを定期的に解除するdaemon"""
+        interval = min(max(self.__capture_limiter.ttl / 4, 0.1), 60)
+        while True:
+            await asyncio.sleep(interval)
+            for noteid in self.__capture_limiter.collect_expired():
+                self.__expire_capture(noteid)
+
+    def __pressure(self, background_tasks: BackgroundTasks) -> int:
+        """処理待ちの数"""
+        if self.__scheduler is not None:
+            return self.__scheduler.pending + self.__scheduler.in_flight
+        return len(background_tasks)
+
+    def __spill(self, raw: Union[str, bytes], background_tasks: BackgroundTasks) -> bool:
+        """溜まりすぎている時(か、順番を守るためにまだ残っている時)はディスクに逃がす
+
+        逃がした時(かrequestの返事として渡した時)はTrue"""
+        journal = self.__journal
+        if not journal.pending and self.__pressure(background_tasks) < journal.threshold:
+            return False
+        if self.__pending_requests:
+            # requestの返事は待たせるとタイムアウトするので先に渡す
+            _, id, frame = self.__codec.peek(raw)
+            if id in self.__pending_requests:
+                if frame is None:
+                    frame = self.__lazy_loads(raw)
+                if self.__reply(id, frame["body"]):
+                    return True
+        journal.append(raw)
+        if self.__metrics is not None:
+            self.__metrics.inc("journal_spilled_total")
+        return True
+
+    async def __journal_drain_d(self, background_tasks: BackgroundTasks) -> NoReturn:
+        """ハンドラーが追いついたらディスクから書いた順に取り出して振り分けるdaemon"""
+        journal = self.__journal
+        low = journal.threshold // 2
+        while True:
+            if not journal.pending or self.__pressure(background_tasks) > low:
+                await asyncio.sleep(0.05)
+                continue
+            frames = journal.read()
+            routed = 0
+            try:
+                for raw in frames:
+                    if (wait := self.__route(raw, background_tasks)) is not None:
+                        await wait
+                    routed += 1
+            finally:
+                # 途中で止められた時は振り分けた分だけ進める
+                journal.commit(routed)
+            if self.__metrics is not None:
+                self.__metrics.inc("journal_drained_total", value=len(frames))
+            if not journal.pending:
+                self.__log(f"journal drained. total: {journal.drained}")
+            # 受信ループにも処理させる
+            await asyncio.sleep(0)
+
+    def __limit_capture(self, noteid: str) -> None:
+        """キャプチャを記録して、上限を超えた分を解除する"""
+        if self.__capture_limiter is not None:
+            for evicted in self.__capture_limiter.add(noteid):
+                self.__expire_capture(evicted)
+
+    def __expire_capture(self, noteid: str) -> None:
+        """キャプチャを自動で解除する"""
+        if ("subNote", noteid) not in self.__ws_on_comebacks:
+            # もう解除されてる
+            return
+        self.ws_unsubnote(noteid)
+        self.__log(f"expire captured note. id: {noteid}")
+        if self.__metrics is not None:
+            self.__metrics.inc("captures_expired_total")
+        if self.__capture_limiter.on_expire is not None:
+            self.__capture_limiter.on_expire(noteid)
+
+    async def __heartbeat_d(self, ws: websockets.WebSocketClientProtocol) -> None:
+        """定期的にpingを送って、死んだ接続を切るdaemon"""
+        loop = asyncio.get_running_loop()
+        interval = self.__heartbeat_interval if self.__heartbeat_interval is not None else self.__idle_timeout
+        while True:
+            await asyncio.sleep(interval)
 
-    async def __runner_exception_wait(self, fail_count: int) -> None:
-        await asyncio.sleep(self.__COOL_TIME)
-        if fail_count > 5:
-            # Todo: 例外投げるべき？
-            #       死にすぎてる～っていう例外を投げるようにする設定を追加するべき？
-            #       現状30秒寝る
-            await asyncio.sleep(30)
+            if (self.__idle_timeout is not None
+                    and not self.__recv_blocked
+                    and loop.time() - self.__last_recv > self.__idle_timeout):
+                # 何も来てないので死んでいるとみなす
+                self.__log(f"websocket idle timeout. idle: {loop.time() - self.__last_recv}s")
+                break
+
+            if self.__heartbeat_interval is not None:
+                try:
+                    ping_wait = await ws.ping()
+                    self.__record_latency(await asyncio.wait_for(ping_wait, self.__pong_timeout))
+                except asyncio.TimeoutError:
+                    self.__log(f"websocket pong timeout. timeout: {self.__pong_timeout}s")
+                    break
+                except websockets.ConnectionClosed:
+                    # 受信ループの方で気付いて再接続するので何もしない
+                    return
+
+        if self.__metrics is not None:
+            self.__metrics.inc("heartbeat_timeouts_total")
+        # 閉じるとrecvが例外を投げて再接続される
+        await ws.close(code=1011, reason="heartbeat timeout")
+
+    def __record_latency(self, latency: float) -> None:
+        self.__latencies.append(latency)
+        if self.__metrics is not None:
+            self.__metrics.observe("ping_seconds", latency)
+
+    def __route(self, raw: Union[str, bytes], background_tasks: BackgroundTasks) -> Optional[Awaitable[None]]:
+        """websocketから来た情報を振り分ける
+
+        ストリームの待ち行列が一杯で待つ必要がある時だけawaitableを返す"""
+        if (metrics := self.__metrics) is not None:
+            start = time.perf_counter()
+        if self.__lazy_decode:
+            # type情報とbody.idだけ先に読む
+            type_, id, frame = self.__codec.peek(raw)
+        else:
+            frame = self.__codec.loads(raw)
+            type_ = frame["type"]
+            id = frame["body"].get("id") if isinstance(frame["body"], dict) else None
+        if metrics is not None:
+            metrics.observe("decode_seconds", time.perf_counter() - start)
+            # noteUpdatedとかはidの種類が多すぎるのでchannelだけidで分ける
+            metrics.inc("frames_received_total", (("type", type_), ("id", id if type_ == "channel" else "")))
+
+        if self.__pending_requests and id in self.__pending_requests:
+            if frame is None:
+                frame = self.__lazy_loads(raw)
+            if self.__reply(id, frame["body"]):
+                # requestの返事なので待っている人に渡した
+                return None
+
+        # 識別idが一致しない時はワイルドカードに
+        if (route := self.__routes.lookup(type_, id)) is not None:
+            if frame is None:
+                # 振り分け先があるのでここで初めてデコードする
+                frame = self.__lazy_loads(raw)
+            body = frame["body"]
+            if type_ == "channel" and not self.__channel_check(route, body):
+                return None
+            if type_ == "noteUpdated" and self.__capture_limiter is not None:
+                self.__capture_limiter.touch(route.id)
+            return self.__dispatch(route, body, background_tasks)
+
+        # 謎の場所からきた物
+        if self.__expect_info_func is not None:
+            if frame is None:
+                frame = self.__lazy_loads(raw)
+            labels = (("type", type_), ("priority", Priority.NORMAL))
+            return self.__deliver((type_, None), self.__expect_info_func, frame, labels, background_tasks)
+        return None
+
+    def __reply(self, id: str, body: dict[str, Any]) -> bool:
+        """requestの返事を待っている人に渡す、渡した時はTrue"""
+        waiters = self.__pending_requests[id]
+        for i, (future, reply_type) in enumerate(waiters):
+            if reply_type is not None and body.get("type") != reply_type:
+                continue
+            del waiters[i]
+            if not waiters:
+                del self.__pending_requests[id]
+            if not future.done():
+                future.set_result(body)
+            return True
+        # 待っている返事ではないので普通に振り分ける
+        return False
+
+    def __channel_check(self, route: Route, body: dict[str, Any]) -> bool:
+        """チャンネルの情報を渡すべきかどうか"""
+        id = route.id
+        # 取りこぼしの記録は渡すかどうかに関係なく、受信したもので進める
+        if self.__backfill is not None and not self.__backfill.observe(id, body):
+            # 取りこぼしを取ってきた時にもう受け取ってる
+            return False
+        if (note_filter := route.note_filter) is not None:
+            if not note_filter.check_channel(body):
+                # 条件に合わないのでタスクを作る前に捨てる
+                if self.__metrics is not None:
+                    self.__metrics.inc("filtered_total")
+                return False
+        if self.__dedup is not None and body.get("type") == "note":
+            note_id = body["body"]["id"]
+            if not self.__dedup.check(note_id, id):
+                # 他のチャンネルからもう来てる
+                if self.__metrics is not None:
+                    self.__metrics.inc("dedup_hits_total")
+                return False
+            # 最初の一つしか渡さないので、どのチャンネルから来たかは後から増えるビューで渡す
+            body["sources"] = self.__dedup.view(note_id)
+        return True
+
+    def __lazy_loads(self, raw: Union[str, bytes]) -> dict[str, Any]:
+        """後回しにしていたデコードをする"""
+        if self.__metrics is None:
+            return self.__codec.loads(raw)
+        start = time.perf_counter()
+        frame = self.__codec.loads(raw)
+        self.__metrics.observe("decode_seconds", time.perf_counter() - start)
+        return frame
+
+    def __dispatch(self, route: Route, body: Any, background_tasks: BackgroundTasks) -> Optional[Awaitable[None]]:
+        """振り分け先のハンドラー達に渡す"""
+        wait = route.push(body) if route.inline else None
+        if route.func is not None:
+            if (deliver_wait := self.__deliver(route.key, route.func, body, route.labels, background_tasks)) is not None:
+                wait = deliver_wait if wait is None else self.__wait_both(wait, deliver_wait)
+        return wait
+
+    @staticmethod
+    async def __wait_both(first: Awaitable[None], second: Awaitable[None]) -> None:
+        await first
+        await second
+
+    def __wrap(self,
+               key: Hashable,
+               func: Callable[[Any], Coroutine[Any, Any, None]],
+               labels: tuple[tuple[str, str], ...]) -> Optional[Callable[[Any], Coroutine[Any, Any, None]]]:
+        """ガードとメトリクスを挟む、ガードに捨てられた時はNone"""
+        if self.__guard is not None and not self.__guard.allow(key):
+            # 失敗が多いのでタスクを作る前に捨てる
+            if self.__metrics is not None:
+                self.__metrics.inc("shed_total", labels[:1])
+            return None
+        if self.__metrics is not None:
+            # 処理時間を測るやつを挟む(ガードが例外を飲み込む前に数えるため内側に)
+            func = partial(self.__measure, func, labels, time.perf_counter())
+        if self.__guard is not None:
+            func = partial(self.__guard.run, key, func)
+        return func
+
+    def __deliver(self,
+                  key: Hashable,
+                  func: Union[Callable[[Any], Coroutine[Any, Any, None]], InlineHandler],
+                  arg: Any,
+                  labels: tuple[tuple[str, str], ...],
+                  background_tasks: BackgroundTasks) -> Optional[Awaitable[None]]:
+        """振り分けた情報を実行する"""
+        if isinstance(func, InlineHandler):
+            # タスクを作らずに直接渡す
+            return func.push(arg)
+        if (func := self.__wrap(key, func, labels)) is None:
+            return None
+        if self.__scheduler is not None:
+            self.__scheduler.submit(key, func, arg)
+            return None
+        background_tasks.add(asyncio.create_task(func(arg)))
+        return None
+
+    def __deliver_batch(self,
+                        route: Route,
+                        func: Callable[[list[Any]], Coroutine[Any, Any, None]],
+                        batch: list[Any]) -> None:
+        """BatchCollectorがまとめた情報を他のハンドラーと同じように実行する"""
+        self.__deliver(route.key, func, batch, route.labels, self.__background_tasks)
+
+    async def __run_batch(self,
+                          route: Route,
+                          func: Callable[[list[Any]], Coroutine[Any, Any, None]],
+                          batch: list[Any]) -> None:
+        """BatchCollectorの最後の情報を、スケジューラーを通さずにガードとメトリクスだけ通して実行する"""
+        if (func := self.__wrap(route.key, func, route.labels)) is not None:
+            await func(batch)
+
+    async def __close_batches(self) -> None:
+        """BatchCollectorに溜まっている情報を渡し切って、終わるまで待つ"""
+        for route in tuple(self.__routes):
+            for handler in route.inline:
+                if isinstance(handler, BatchCollector):
+                    try:
+                        await handler.aclose()
+                    except Exception as e:
+                        self.__log(f"batch handler error occured. id: {route.id}, error: {type(e)}, args: {e.args}")
+
+    async def __measure(self,
+                        func: Callable[[Any], Coroutine[Any, Any, None]],
+                        labels: tuple[tuple[str, str], ...],
+                        queued: float,
+                        arg: Any) -> None:
+        """ハンドラーの処理時間と例外、実行されるまで待った時間を記録する"""
+        start = time.perf_counter()
+        self.__metrics.observe("dispatch_wait_seconds", start - queued, labels[1:])
+        try:
+            await func(arg)
+        except Exception:
+            self.__metrics.inc("handler_exceptions_total", labels)
+            raise
+        finally:
+            self.__metrics.observe("handler_seconds", time.perf_counter() - start, labels)
+
+    async def __runner_exception_wait(self, fail_count: int, error: Optional[BaseException]) -> None:
+        """再接続するまで待つ
+
+        reconnect_policyが再接続を諦めた時はReconnectGiveUpが投げられる"""
+        policy = self.__reconnect_policy
+        if policy is None:
+            # 指定がない時は今まで通り
+            policy = FixedDelay(self.__COOL_TIME)
+        self.__log(f"wait for reconnect. attempt: {fail_count}")
+        await policy.wait(fail_count, error)
 
     def add_comeback(self,
                      func: Callable[[], Coroutine[Any, Any, None]],
@@ -302,18 +972,68 @@ class Bromine:
 
     async def __ws_send_d(self, ws: websockets.WebSocketClientProtocol) -> NoReturn:
         """websocketの情報を送るdaemon"""
+        loop = asyncio.get_running_loop()
+        # 次に送ってもいい時間(send_rateが設定されている時用)
+        next_send = 0.0
         while True:
-            type_, body_ = await self.__send_queue.get()
-            await ws.send(json.dumps({
-                "type": type_,
-                "body": body_
-            }))
+            # 溜まっている分を全部取り出してまとめてエンコードする
+            queued = [await self.__send_queue.get()]
+            while not self.__send_queue.empty():
+                queued.append(self.__send_queue.get_nowait())
+            messages = [self.__codec.dumps({"type": type_, "body": body_}) for type_, body_ in queued]
+
+            if self.__send_rate is None:
+                # 間にawaitを挟まずに書き込んでまとめて流す
+                for message in messages:
+                    await ws.send(message)
+            else:
+                # サーバーに怒られないように間隔を空けて送る
+                interval = 1 / self.__send_rate
+                for message in messages:
+                    if (wait := next_send - loop.time()) > 0:
+                        await asyncio.sleep(wait)
+                    await ws.send(message)
+                    # sleepの誤差で遅れた分は少しだけ取り戻せるようにする
+                    next_send = max(next_send, loop.time() - interval * 10) + interval
+
+            if self.__resubscribe_start is not None and self.__send_queue.empty():
+                # 再接続の情報を送り切った
+                self.__last_resubscribe_time = loop.time() - self.__resubscribe_start
+                self.__resubscribe_start = None
+                self.__log(f"resubscribe finished. count: {len(self.__ws_on_comebacks)}, "
+                           f"time: {self.__last_resubscribe_time}s")
 
     async def __ws_comeback_reconnect(self) -> None:
         """comebackしたときに再接続するやつ"""
+        self.__resubscribe_start = asyncio.get_running_loop().time()
         for i, body in self.__ws_on_comebacks.items():
             self._ws_send(i[0], body)
 
+    async def __ws_comeback_backfill(self) -> None:
+        """comebackしたときに取りこぼしを取ってくるやつ"""
+        for id in self.__backfill.tracked_ids():
+            try:
+                await self.__backfill.fill(id, partial(self.__backfill_deliver, id))
+            except Exception as e:
+                # 他のチャンネルの取りこぼしは取りに行く
+                self.__log(f"backfill error occured. id: {id}, error: {type(e)}, args: {e.args}")
+
+    async def __backfill_deliver(self, id: str, body: dict[str, Any]) -> None:
+        """取ってきたノートを受信したものと同じように振り分ける"""
+        if (route := self.__routes.get("channel", id)) is None:
+            # 取ってくる間に接続解除された
+            return
+        try:
+            # フィルター、重複の確認(と取りこぼしの記録)も受信したものと同じ
+            if not self.__channel_check(route, body):
+                return
+            if (wait := self.__dispatch(route, body, self.__background_tasks)) is not None:
+                # ストリームの待ち行列が一杯なので空くまで待つ
+                await wait
+        except Exception as e:
+            # 一つのノートで残りを止めない
+            self.__log(f"backfill deliver error occured. id: {id}, error: {type(e)}, args: {e.args}")
+
     def _add_ws_reconnect(self, type: str, id: str, body: dict[str, Any]) -> None:
         """接続しなおした時に再接続(情報を送る)する物を追加する
 
@@ -364,7 +1084,10 @@ class Bromine:
         else:
             raise ValueError(ExceptionTexts.TYPE_AND_ID_INVALID)
 
-    def _add_ws_type_id(self, type: str, id: str, func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]]) -> None:
+    def _add_ws_type_id(self,
+                        type: str,
+                        id: str,
+                        func: Union[Callable[[dict[str, Any]], Coroutine[Any, Any, None]], InlineHandler]) -> None:
         """websocketの情報を振り分ける辞書に追加する
 
         これは低レベルAPIなので普通は触らなくても大丈夫です。
@@ -375,9 +1098,11 @@ class Bromine:
             type情報
         id: str
             識別id
-        func: CoroutineFunction
+        func: Union[CoroutineFunction, InlineHandler]
             反応があった時に実行される非同期関数
 
+            InlineHandlerの場合、タスクを作らずに受信ループの中でpushが呼ばれます。
+
         Raises
         -------
         TypeError
@@ -390,19 +1115,95 @@ class Bromine:
         idが`ALLMATCH`の場合、ワイルドカード(type情報に一致する、他の識別idに引っかからなかった情報)になります。
 
         ワイルドカードは、id情報が存在しない場合にも振り分けられます。(emojiAdded等)"""
-        if not asyncio.iscoroutinefunction(func):
+        if not isinstance(func, InlineHandler) and not asyncio.iscoroutinefunction(func):
             # 関数が非同期関数じゃない時
             raise TypeError(ExceptionTexts.FUNCTION_NOT_COROUTINEFUNC)
 
-        if self.__ws_type_id_dict.get(type):
-            if id in self.__ws_type_id_dict[type]:
-                # IDがもうすでに使われているとき
-                raise ValueError(ExceptionTexts.ID_ALREADY_RESERVED)
-        else:
-            # 辞書にtypeが登録されてなかったら初期化
-            self.__ws_type_id_dict[type] = {}
+        self.__routes.add(type, id, func)
+
+    def _add_ws_handler(self,
+                        type: str,
+                        id: str,
+                        func: Union[Callable[[dict[str, Any]], Coroutine[Any, Any, None]], InlineHandler]) -> None:
+        """登録済みの振り分け先に関数を追加する
+
+        これは低レベルAPIなので普通は触らなくても大丈夫です。
+
+        Parameters
+        ----------
+        type: str
+            type情報
+        id: str
+            識別id
+        func: Union[CoroutineFunction, InlineHandler]
+            反応があった時に実行される非同期関数
+
+        Raises
+        -------
+        TypeError
+            非同期関数funcがcoroutinefunctionでない時
+        ValueError
+            識別idが不適のとき
+
+        Note
+        ----
+        振り分け先が_del_ws_type_idで削除されると、追加した関数も一緒に取り除かれます。"""
+        if not isinstance(func, InlineHandler) and not asyncio.iscoroutinefunction(func):
+            raise TypeError(ExceptionTexts.FUNCTION_NOT_COROUTINEFUNC)
+        if (route := self.__routes.get(type, id)) is None:
+            raise ValueError(ExceptionTexts.ID_INVALID)
+        route.add(func)
 
-        self.__ws_type_id_dict[type][id] = func
+    def _del_ws_handler(self,
+                        type: str,
+                        id: str,
+                        func: Union[Callable[[dict[str, Any]], Coroutine[Any, Any, None]], InlineHandler]) -> None:
+        """_add_ws_handlerで追加した関数を取り除く
+
+        これは低レベルAPIなので普通は触らなくても大丈夫です。
+        振り分け先がもう削除されている時は何もしません。
+
+        Parameters
+        ----------
+        type: str
+            type情報
+        id: str
+            識別id
+        func: Union[CoroutineFunction, InlineHandler]
+            取り除く関数"""
+        if (route := self.__routes.get(type, id)) is not None:
+            route.discard(func)
+
+    def _set_ws_priority(self, type: str, id: str, priority: str) -> None:
+        """振り分けた情報を実行する優先度を設定する
+
+        これは低レベルAPIなので普通は触らなくても大丈夫です。
+
+        Parameters
+        ----------
+        type: str
+            type情報
+        id: str
+            識別id
+        priority: str
+            `Priority`の値
+
+        Raises
+        ------
+        ValueError
+            priorityが不適の時、もしくはtype情報とIDの組み合わせが不適の時
+
+        Note
+        ----
+        実行する順番に効くのはmax_totalを指定したDispatchSchedulerを使っている時だけです。
+        スケジューラーがない時はメトリクスのラベルにだけ使われます。"""
+        if priority not in (Priority.HIGH, Priority.NORMAL, Priority.LOW):
+            raise ValueError(ExceptionTexts.PRIORITY_INVALID)
+        if (route := self.__routes.get(type, id)) is None:
+            raise ValueError(ExceptionTexts.TYPE_AND_ID_INVALID)
+        route.set_priority(priority)
+        if self.__scheduler is not None:
+            self.__scheduler.set_priority(route.key, priority)
 
     def _del_ws_type_id(self, type: str, id: str) -> None:
         """websocketの情報を振り分ける辞書から削除する
@@ -420,12 +1221,12 @@ class Bromine:
         ------
         ValueError
             type情報か識別idが不適のとき"""
-        if type not in self.__ws_type_id_dict:
-            raise ValueError(ExceptionTexts.TYPE_INVALID)
-        if id not in self.__ws_type_id_dict[type]:
-            raise ValueError(ExceptionTexts.ID_INVALID)
-
-        self.__ws_type_id_dict[type].pop(id)
+        route = self.__routes.remove(type, id)
+        route.close()
+        if route.priority != Priority.NORMAL and self.__scheduler is not None:
+            self.__scheduler.set_priority(route.key, Priority.NORMAL)
+        if self.__guard is not None:
+            self.__guard.reset(route.key)
 
     def _ws_send(self, type: str, body: dict[str, Any]) -> None:
         """ウェブソケットへ情報を送る関数
@@ -448,10 +1249,81 @@ class Bromine:
         else:
             raise RuntimeError(ExceptionTexts.MAIN_FUNC_NOT_RUNNING)
 
+    async def request(self,
+                      type: str,
+                      body: dict[str, Any],
+                      timeout: Optional[float] = 10.0,
+                      reply_type: Optional[str] = None) -> dict[str, Any]:
+        """ウェブソケットへ情報を送って、返事を待つ関数
+
+        bodyのidと同じidを持った情報が来たらそのbodyを返します。
+        bodyにidがない場合は相関idを作って入れます。
+
+        Parameters
+        ----------
+        type: str
+            type情報
+        body: dict[str, Any]
+            body情報、idはそのまま送られます(サーバーが振り分けに使うので)
+        timeout: :obj:`float`, optional, default 10.0
+            返事を待つ秒数、Noneの場合はずっと待つ
+        reply_type: :obj:`str`, optional
+            返事のbodyのtype、指定した場合は同じidでもtypeが違う情報は返事とみなしません
+
+            チャンネルのidを使う時は、普通の情報を返事と間違えないように指定してください。
+
+        Returns
+        -------
+        dict[str, Any]
+            返事のbody情報
+
+        Raises
+        ------
+        RuntimeError
+            メイン関数が実行されていない時に使った場合
+        asyncio.TimeoutError
+            timeoutまでに返事が来なかった時
+        ConnectionError
+            返事が来る前に接続が切れた時
+
+        Note
+        ----
+        返事は受信ループの中で振り分けの前に渡されるので、ws_connect等の非同期関数には流れません。
+
+        Examples
+        --------
+        ```py
+        id = brm.ws_connect("someChannel", func)
+        reply = await brm.request("channel", {"id": id, "type": "action", "body": {}}, reply_type="actionResult")
+        ```"""
+        if (correlation_id := body.get("id")) is None:
+            correlation_id = uuid.uuid4().hex
+            body = {**body, "id": correlation_id}
+        future = asyncio.get_running_loop().create_future()
+        # 送れなかった時に残らないよう先に送る
+        self._ws_send(type, body)
+        waiter = (future, reply_type)
+        self.__pending_requests.setdefault(correlation_id, []).append(waiter)
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if (waiters := self.__pending_requests.get(correlation_id)) is not None and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self.__pending_requests[correlation_id]
+            if self.__metrics is not None:
+                self.__metrics.observe("request_seconds", time.perf_counter() - start)
+
     def ws_connect(self,
                    channel: str,
                    func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]],
                    id: Optional[str] = None,
+                   executor: Optional[Executor] = None,
+                   callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]] = None,
+                   note_filter: Optional[NoteFilter] = None,
+                   typed: bool = False,
+                   priority: str = Priority.NORMAL,
                    **params: Any) -> str:
         """channelに接続する関数
 
@@ -461,8 +1333,22 @@ class Bromine:
             チャンネル名
         func: CoroutineFunction
             反応があった時に実行される非同期関数
+
+            executorを指定した場合は普通の関数
         id: :obj:`str`, optional
             識別id、もし指定されていない場合、自動生成される
+        executor: :obj:`Executor`, optional
+            funcを実行するThreadPoolExecutorやProcessPoolExecutor
+        callback: :obj:`CoroutineFunction`, optional
+            executorで実行したfuncの返り値を受け取る非同期関数
+        note_filter: :obj:`NoteFilter`, optional
+            タスクを作る前にノートを絞り込む条件
+        typed: :obj:`bool`, default False
+            辞書の代わりにChannelEvent(brcore.models)を渡すかどうか
+        priority: :obj:`str`, default Priority.NORMAL
+            実行する優先度、`Priority`の値
+
+            max_totalを指定したDispatchSchedulerを使っている時、HIGHのチャンネルは常に先に実行されます。
         **params: Any
             接続する際のパラメーター
 
@@ -475,17 +1361,26 @@ class Bromine:
         -------
         TypeError
             非同期関数funcがcoroutinefunctionでない時
+
+            executorを指定していてfuncがcoroutinefunctionの時
         ValueError
-            idがすでに予約済みの場合
+            idがすでに予約済みの場合、もしくはpriorityが不適の時
 
         Note
         ----
         返り値の識別idはws_disconnectで使用します
 
         また、idの指定がない場合、uuid4で自動生成されます"""
+        if priority not in (Priority.HIGH, Priority.NORMAL, Priority.LOW):
+            raise ValueError(ExceptionTexts.PRIORITY_INVALID)
         if id is None:
             # idがなかったら自動生成
             id = str(uuid.uuid4())
+        if executor is not None:
+            # executorで実行するように包む
+            func = executor_handler(func, executor, callback)
+        if typed:
+            func = typed_handler(func, decode_channel_event)
 
         body = {
             "channel": channel,
@@ -494,6 +1389,12 @@ class Bromine:
         }
         self._add_ws_type_id("channel", id, func)
         self._add_ws_reconnect("connect", id, body)
+        if note_filter is not None:
+            self.__routes.get("channel", id).note_filter = note_filter
+        if priority != Priority.NORMAL:
+            self._set_ws_priority("channel", id, priority)
+        if self.__backfill is not None:
+            self.__backfill.track(id, channel, params)
 
         if self.__is_running:
             # もしsend_queueがある時(実行中の時)
@@ -505,6 +1406,108 @@ class Bromine:
 
         return id
 
+    def ws_connect_batch(self,
+                         channel: str,
+                         func: Callable[[list[dict[str, Any]]], Coroutine[Any, Any, None]],
+                         max_size: int = 100,
+                         max_latency: float = 1.0,
+                         id: Optional[str] = None,
+                         note_filter: Optional[NoteFilter] = None,
+                         **params: Any) -> str:
+        """channelに接続して、情報をまとめて受け取る関数
+
+        Parameters
+        ----------
+        channel: str
+            チャンネル名
+        func: CoroutineFunction
+            情報のリストを受け取る非同期関数
+        max_size: :obj:`int`, default 100
+            一回に渡す情報の最大数
+        max_latency: :obj:`float`, default 1.0
+            最初の情報が来てから渡すまでの最大の秒数
+        id: :obj:`str`, optional
+            識別id、もし指定されていない場合、自動生成される
+        note_filter: :obj:`NoteFilter`, optional
+            まとめる前にノートを絞り込む条件
+        **params: Any
+            接続する際のパラメーター
+
+        Returns
+        -------
+        str
+            識別id
+
+        Raises
+        -------
+        TypeError
+            非同期関数funcがcoroutinefunctionでない時
+        ValueError
+            idがすでに予約済みの場合、もしくはmax_sizeかmax_latencyが正の値でない時
+
+        Note
+        ----
+        個数か時間のどちらかが上限に達したとき、溜まった情報を一回で渡します。
+
+        返り値の識別idはws_disconnectで使用します。接続解除した時、溜まっていた情報は渡し切られます。"""
+        collector = BatchCollector(func, max_size, max_latency)
+        id = self.ws_connect(channel, collector, id, note_filter=note_filter, **params)
+        route = self.__routes.get("channel", id)
+        collector.bind(partial(self.__deliver_batch, route, func), partial(self.__run_batch, route, func))
+        return id
+
+    def stream(self,
+               channel: str,
+               maxsize: int = 1000,
+               id: Optional[str] = None,
+               note_filter: Optional[NoteFilter] = None,
+               typed: bool = False,
+               **params: Any) -> ChannelStream:
+        """channelに接続して、`async for`で情報を受け取れるようにする関数
+
+        Parameters
+        ----------
+        channel: str
+            チャンネル名
+        maxsize: :obj:`int`, default 1000
+            溜めておく情報の数の上限、一杯になると取り出されるまで受信が止まります
+        id: :obj:`str`, optional
+            識別id、もし指定されていない場合、自動生成される
+        note_filter: :obj:`NoteFilter`, optional
+            溜める前にノートを絞り込む条件
+        typed: :obj:`bool`, default False
+            辞書の代わりにChannelEvent(brcore.models)を取り出すかどうか
+        **params: Any
+            接続する際のパラメーター
+
+        Returns
+        -------
+        ChannelStream
+            async forで情報を取り出せるやつ
+
+        Raises
+        ------
+        ValueError
+            idがすでに予約済みの場合、もしくはmaxsizeが正の値でない時
+
+        Note
+        ----
+        タスクを作らずに受信ループから直接待ち行列に入れるので、取り出す側の速さで流れます。
+
+        使い終わったらaclose(もしくはasync with)で接続解除してください。
+
+        Examples
+        --------
+        ```py
+        async with brm.stream(MisskeyChannelNames.LOCAL_TIMELINE) as stream:
+            async for body in stream:
+                print(body["body"]["text"])
+        ```"""
+        stream = ChannelStream(maxsize, decode_channel_event if typed else None)
+        id = self.ws_connect(channel, stream, id, note_filter=note_filter, **params)
+        stream.bind(id, partial(self.ws_disconnect, id))
+        return stream
+
     def ws_disconnect(self, id: str) -> None:
         """チャンネルを接続解除する関数
 
@@ -519,6 +1522,8 @@ class Bromine:
             識別idが不適のとき"""
         self._del_ws_type_id("channel", id)
         self._del_ws_reconnect("connect", id)
+        if self.__backfill is not None:
+            self.__backfill.untrack(id)
 
         if self.__is_running:
             body = {"id": id}
@@ -526,7 +1531,65 @@ class Bromine:
 
         self.__log(f"disconnect channel. id: {id}")
 
-    def ws_subnote(self, noteid: str, func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]]) -> None:
+    def ws_add_handler(self,
+                       id: str,
+                       func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]],
+                       executor: Optional[Executor] = None,
+                       callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]] = None,
+                       typed: bool = False) -> None:
+        """接続済みのチャンネルに実行する関数を追加する関数
+
+        同じチャンネルに接続し直さずに、一つの情報を複数の関数に渡せます。
+
+        Parameters
+        ----------
+        id: str
+            ws_connectの識別id
+        func: CoroutineFunction
+            反応があった時に実行される非同期関数
+
+            executorを指定した場合は普通の関数
+        executor: :obj:`Executor`, optional
+            funcを実行するThreadPoolExecutorやProcessPoolExecutor
+        callback: :obj:`CoroutineFunction`, optional
+            executorで実行したfuncの返り値を受け取る非同期関数
+        typed: :obj:`bool`, default False
+            辞書の代わりにChannelEvent(brcore.models)を渡すかどうか
+
+        Raises
+        ------
+        TypeError
+            非同期関数funcがcoroutinefunctionでない時
+
+            executorを指定していてfuncがcoroutinefunctionの時
+        ValueError
+            識別idが不適のとき
+
+        Note
+        ----
+        非同期関数は追加した順に一つのタスクの中で実行されるので、関数を増やしてもタスクは増えません。
+        一つが例外を投げても残りは実行されます。
+
+        追加した関数はws_disconnectで一緒に取り除かれます。"""
+        if (route := self.__routes.get("channel", id)) is None:
+            raise ValueError(ExceptionTexts.ID_INVALID)
+        if executor is not None:
+            # executorで実行するように包む
+            func = executor_handler(func, executor, callback)
+        if typed:
+            func = typed_handler(func, decode_channel_event)
+        if not isinstance(func, InlineHandler) and not asyncio.iscoroutinefunction(func):
+            raise TypeError(ExceptionTexts.FUNCTION_NOT_COROUTINEFUNC)
+
+        route.add(func)
+        self.__log(f"add channel handler. id: {id}, handlers: {len(route.handlers)}")
+
+    def ws_subnote(self,
+                   noteid: str,
+                   func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]],
+                   executor: Optional[Executor] = None,
+                   callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]] = None,
+                   typed: bool = False) -> None:
         """投稿をキャプチャする関数
 
         Parameters
@@ -534,22 +1597,90 @@ class Bromine:
         noteid: str
             キャプチャするノートID
         func: CoroutineFunction
+            反応があった時に実行される非同期関数
+
+            executorを指定した場合は普通の関数
+        executor: :obj:`Executor`, optional
+            funcを実行するThreadPoolExecutorやProcessPoolExecutor
+        callback: :obj:`CoroutineFunction`, optional
+            executorで実行したfuncの返り値を受け取る非同期関数
+        typed: :obj:`bool`, default False
+            辞書の代わりにNoteUpdatedEvent(brcore.models)を渡すかどうか
 
         Raises
         ------
         TypeError
             非同期関数funcがcoroutinefunctionでない時
+
+            executorを指定していてfuncがcoroutinefunctionの時
         ValueError
             もうすでにキャプチャしている時"""
+        if executor is not None:
+            func = executor_handler(func, executor, callback)
+        if typed:
+            func = typed_handler(func, decode_note_updated)
         body = {"id": noteid}
         self._add_ws_type_id("noteUpdated", noteid, func)
         self._add_ws_reconnect("subNote", noteid, body)
 
         if self.__is_running:
             self._ws_send("subNote", body)
+        self.__limit_capture(noteid)
 
         self.__log(f"subscribe note. id: {noteid}")
 
+    def ws_subnote_many(self,
+                        noteids: Iterable[str],
+                        func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]],
+                        executor: Optional[Executor] = None,
+                        callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]] = None) -> int:
+        """投稿をまとめてキャプチャする関数
+
+        実行中の場合、subNoteはまとめて送られます。
+
+        Parameters
+        ----------
+        noteids: Iterable[str]
+            キャプチャするノートIDたち
+        func: CoroutineFunction
+            反応があった時に実行される非同期関数
+
+            executorを指定した場合は普通の関数
+        executor: :obj:`Executor`, optional
+            funcを実行するThreadPoolExecutorやProcessPoolExecutor
+        callback: :obj:`CoroutineFunction`, optional
+            executorで実行したfuncの返り値を受け取る非同期関数
+
+        Returns
+        -------
+        int
+            キャプチャした数、すでにキャプチャしていたノートは飛ばされます
+
+        Raises
+        ------
+        TypeError
+            非同期関数funcがcoroutinefunctionでない時"""
+        if executor is not None:
+            func = executor_handler(func, executor, callback)
+        elif not asyncio.iscoroutinefunction(func):
+            raise TypeError(ExceptionTexts.FUNCTION_NOT_COROUTINEFUNC)
+
+        count = 0
+        for noteid in noteids:
+            if ("subNote", noteid) in self.__ws_on_comebacks:
+                continue
+            body = {"id": noteid}
+            self._add_ws_type_id("noteUpdated", noteid, func)
+            self._add_ws_reconnect("subNote", noteid, body)
+            if self.__is_running:
+                # send_queueに積むだけなので送る時はまとめて送られる
+                self._ws_send("subNote", body)
+            self.__limit_capture(noteid)
+            count += 1
+
+        self.__log(f"subscribe notes. count: {count}")
+        return count
+
     def ws_unsubnote(self, noteid: str) -> None:
         """ノートのキャプチャを解除する関数
 
@@ -568,9 +1699,90 @@ class Bromine:
         if self.__is_running:
             body = {"id": noteid}
             self._ws_send("unsubNote", body)
+        if self.__capture_limiter is not None:
+            self.__capture_limiter.remove(noteid)
 
         self.__log(f"unsubscribe note. id: {noteid}")
 
+    def subscriptions_snapshot(self) -> dict[str, Any]:
+        """今接続しているチャンネルとキャプチャしているノートを返す
+
+        Returns
+        -------
+        dict[str, Any]
+            `channels`([識別id, チャンネル名, パラメーター]のリスト)と`notes`(ノートIDのリスト)の辞書"""
+        channels = []
+        notes = []
+        for (type_, id), body in self.__ws_on_comebacks.items():
+            if type_ == "connect":
+                channels.append([id, body["channel"], body["params"]])
+            elif type_ == "subNote":
+                notes.append(id)
+        return {"version": 1, "channels": channels, "notes": notes}
+
+    def save_subscriptions(self, path: str) -> None:
+        """今接続しているチャンネルとキャプチャしているノートをファイルに保存する
+
+        Parameters
+        ----------
+        path: str
+            保存するファイルのパス(gzipしたjson)"""
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(self.subscriptions_snapshot(), f, separators=(",", ":"))
+        self.__log(f"save subscriptions. path: {path}")
+
+    def load_subscriptions(self,
+                           path: str,
+                           channel_funcs: dict[str, Callable[[dict[str, Any]], Coroutine[Any, Any, None]]],
+                           note_func: Optional[Callable[[dict[str, Any]], Coroutine[Any, Any, None]]] = None
+                           ) -> tuple[int, int]:
+        """save_subscriptionsで保存したファイルから接続しなおす
+
+        Parameters
+        ----------
+        path: str
+            保存したファイルのパス
+        channel_funcs: dict[str, CoroutineFunction]
+            チャンネル名: 反応があった時に実行される非同期関数
+
+            ここにないチャンネルは接続しません。
+        note_func: :obj:`CoroutineFunction`, optional
+            キャプチャしたノートに反応があった時に実行される非同期関数
+
+            指定しない場合、ノートはキャプチャしません。
+
+        Returns
+        -------
+        tuple[int, int]
+            接続したチャンネルの数, キャプチャしたノートの数
+
+        Raises
+        ------
+        TypeError
+            非同期関数がcoroutinefunctionでない時
+
+        Note
+        ----
+        識別idが保存した時と同じなのでbackfill等の記録もそのまま使えます。
+
+        実行中に呼んだ場合でも、情報はまとめて送られます。"""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            snapshot = json.load(f)
+
+        channel_count = 0
+        for id, channel, params in snapshot["channels"]:
+            if (func := channel_funcs.get(channel)) is None or ("connect", id) in self.__ws_on_comebacks:
+                continue
+            self.ws_connect(channel, func, id, **params)
+            channel_count += 1
+
+        note_count = 0
+        if note_func is not None:
+            note_count = self.ws_subnote_many(snapshot["notes"], note_func)
+
+        self.__log(f"load subscriptions. path: {path}, channels: {channel_count}, notes: {note_count}")
+        return channel_count, note_count
+
     def ws_connect_deco(self, channel: str):
         """ws_connectのデコレーター版
 
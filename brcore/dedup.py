@@ -0,0 +1,170 @@
+import time
+from collections import OrderedDict
+from collections.abc import Set
+from typing import Hashable, Iterator, Optional
+
+from brcore.enum import (
+    ExceptionTexts
+)
+
+
+__all__ = ["DedupCache", "SourceView"]
+
+
+class SourceView(Set):
+    """ノートが来たチャンネルの識別idの集合の読み取り専用のビュー
+
+    後から重複が来るとそのチャンネルも含まれるようになります。"""
+    __slots__ = ("__sources",)
+
+    def __init__(self, sources: set[Hashable]) -> None:
+        self.__sources = sources
+
+    def __contains__(self, source: object) -> bool:
+        return source in self.__sources
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(tuple(self.__sources))
+
+    def __len__(self) -> int:
+        return len(self.__sources)
+
+    def __repr__(self) -> str:
+        return f"SourceView({set(self.__sources)!r})"
+
+
+class DedupCache:
+    """複数のタイムラインから同じノートが来た時に一回だけ渡すためのキャッシュ
+
+    ノートのidを最近使った順に覚えておき、上限を超えたり期限が切れたものから忘れます。
+
+    Parameters
+    ----------
+    max_size: :obj:`int`, default 10000
+        覚えておくノートの数の上限
+    ttl: :obj:`float`, optional
+        最後に来てから忘れるまでの秒数、指定しない場合は数の上限でのみ忘れる
+
+    Raises
+    ------
+    ValueError
+        max_sizeかttlが正の値でない時"""
+
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = None) -> None:
+        if max_size <= 0 or (ttl is not None and ttl <= 0):
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__max_size = max_size
+        self.__ttl = ttl
+        # ノートid: tuple[最後に来た時間, 来たチャンネルの識別idの集合]
+        self.__entries: OrderedDict[str, tuple[float, set[Hashable]]] = OrderedDict()
+
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    @property
+    def max_size(self) -> int:
+        """覚えておくノートの数の上限"""
+        return self.__max_size
+
+    @property
+    def ttl(self) -> Optional[float]:
+        """最後に来てから忘れるまでの秒数"""
+        return self.__ttl
+
+    @property
+    def hits(self) -> int:
+        """重複として弾いた数"""
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        """初めて来たので通した数"""
+        return self.__misses
+
+    @property
+    def evictions(self) -> int:
+        """上限や期限で忘れた数"""
+        return self.__evictions
+
+    @property
+    def hit_rate(self) -> float:
+        """重複だった割合"""
+        total = self.__hits + self.__misses
+        return self.__hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def check(self, note_id: str, source: Hashable) -> bool:
+        """ノートが来たことを記録する
+
+        Parameters
+        ----------
+        note_id: str
+            ノートのid
+        source: Hashable
+            来たチャンネルの識別id
+
+        Returns
+        -------
+        bool
+            初めて来たノートならTrue、重複ならFalse"""
+        now = time.monotonic()
+        self.__expire(now)
+
+        if (entry := self.__entries.get(note_id)) is not None:
+            entry[1].add(source)
+            self.__entries[note_id] = (now, entry[1])
+            self.__entries.move_to_end(note_id)
+            self.__hits += 1
+            return False
+
+        self.__entries[note_id] = (now, {source})
+        if len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
+            self.__evictions += 1
+        self.__misses += 1
+        return True
+
+    def sources(self, note_id: str) -> frozenset[Hashable]:
+        """ノートが来たチャンネルの識別idの集合
+
+        忘れたノートや来ていないノートの場合は空の集合"""
+        entry = self.__entries.get(note_id)
+        return frozenset(entry[1]) if entry is not None else frozenset()
+
+    def view(self, note_id: str) -> SourceView:
+        """ノートが来たチャンネルの識別idの集合のビュー
+
+        `sources`と違い、後から来た重複のチャンネルもビューに反映されます。
+        (忘れた後に来たものは反映されません)
+        忘れたノートや来ていないノートの場合は空のビュー"""
+        entry = self.__entries.get(note_id)
+        return SourceView(entry[1] if entry is not None else set())
+
+    def clear(self) -> None:
+        """覚えているノートを全部忘れる"""
+        self.__entries.clear()
+
+    def stats(self) -> dict[str, float]:
+        """ヒット率等をまとめて返す"""
+        return {
+            "size": len(self.__entries),
+            "hits": self.__hits,
+            "misses": self.__misses,
+            "evictions": self.__evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+    def __expire(self, now: float) -> None:
+        """期限切れのものを古い方から忘れる"""
+        if self.__ttl is None:
+            return
+        limit = now - self.__ttl
+        while self.__entries:
+            note_id, (last, _) = next(iter(self.__entries.items()))
+            if last >= limit:
+                break
+            self.__entries.popitem(last=False)
+            self.__evictions += 1
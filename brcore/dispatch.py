@@ -0,0 +1,345 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Coroutine, Hashable, Optional
+
+from brcore.util import (
+    BackgroundTasks
+)
+from brcore.enum import (
+    ExceptionTexts,
+    OverflowPolicy,
+    Priority
+)
+
+
+__all__ = ["DispatchScheduler"]
+
+
+# 重み付けして順番に回す優先度(HIGHは常に先)
+_WEIGHTED = (Priority.NORMAL, Priority.LOW)
+
+
+class _Lane:
+    """識別idごとの待ち行列"""
+    __slots__ = ("queue", "parked", "running", "priority")
+
+    def __init__(self, priority: str = Priority.NORMAL) -> None:
+        # tuple[coroutinefunc, 引数]
+        self.queue: deque[tuple[Callable[[Any], Coroutine[Any, Any, None]], Any]] = deque()
+        # BLOCKで待ち行列に入りきらなかったもの、空いたら順番に待ち行列に移す
+        self.parked: deque[tuple[Callable[[Any], Coroutine[Any, Any, None]], Any]] = deque()
+        # 実行中のタスクの数
+        self.running = 0
+        self.priority = priority
+
+
+class _PrioritySlots:
+    """全体の同時実行数を優先度順に配るやつ
+
+    HIGHは常に先に、NORMALとLOWは重みの比率で順番に配ります。"""
+
+    def __init__(self, capacity: int, weights: dict[str, int]) -> None:
+        self.free = capacity
+        # 優先度: 空きを待っているfuture
+        self.waiters: dict[str, deque[asyncio.Future]] = {
+            Priority.HIGH: deque(), Priority.NORMAL: deque(), Priority.LOW: deque()
+        }
+        self.__weights = weights
+        # 今どの優先度の番か、あと何回配れるか
+        self.__turn = 0
+        self.__credit = weights[_WEIGHTED[0]]
+
+    async def acquire(self, priority: str) -> None:
+        if self.free > 0 and not any(self.waiters.values()):
+            self.free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[priority].append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 受け取った空きを返す
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while (waiter := self.__next_waiter()) is not None:
+            if not waiter.done():
+                # 空きをそのまま渡す
+                waiter.set_result(None)
+                return
+        self.free += 1
+
+    def __next_waiter(self) -> Optional[asyncio.Future]:
+        if self.waiters[Priority.HIGH]:
+            return self.waiters[Priority.HIGH].popleft()
+        for _ in range(len(_WEIGHTED) + 1):
+            queue = self.waiters[_WEIGHTED[self.__turn]]
+            if queue and self.__credit > 0:
+                self.__credit -= 1
+                return queue.popleft()
+            # 次の優先度の番
+            self.__turn = (self.__turn + 1) % len(_WEIGHTED)
+            self.__credit = self.__weights[_WEIGHTED[self.__turn]]
+        return None
+
+
+class DispatchScheduler:
+    """振り分けた情報を実行するタスクの数を制限するスケジューラー
+
+    識別id(チャンネルのid等)ごとに同時実行数と待ち行列の長さに上限を持ちます。
+
+    Parameters
+    ----------
+    max_in_flight: :obj:`int`, default 8
+        識別idごとの同時実行数の上限
+    queue_size: :obj:`int`, default 1024
+        識別idごとの待ち行列の長さの上限
+    overflow: :obj:`str`, default OverflowPolicy.BLOCK
+        待ち行列が一杯の時の処理方法
+
+        `OverflowPolicy`の値を指定してください。
+    max_total: :obj:`int`, optional
+        全体の同時実行数の上限、空きは優先度(set_priority)の高い識別idから配られます
+
+        指定しない場合、識別idごとの上限のみで優先度は使われません。
+    weights: :obj:`dict[str, int]`, optional
+        Priority.NORMALとPriority.LOWに空きを配る比率、指定しない場合4:1
+
+    Raises
+    ------
+    ValueError
+        max_in_flight, queue_size, max_total, weightsが正の値でない時、もしくはoverflowが不適の時
+
+    Note
+    ----
+    Priority.HIGHの識別idは、空きを待っている時に常に他より先に実行されます。
+
+    OverflowPolicy.BLOCKで待ち行列が一杯の時も受信は止めず、その識別idの分だけ取っておいて
+    空いた順に待ち行列に入れます。一つの識別idが詰まっても他の識別id(特にHIGH)の情報は読まれ続けます。
+    取っておいた分もpendingに数えられるので、メモリを抑えたい時はJournalと一緒に使ってください。"""
+
+    def __init__(self,
+                 max_in_flight: int = 8,
+                 queue_size: int = 1024,
+                 overflow: str = OverflowPolicy.BLOCK,
+                 max_total: Optional[int] = None,
+                 weights: Optional[dict[str, int]] = None) -> None:
+        if weights is None:
+            weights = {Priority.NORMAL: 4, Priority.LOW: 1}
+        if max_in_flight <= 0 or queue_size <= 0 or (max_total is not None and max_total <= 0):
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        if any(weights.get(i, 0) <= 0 for i in _WEIGHTED):
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        if overflow not in (OverflowPolicy.BLOCK, OverflowPolicy.DROP_OLDEST, OverflowPolicy.DROP_NEWEST):
+            raise ValueError(ExceptionTexts.OVERFLOW_POLICY_INVALID)
+
+        self.__max_in_flight = max_in_flight
+        self.__queue_size = queue_size
+        self.__overflow = overflow
+        self.__max_total = max_total
+        self.__weights = weights
+        # 全体の空き(max_totalが指定された時だけ)、ループの中で作る必要があるので後で作る
+        self.__slots: Optional[_PrioritySlots] = None
+        # 識別id: 優先度(NORMAL以外)
+        self.__priorities: dict[Hashable, str] = {}
+
+        # 識別id: _Lane
+        self.__lanes: dict[Hashable, _Lane] = {}
+        # 識別id: 捨てた数
+        self.__dropped: dict[Hashable, int] = {}
+        self.__dropped_total = 0
+        self.__tasks = BackgroundTasks()
+        # 使っているBromineの数
+        self.__users = 0
+
+        self.__logger = logging.getLogger("Bromine")
+
+    @property
+    def max_in_flight(self) -> int:
+        """識別idごとの同時実行数の上限"""
+        return self.__max_in_flight
+
+    @property
+    def queue_size(self) -> int:
+        """識別idごとの待ち行列の長さの上限"""
+        return self.__queue_size
+
+    @property
+    def overflow(self) -> str:
+        """待ち行列が一杯の時の処理方法"""
+        return self.__overflow
+
+    @property
+    def max_total(self) -> Optional[int]:
+        """全体の同時実行数の上限"""
+        return self.__max_total
+
+    @property
+    def dropped(self) -> int:
+        """今までに捨てた情報の数"""
+        return self.__dropped_total
+
+    @property
+    def dropped_counts(self) -> dict[Hashable, int]:
+        """識別idごとの捨てた情報の数"""
+        return self.__dropped.copy()
+
+    @property
+    def pending(self) -> int:
+        """待ち行列に入っている情報の数(BLOCKで取っておいている分も含む)"""
+        return sum(len(lane.queue) + len(lane.parked) for lane in self.__lanes.values())
+
+    @property
+    def parked(self) -> int:
+        """BLOCKで待ち行列に入りきらずに取っておいている情報の数"""
+        return sum(len(lane.parked) for lane in self.__lanes.values())
+
+    @property
+    def in_flight(self) -> int:
+        """実行中のタスクの数"""
+        return sum(lane.running for lane in self.__lanes.values())
+
+    def depth(self, key: Hashable) -> int:
+        """識別idの待ち行列の長さ
+
+        Parameters
+        ----------
+        key: Hashable
+            識別id"""
+        lane = self.__lanes.get(key)
+        return len(lane.queue) + len(lane.parked) if lane is not None else 0
+
+    def set_priority(self, key: Hashable, priority: str) -> None:
+        """識別idの優先度を設定する
+
+        Parameters
+        ----------
+        key: Hashable
+            識別id
+        priority: str
+            `Priority`の値
+
+        Raises
+        ------
+        ValueError
+            priorityが不適の時"""
+        if priority not in (Priority.HIGH, Priority.NORMAL, Priority.LOW):
+            raise ValueError(ExceptionTexts.PRIORITY_INVALID)
+        if priority == Priority.NORMAL:
+            self.__priorities.pop(key, None)
+        else:
+            self.__priorities[key] = priority
+        if (lane := self.__lanes.get(key)) is not None:
+            lane.priority = priority
+
+    def priority(self, key: Hashable) -> str:
+        """識別idの優先度"""
+        return self.__priorities.get(key, Priority.NORMAL)
+
+    def submit(self,
+               key: Hashable,
+               func: Callable[[Any], Coroutine[Any, Any, None]],
+               arg: Any) -> None:
+        """情報を実行するように予約する
+
+        Parameters
+        ----------
+        key: Hashable
+            識別id
+        func: CoroutineFunction
+            実行する非同期関数
+        arg: Any
+            funcに渡す引数
+
+        Note
+        ----
+        待つことはないので受信ループからそのまま呼べます。
+        BLOCKで待ち行列が一杯の時は、その識別idの分として取っておいて順番は守ります。"""
+        lane = self.__lanes.get(key)
+        if lane is None:
+            lane = self.__lanes[key] = _Lane(self.__priorities.get(key, Priority.NORMAL))
+
+        if lane.running < self.__max_in_flight:
+            # 空きがあるのですぐに実行
+            self.__spawn(key, lane, func, arg)
+            return None
+
+        if len(lane.queue) >= self.__queue_size:
+            if self.__overflow == OverflowPolicy.DROP_NEWEST:
+                self.__count_drop(key)
+                return None
+            elif self.__overflow == OverflowPolicy.DROP_OLDEST:
+                lane.queue.popleft()
+                self.__count_drop(key)
+            else:
+                # 空くまでこの識別idの分だけ取っておく(受信は止めない)
+                lane.parked.append((func, arg))
+                return None
+
+        lane.queue.append((func, arg))
+        return None
+
+    def attach(self) -> None:
+        """使い始める、Bromineのメイン関数で呼ばれます"""
+        self.__users += 1
+
+    def detach(self) -> None:
+        """使い終わる、使っているBromineがいなくなったらcancelする
+
+        一つのスケジューラーを複数のBromineで共有している時に、
+        一つのメイン関数が終わっただけで他のタスクまでキャンセルされないようにするためのものです。"""
+        self.__users = max(self.__users - 1, 0)
+        if self.__users == 0:
+            self.cancel()
+
+    def cancel(self) -> None:
+        """実行中のタスクをキャンセルして待ち行列を空にする"""
+        self.__tasks.tasks_cancel()
+        self.__lanes.clear()
+        self.__slots = None
+
+    def __count_drop(self, key: Hashable) -> None:
+        self.__dropped[key] = self.__dropped.get(key, 0) + 1
+        self.__dropped_total += 1
+
+    def __spawn(self, key: Hashable, lane: _Lane, func: Callable[[Any], Coroutine[Any, Any, None]], arg: Any) -> None:
+        lane.running += 1
+        self.__tasks.add(asyncio.create_task(self.__run(key, lane, func, arg)))
+
+    async def __run(self,
+                    key: Hashable,
+                    lane: _Lane,
+                    func: Callable[[Any], Coroutine[Any, Any, None]],
+                    arg: Any) -> None:
+        """待ち行列が空になるまで実行し続けるやつ"""
+        if self.__max_total is not None and self.__slots is None:
+            self.__slots = _PrioritySlots(self.__max_total, self.__weights)
+        slots = self.__slots
+        try:
+            while True:
+                if slots is not None:
+                    # 全体の空きを優先度順に待つ
+                    await slots.acquire(lane.priority)
+                try:
+                    await func(arg)
+                except Exception as e:
+                    # 一つの失敗で待ち行列を止めないようにする
+                    self.__logger.debug(f"handler error occured: {type(e)}, args: {e.args}")
+                finally:
+                    if slots is not None:
+                        slots.release()
+
+                if not lane.queue:
+                    break
+                func, arg = lane.queue.popleft()
+                if lane.parked:
+                    # 空きができたので取っておいたものを入れる
+                    lane.queue.append(lane.parked.popleft())
+        finally:
+            lane.running -= 1
+            if lane.running == 0 and not lane.queue and self.__lanes.get(key) is lane:
+                # もう使われていないので消す
+                self.__lanes.pop(key)
@@ -1,5 +1,8 @@
 from brcore.enum.exception_texts import ExceptionTexts
 from brcore.enum.channels import MisskeyChannelNames
+from brcore.enum.overflow import OverflowPolicy
+from brcore.enum.priority import Priority
+from brcore.enum.circuit import CircuitState
 
 
-__all__ = ["ExceptionTexts", "MisskeyChannelNames"]
+__all__ = ["ExceptionTexts", "MisskeyChannelNames", "OverflowPolicy", "Priority", "CircuitState"]
@@ -0,0 +1,10 @@
+from typing import NamedTuple
+
+
+class CircuitState(NamedTuple):
+    # 普通に渡している
+    CLOSED = "closed"
+    # 失敗が多いので捨てている
+    OPEN = "open"
+    # 試しに一つだけ渡している
+    HALF_OPEN = "half_open"
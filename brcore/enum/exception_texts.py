@@ -11,7 +11,18 @@ class ExceptionTexts(NamedTuple):
     TYPE_AND_ID_INVALID = "type情報とIDの組み合わせが不適です。"
 
     FUNCTION_NOT_COROUTINEFUNC = "関数がcoroutinefunctionではありません。"
+    FUNCTION_IS_COROUTINEFUNC = "関数がcoroutinefunctionです。executorで実行する場合は普通の関数を指定してください。"
 
     MAIN_FUNC_NOT_RUNNING = "メイン関数が実行されていません"
 
+    OVERFLOW_POLICY_INVALID = "オーバーフロー時の処理方法が不適です。"
+    PRIORITY_INVALID = "優先度が不適です。"
+    VALUE_NOT_POSITIVE = "値が正の値ではありません。"
+
+    HTTP_STATUS_INVALID = "HTTPのステータスコードが不正です。"
+
+    RECONNECT_GIVE_UP = "再接続を諦めました。"
+    JOURNAL_ALREADY_BOUND = "このJournalはすでに他のBromineで使われています。Bromineごとに別のJournalを渡してください。"
+    REQUEST_CONNECTION_LOST = "返事が来る前に接続が切れました。"
+
     DECO_ARG_INVALID = "引数が不正です。デコレーターの使い方を間違えている可能性があります。"
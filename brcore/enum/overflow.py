@@ -0,0 +1,10 @@
+from typing import NamedTuple
+
+
+class OverflowPolicy(NamedTuple):
+    # 空くまで待たせる(DispatchSchedulerでは受信は止めずにその識別idの分だけ取っておく)
+    BLOCK = "block"
+    # 一番古いものを捨てる
+    DROP_OLDEST = "drop_oldest"
+    # 新しく来たものを捨てる
+    DROP_NEWEST = "drop_newest"
@@ -0,0 +1,10 @@
+from typing import NamedTuple
+
+
+class Priority(NamedTuple):
+    # 他より必ず先に実行される
+    HIGH = "high"
+    # 普通
+    NORMAL = "normal"
+    # 空いている時に実行される
+    LOW = "low"
@@ -0,0 +1,109 @@
+import re
+from typing import Any, Iterable, Optional, Union
+
+
+__all__ = ["NoteFilter"]
+
+
+# ノートが入っているチャンネルの情報のtype
+NOTE_EVENT_TYPES = frozenset(("note", "mention", "reply"))
+
+
+class NoteFilter:
+    """ノートを受信ループの中で振り分ける前に絞り込むやつ
+
+    指定した条件を全て満たすノートだけが非同期関数に渡されます。
+    条件を指定しなかった項目は絞り込みに使われません。
+
+    Parameters
+    ----------
+    user_ids: :obj:`Iterable[str]`, optional
+        通すユーザーのidの集合
+    hosts: :obj:`Iterable[Optional[str]]`, optional
+        通すユーザーのホストの集合、ローカルのユーザーはNone
+    visibility: :obj:`Iterable[str]`, optional
+        通す公開範囲の集合(public, home, followers, specified)
+    has_files: :obj:`bool`, optional
+        Trueならファイル付きのノートだけ、Falseならファイル無しのノートだけ通す
+    keywords: :obj:`Iterable[str]`, optional
+        本文かCWにどれか一つでも含まれていたら通すキーワード
+    patterns: :obj:`Iterable[Union[str, re.Pattern]]`, optional
+        本文かCWにどれか一つでもマッチしたら通す正規表現
+    ignore_case: :obj:`bool`, default False
+        キーワードと正規表現で大文字小文字を区別しないかどうか
+
+    Note
+    ----
+    キーワードと正規表現は一つの正規表現にまとめてコンパイルされるので、数が多くても一回の検索で済みます。
+    ただしフラグ付きの正規表現(フラグを指定してコンパイルしたものや、先頭に`(?i)`等があるもの)は
+    まとめるとフラグが消えたりコンパイルできなくなるので、まとめずに一つずつ検索します。
+
+    ノートが入っていない情報(チャンネルのtypeがnote, mention, reply以外)はそのまま通します。"""
+
+    def __init__(self,
+                 user_ids: Optional[Iterable[str]] = None,
+                 hosts: Optional[Iterable[Optional[str]]] = None,
+                 visibility: Optional[Iterable[str]] = None,
+                 has_files: Optional[bool] = None,
+                 keywords: Optional[Iterable[str]] = None,
+                 patterns: Optional[Iterable[Union[str, re.Pattern]]] = None,
+                 ignore_case: bool = False) -> None:
+        self.__user_ids = frozenset(user_ids) if user_ids is not None else None
+        self.__hosts = frozenset(hosts) if hosts is not None else None
+        self.__visibility = frozenset(visibility) if visibility is not None else None
+        self.__has_files = has_files
+
+        # キーワードと正規表現を一つにまとめる
+        flags = re.IGNORECASE if ignore_case else 0
+        alternatives = [re.escape(i) for i in keywords or ()]
+        flagged: list[re.Pattern] = []
+        for i in patterns or ():
+            pattern = i if isinstance(i, re.Pattern) else re.compile(i)
+            if pattern.flags & ~re.UNICODE:
+                # フラグ付きはまとめられないので別で検索する
+                flagged.append(re.compile(pattern.pattern, pattern.flags | flags))
+            else:
+                alternatives.append(pattern.pattern)
+        self.__flagged_regexes = tuple(flagged)
+        self.__text_regex: Optional[re.Pattern] = None
+        if alternatives:
+            self.__text_regex = re.compile("|".join(f"(?:{i})" for i in alternatives), flags)
+
+    @property
+    def text_regex(self) -> Optional[re.Pattern]:
+        """キーワードと正規表現をまとめた正規表現(フラグ付きの正規表現は含まない)"""
+        return self.__text_regex
+
+    @property
+    def flagged_regexes(self) -> tuple[re.Pattern, ...]:
+        """まとめずに一つずつ検索するフラグ付きの正規表現"""
+        return self.__flagged_regexes
+
+    def __search(self, text: Optional[str]) -> bool:
+        """本文かCWがキーワードか正規表現にマッチするかどうか"""
+        if not text:
+            return False
+        if self.__text_regex is not None and self.__text_regex.search(text):
+            return True
+        return any(i.search(text) for i in self.__flagged_regexes)
+
+    def __call__(self, note: dict[str, Any]) -> bool:
+        """ノートが条件を満たすかどうか"""
+        if self.__user_ids is not None and note.get("userId") not in self.__user_ids:
+            return False
+        if self.__hosts is not None and (note.get("user") or {}).get("host") not in self.__hosts:
+            return False
+        if self.__visibility is not None and note.get("visibility") not in self.__visibility:
+            return False
+        if self.__has_files is not None and bool(note.get("fileIds") or note.get("files")) != self.__has_files:
+            return False
+        if self.__text_regex is not None or self.__flagged_regexes:
+            if not self.__search(note.get("text")) and not self.__search(note.get("cw")):
+                return False
+        return True
+
+    def check_channel(self, body: dict[str, Any]) -> bool:
+        """チャンネルの情報(`{"id", "type", "body"}`)が条件を満たすかどうか"""
+        if body.get("type") not in NOTE_EVENT_TYPES:
+            return True
+        return self(body["body"])
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Coroutine, Hashable, Optional
+
+from brcore.enum import (
+    CircuitState,
+    ExceptionTexts
+)
+
+
+__all__ = ["HandlerGuard"]
+
+
+class _Circuit:
+    """識別idごとのサーキットブレーカーの状態"""
+    __slots__ = ("state", "results", "opened_at", "trial", "trial_at")
+
+    def __init__(self, window: int) -> None:
+        self.state = CircuitState.CLOSED
+        # 最近の結果、Trueが失敗(例外、タイムアウト、遅すぎ)
+        self.results: deque[bool] = deque(maxlen=window)
+        self.opened_at = 0.0
+        # HALF_OPENで試しに渡したものが実行中かどうか
+        self.trial = False
+        # 試しに渡した時間
+        self.trial_at = 0.0
+
+
+class HandlerGuard:
+    """ハンドラーにタイムアウトとサーキットブレーカーをつけるやつ
+
+    Bromineのguardに渡すと、振り分けた情報を実行する非同期関数ごとに
+    時間制限をつけ、例外をon_errorに渡し、失敗が多い(か遅すぎる)ものには一時的に情報を渡さなくなります。
+
+    Parameters
+    ----------
+    timeout: :obj:`float`, optional
+        一つの情報を処理する秒数の上限、過ぎるとキャンセルされて失敗になります
+    on_error: :obj:`CoroutineFunction`, optional
+        例外やタイムアウトが起きた時に実行される非同期関数
+
+        引数は(tuple[type, 識別id], 渡した情報, 起きた例外)です。
+        指定しない場合はログに出すだけです。
+    failure_rate: :obj:`float`, default 0.5
+        最近の結果のうち失敗がこの割合以上になったら情報を渡すのをやめる
+    slow_threshold: :obj:`float`, optional
+        処理にこの秒数以上かかったものを失敗とみなす
+    window: :obj:`int`, default 20
+        失敗の割合を計算する最近の結果の数
+    min_calls: :obj:`int`, default 10
+        失敗の割合を計算し始める結果の数
+    cooldown: :obj:`float`, default 30.0
+        情報を渡すのをやめてから、試しに一つ渡してみるまでの秒数
+
+        試しに渡したものの結果がこの秒数返ってこない時(スケジューラーで捨てられた時等)も、もう一度試します。
+
+    Raises
+    ------
+    TypeError
+        on_errorがcoroutinefunctionでない時
+    ValueError
+        値が正の値でない時、もしくはfailure_rateが1より大きい時
+
+    Note
+    ----
+    捨てた情報はどこにも渡されません、数はshedで確認できます。"""
+
+    def __init__(self,
+                 timeout: Optional[float] = None,
+                 on_error: Optional[Callable[[Hashable, Any, BaseException], Coroutine[Any, Any, None]]] = None,
+                 failure_rate: float = 0.5,
+                 slow_threshold: Optional[float] = None,
+                 window: int = 20,
+                 min_calls: int = 10,
+                 cooldown: float = 30.0) -> None:
+        if on_error is not None and not asyncio.iscoroutinefunction(on_error):
+            raise TypeError(ExceptionTexts.FUNCTION_NOT_COROUTINEFUNC)
+        for value in (timeout, slow_threshold):
+            if value is not None and value <= 0:
+                raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        if not 0 < failure_rate <= 1 or window <= 0 or min_calls <= 0 or cooldown <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.timeout = timeout
+        self.on_error = on_error
+        self.__failure_rate = failure_rate
+        self.__slow_threshold = slow_threshold
+        self.__window = window
+        self.__min_calls = min(min_calls, window)
+        self.__cooldown = cooldown
+
+        # 識別id: _Circuit
+        self.__circuits: dict[Hashable, _Circuit] = {}
+        # 識別id: 捨てた数
+        self.__shed: dict[Hashable, int] = {}
+        self.__errors = 0
+
+        self.__logger = logging.getLogger("Bromine")
+
+    @property
+    def shed(self) -> int:
+        """今までに捨てた情報の数"""
+        return sum(self.__shed.values())
+
+    @property
+    def shed_counts(self) -> dict[Hashable, int]:
+        """識別idごとの捨てた情報の数"""
+        return self.__shed.copy()
+
+    @property
+    def errors(self) -> int:
+        """今までに起きた例外とタイムアウトの数"""
+        return self.__errors
+
+    @property
+    def open_keys(self) -> tuple[Hashable, ...]:
+        """情報を渡すのをやめている識別id"""
+        return tuple(key for key, circuit in self.__circuits.items() if circuit.state != CircuitState.CLOSED)
+
+    def state(self, key: Hashable) -> str:
+        """識別idのサーキットブレーカーの状態(`CircuitState`の値)"""
+        circuit = self.__circuits.get(key)
+        return circuit.state if circuit is not None else CircuitState.CLOSED
+
+    def reset(self, key: Optional[Hashable] = None) -> None:
+        """サーキットブレーカーを元に戻す
+
+        Parameters
+        ----------
+        key: :obj:`Hashable`, optional
+            識別id、指定しない場合は全部"""
+        if key is None:
+            self.__circuits.clear()
+        else:
+            self.__circuits.pop(key, None)
+
+    def allow(self, key: Hashable) -> bool:
+        """情報を渡してもいいかどうか、ダメな場合は捨てた数に数える
+
+        受信ループの中で呼ばれます。"""
+        if (circuit := self.__circuits.get(key)) is None or circuit.state == CircuitState.CLOSED:
+            return True
+        now = time.monotonic()
+        if circuit.state == CircuitState.OPEN and now - circuit.opened_at >= self.__cooldown:
+            # 試しに一つだけ渡してみる
+            circuit.state = CircuitState.HALF_OPEN
+            circuit.trial = False
+        if circuit.state == CircuitState.HALF_OPEN and circuit.trial and now - circuit.trial_at >= self.__cooldown:
+            # 試しに渡したものがスケジューラーで捨てられた等で結果が返ってこないので、もう一度試す
+            circuit.trial = False
+        if circuit.state == CircuitState.HALF_OPEN and not circuit.trial:
+            circuit.trial = True
+            circuit.trial_at = now
+            return True
+        self.__shed[key] = self.__shed.get(key, 0) + 1
+        return False
+
+    async def run(self, key: Hashable, func: Callable[[Any], Coroutine[Any, Any, None]], arg: Any) -> None:
+        """時間制限をつけて実行して、結果を記録する
+
+        例外はon_errorに渡され、外には投げられません。"""
+        start = time.perf_counter()
+        try:
+            if self.timeout is None:
+                await func(arg)
+            else:
+                await asyncio.wait_for(func(arg), self.timeout)
+        except asyncio.CancelledError:
+            if (circuit := self.__circuits.get(key)) is not None and circuit.state == CircuitState.HALF_OPEN:
+                # 試しに渡したものが結果を出さずに終わったので、次のものを試す
+                circuit.trial = False
+            raise
+        except Exception as e:
+            self.__errors += 1
+            self.__record(key, True)
+            await self.__report(key, arg, e)
+        else:
+            slow = self.__slow_threshold is not None and time.perf_counter() - start >= self.__slow_threshold
+            self.__record(key, slow)
+
+    async def __report(self, key: Hashable, arg: Any, error: BaseException) -> None:
+        if self.on_error is None:
+            self.__logger.debug(f"handler error occured. key: {key}, error: {type(error)}, args: {error.args}")
+            return
+        try:
+            await self.on_error(key, arg, error)
+        except Exception as e:
+            self.__logger.debug(f"on_error failed: {type(e)}, args: {e.args}")
+
+    def __record(self, key: Hashable, failed: bool) -> None:
+        if (circuit := self.__circuits.get(key)) is None:
+            if not failed:
+                # 成功しかしていないものは覚えなくていい
+                return
+            circuit = self.__circuits[key] = _Circuit(self.__window)
+
+        if circuit.state == CircuitState.HALF_OPEN:
+            if failed:
+                # まだダメなのでもう一回待つ
+                self.__open(key, circuit)
+            else:
+                self.__logger.debug(f"circuit closed. key: {key}")
+                del self.__circuits[key]
+            return
+        if circuit.state == CircuitState.OPEN:
+            # 開く前に渡したものの結果
+            return
+
+        circuit.results.append(failed)
+        if len(circuit.results) >= self.__min_calls:
+            if sum(circuit.results) / len(circuit.results) >= self.__failure_rate:
+                self.__open(key, circuit)
+            elif not any(circuit.results):
+                # 全部成功しているので忘れる
+                del self.__circuits[key]
+
+    def __open(self, key: Hashable, circuit: _Circuit) -> None:
+        self.__logger.debug(f"circuit opened. key: {key}, cooldown: {self.__cooldown}s")
+        circuit.state = CircuitState.OPEN
+        circuit.opened_at = time.monotonic()
+        circuit.trial = False
+        circuit.results.clear()
@@ -0,0 +1,451 @@
+import asyncio
+import hashlib
+import json
+import logging
+import struct
+import uuid
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, Coroutine, NoReturn, Optional
+
+from brcore.core import (
+    Bromine
+)
+from brcore.util import (
+    BackgroundTasks,
+    InlineHandler,
+    executor_handler
+)
+from brcore.codec import (
+    JsonCodec,
+    get_default_codec
+)
+from brcore.filters import (
+    NoteFilter
+)
+from brcore.models import (
+    decode_channel_event,
+    decode_note_updated,
+    typed_handler
+)
+from brcore.enum import (
+    ExceptionTexts
+)
+
+
+__all__ = ["BromineHub", "HubClient"]
+
+
+# 長さ(4byte, ビッグエンディアン) + 中身 で送る
+_HEADER = struct.Struct(">I")
+
+
+def _pack(codec: JsonCodec, obj: Any) -> bytes:
+    data = codec.dumps(obj).encode()
+    return _HEADER.pack(len(data)) + data
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    """一つ分読む、切れた時はasyncio.IncompleteReadError"""
+    size, = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return await reader.readexactly(size)
+
+
+def _channel_key(channel: str, params: dict[str, Any]) -> str:
+    """チャンネルとパラメーターから共通の識別idを作る
+
+    同じチャンネルに同じパラメーターで繋ぐ購読者は一つの接続を共有します。"""
+    digest = hashlib.sha1(json.dumps([channel, params], sort_keys=True).encode()).hexdigest()
+    return f"hub-{digest[:20]}"
+
+
+class _Forwarder(InlineHandler):
+    """Bromineから来た情報を購読者に流すやつ
+
+    エンコードは一回だけで、同じbytesを全員に書き込みます。"""
+
+    def __init__(self, hub: "BromineHub", type: str) -> None:
+        self.__hub = hub
+        self.__type = type
+        self.writers: set[asyncio.StreamWriter] = set()
+        # Bromine側ですでにしていたキャプチャに相乗りしているかどうか
+        self.shared = False
+
+    def push(self, body: Any) -> None:
+        self.__hub._publish(self.writers, {"type": self.__type, "body": body})
+        return None
+
+
+class BromineHub:
+    """一つのBromineの接続をUnixソケットで複数のプロセスに配るやつ
+
+    購読者はHubClientを使ってBromineと同じ感じでws_connectやws_subnoteを使えます。
+    同じチャンネル(とパラメーター)やノートへの購読は一つの接続にまとめられるので、
+    サーバーへの接続とデコードは一回で済みます。
+
+    Parameters
+    ----------
+    bromine: Bromine
+        上流の接続を持つBromine
+    path: str
+        Unixソケットのパス
+    max_buffer: :obj:`int`, default 8388608
+        購読者ごとの書き込み待ちのbytes数の上限、超えた購読者は切断されます
+
+    Raises
+    ------
+    ValueError
+        max_bufferが正の値でない時
+
+    Note
+    ----
+    Bromine側ですでにキャプチャしているノートは、そのキャプチャに相乗りします。
+
+    購読者からの命令が処理できなかった時(IDがすでに予約済み等)は、その購読者にhubErrorを返して接続はそのままにします。"""
+
+    def __init__(self, bromine: Bromine, path: str, max_buffer: int = 8 * 1024 * 1024) -> None:
+        if max_buffer <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__bromine = bromine
+        self.__path = path
+        self.__max_buffer = max_buffer
+        self.__codec = bromine.codec
+        # tuple[type, 識別id]: _Forwarder
+        self.__forwarders: dict[tuple[str, str], _Forwarder] = {}
+        # 購読者: 購読しているtuple[type, 識別id]の集合
+        self.__clients: dict[asyncio.StreamWriter, set[tuple[str, str]]] = {}
+
+        # logger作成
+        self.__logger = logging.getLogger("Bromine")
+        self.__log = partial(self.__logger.log, logging.DEBUG)
+
+    @property
+    def bromine(self) -> Bromine:
+        """上流の接続を持つBromine"""
+        return self.__bromine
+
+    @property
+    def path(self) -> str:
+        """Unixソケットのパス"""
+        return self.__path
+
+    @property
+    def clients(self) -> int:
+        """繋がっている購読者の数"""
+        return len(self.__clients)
+
+    @property
+    def subscriptions(self) -> int:
+        """上流に繋いでいる接続の数"""
+        return len(self.__forwarders)
+
+    async def main(self) -> NoReturn:
+        """Unixソケットを開いて、Bromineのメイン関数を実行する関数"""
+        server = await asyncio.start_unix_server(self.__handle_client, self.__path)
+        self.__log(f"start hub. path: {self.__path}")
+        try:
+            async with server:
+                await self.__bromine.main()
+        finally:
+            for writer in tuple(self.__clients):
+                self.__drop(writer)
+            self.__log("finish hub.")
+
+    def _publish(self, writers: set[asyncio.StreamWriter], frame: dict[str, Any]) -> None:
+        """購読者に情報を書き込む、受信ループの中で呼ばれる"""
+        if not writers:
+            return
+        data = _pack(self.__codec, frame)
+        for writer in tuple(writers):
+            if writer.is_closing():
+                # もう切れている
+                self.__drop(writer)
+                continue
+            if writer.transport.get_write_buffer_size() > self.__max_buffer:
+                # 読むのが遅すぎるので全体を止めないように切る
+                self.__log("hub client too slow, dropped.")
+                self.__drop(writer)
+                continue
+            writer.write(data)
+
+    async def __handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.__clients[writer] = set()
+        self.__log(f"hub client connected. clients: {len(self.__clients)}")
+        try:
+            while True:
+                raw = await _read_frame(reader)
+                try:
+                    self.__command(writer, self.__codec.loads(raw))
+                except Exception as e:
+                    # 一つの命令の失敗で購読者ごと(他の購読まで)切らないように返事だけする
+                    self.__log(f"hub command failed: {type(e)}, args: {e.args}")
+                    error = {"type": "hubError", "body": {"error": type(e).__name__, "message": str(e)}}
+                    writer.write(_pack(self.__codec, error))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.__drop(writer)
+
+    def __command(self, writer: asyncio.StreamWriter, message: dict[str, Any]) -> None:
+        """購読者から来た命令を処理する
+
+        命令が不適な時は例外を投げます、購読者には__handle_clientでhubErrorが返されます。"""
+        op = message["op"]
+        if op == "connect":
+            key = ("channel", _channel_key(message["channel"], message["params"]))
+        elif op == "subnote":
+            key = ("noteUpdated", message["id"])
+        elif op in ("disconnect", "unsubnote"):
+            key = ("channel" if op == "disconnect" else "noteUpdated", message["id"])
+            self.__unsubscribe(writer, key)
+            return
+        else:
+            self.__log(f"unknown hub command. op: {op}")
+            return
+
+        if (forwarder := self.__forwarders.get(key)) is None:
+            # 最初の購読者なので上流に繋ぐ
+            forwarder = _Forwarder(self, key[0])
+            if op == "connect":
+                self.__bromine.ws_connect(message["channel"], forwarder, key[1], **message["params"])
+            else:
+                try:
+                    self.__bromine.ws_subnote(key[1], forwarder)
+                except ValueError:
+                    # Bromine側ですでにキャプチャしているので同じキャプチャに相乗りする
+                    self.__bromine._add_ws_handler(*key, forwarder)
+                    forwarder.shared = True
+            self.__forwarders[key] = forwarder
+        forwarder.writers.add(writer)
+        self.__clients[writer].add(key)
+
+    def __unsubscribe(self, writer: asyncio.StreamWriter, key: tuple[str, str]) -> None:
+        if (forwarder := self.__forwarders.get(key)) is None:
+            return
+        forwarder.writers.discard(writer)
+        self.__clients.get(writer, set()).discard(key)
+        if not forwarder.writers:
+            # 誰も見ていないので上流から外す
+            del self.__forwarders[key]
+            if forwarder.shared:
+                # キャプチャはBromine側のものなので相乗りをやめるだけ
+                self.__bromine._del_ws_handler(*key, forwarder)
+            elif key[0] == "channel":
+                self.__bromine.ws_disconnect(key[1])
+            else:
+                self.__bromine.ws_unsubnote(key[1])
+
+    def __drop(self, writer: asyncio.StreamWriter) -> None:
+        """購読者を切断して、購読を全部外す"""
+        if (keys := self.__clients.pop(writer, None)) is None:
+            return
+        for key in keys:
+            self.__unsubscribe(writer, key)
+        writer.close()
+        self.__log(f"hub client disconnected. clients: {len(self.__clients)}")
+
+
+class HubClient:
+    """BromineHubから情報を受け取るやつ
+
+    Bromineと同じ感じでws_connectやws_subnoteを使えます。
+    websocketの代わりにUnixソケットでBromineHubに繋ぎます。
+
+    Parameters
+    ----------
+    path: str
+        BromineHubのUnixソケットのパス
+    codec: :obj:`JsonCodec`, optional
+        jsonのデコードをするやつ、指定しない場合get_default_codec()
+    cooltime: :obj:`float`, default 1.0
+        BromineHubとの接続が切れた時に再接続まで待つ時間"""
+
+    def __init__(self, path: str, *, codec: Optional[JsonCodec] = None, cooltime: float = 1.0) -> None:
+        if cooltime <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__path = path
+        self.__codec = codec if codec is not None else get_default_codec()
+        self.__cooltime = cooltime
+        # 識別id: 購読の命令(再接続の時に送り直す)
+        self.__commands: dict[str, dict[str, Any]] = {}
+        # tuple[type, 共通の識別id]: dict[識別id, coroutinefunc]
+        self.__handlers: dict[tuple[str, str], dict[str, Callable[[dict[str, Any]], Coroutine[Any, Any, None]]]] = {}
+        # 識別id: tuple[type, 共通の識別id]
+        self.__keys: dict[str, tuple[str, str]] = {}
+        # channelの識別id: NoteFilter
+        self.__filters: dict[str, NoteFilter] = {}
+        self.__writer: Optional[asyncio.StreamWriter] = None
+        self.__is_running = False
+
+        # logger作成
+        self.__logger = logging.getLogger("Bromine")
+        self.__log = partial(self.__logger.log, logging.DEBUG)
+
+    @property
+    def is_running(self) -> bool:
+        """メイン関数が実行中かどうか"""
+        return self.__is_running
+
+    async def main(self) -> NoReturn:
+        """処理を開始する関数"""
+        self.__log(f"start hub client. path: {self.__path}")
+        self.__is_running = True
+        backgrounds = BackgroundTasks()
+        try:
+            while True:
+                try:
+                    reader, self.__writer = await asyncio.open_unix_connection(self.__path)
+                    # 今までの購読を送り直す
+                    for command in self.__commands.values():
+                        self.__send(command)
+                    while True:
+                        self.__route(await _read_frame(reader), backgrounds)
+                except (asyncio.IncompleteReadError, OSError) as e:
+                    self.__log(f"hub connection error: {e!r}")
+                finally:
+                    if self.__writer is not None:
+                        self.__writer.close()
+                        self.__writer = None
+                await asyncio.sleep(self.__cooltime)
+        finally:
+            backgrounds.tasks_cancel()
+            self.__is_running = False
+            self.__log("finish hub client.")
+
+    def ws_connect(self,
+                   channel: str,
+                   func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]],
+                   id: Optional[str] = None,
+                   executor: Optional[Executor] = None,
+                   callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]] = None,
+                   note_filter: Optional[NoteFilter] = None,
+                   typed: bool = False,
+                   **params: Any) -> str:
+        """channelに接続する関数
+
+        引数はBromine.ws_connectと同じです。
+
+        Returns
+        -------
+        str
+            識別id
+
+        Raises
+        -------
+        TypeError
+            非同期関数funcがcoroutinefunctionでない時
+        ValueError
+            idがすでに予約済みの場合"""
+        if id is None:
+            id = str(uuid.uuid4())
+        elif id in self.__keys:
+            raise ValueError(ExceptionTexts.ID_ALREADY_RESERVED)
+        func = self.__wrap(func, executor, callback, decode_channel_event if typed else None)
+
+        key = ("channel", _channel_key(channel, params))
+        self.__add(id, key, func, {"op": "connect", "channel": channel, "params": params})
+        if note_filter is not None:
+            self.__filters[id] = note_filter
+        return id
+
+    def ws_disconnect(self, id: str) -> None:
+        """チャンネルを接続解除する関数
+
+        Raises
+        ------
+        ValueError
+            識別idが不適のとき"""
+        if (key := self.__keys.get(id)) is None or key[0] != "channel":
+            raise ValueError(ExceptionTexts.ID_INVALID)
+        self.__filters.pop(id, None)
+        self.__remove(id, key, {"op": "disconnect", "id": key[1]})
+
+    def ws_subnote(self,
+                   noteid: str,
+                   func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]],
+                   executor: Optional[Executor] = None,
+                   callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]] = None,
+                   typed: bool = False) -> None:
+        """投稿をキャプチャする関数
+
+        引数はBromine.ws_subnoteと同じです。
+
+        Raises
+        ------
+        TypeError
+            非同期関数funcがcoroutinefunctionでない時
+        ValueError
+            もうすでにキャプチャしている時"""
+        if noteid in self.__keys:
+            raise ValueError(ExceptionTexts.ID_ALREADY_RESERVED)
+        func = self.__wrap(func, executor, callback, decode_note_updated if typed else None)
+        self.__add(noteid, ("noteUpdated", noteid), func, {"op": "subnote", "id": noteid})
+
+    def ws_unsubnote(self, noteid: str) -> None:
+        """ノートのキャプチャを解除する関数
+
+        Raises
+        ------
+        ValueError
+            ノートIDがまだキャプチャされていないものの時"""
+        if (key := self.__keys.get(noteid)) is None or key[0] != "noteUpdated":
+            raise ValueError(ExceptionTexts.ID_INVALID)
+        self.__remove(noteid, key, {"op": "unsubnote", "id": noteid})
+
+    def __wrap(self,
+               func: Callable[[Any], Coroutine[Any, Any, None]],
+               executor: Optional[Executor],
+               callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]],
+               decoder: Optional[Callable[[dict[str, Any], bool], Any]]
+               ) -> Callable[[dict[str, Any]], Coroutine[Any, Any, None]]:
+        if executor is not None:
+            func = executor_handler(func, executor, callback)
+        elif not asyncio.iscoroutinefunction(func):
+            raise TypeError(ExceptionTexts.FUNCTION_NOT_COROUTINEFUNC)
+        if decoder is not None:
+            func = typed_handler(func, decoder)
+        return func
+
+    def __add(self,
+              id: str,
+              key: tuple[str, str],
+              func: Callable[[dict[str, Any]], Coroutine[Any, Any, None]],
+              command: dict[str, Any]) -> None:
+        self.__keys[id] = key
+        if (handlers := self.__handlers.get(key)) is None:
+            # このプロセスで最初の購読なのでBromineHubに頼む
+            handlers = self.__handlers[key] = {}
+            self.__commands[key[1]] = command
+            self.__send(command)
+        handlers[id] = func
+
+    def __remove(self, id: str, key: tuple[str, str], command: dict[str, Any]) -> None:
+        del self.__keys[id]
+        handlers = self.__handlers[key]
+        del handlers[id]
+        if not handlers:
+            del self.__handlers[key]
+            del self.__commands[key[1]]
+            self.__send(command)
+
+    def __send(self, command: dict[str, Any]) -> None:
+        if self.__writer is not None:
+            # 繋がっていない時は再接続した時にまとめて送る
+            self.__writer.write(_pack(self.__codec, command))
+
+    def __route(self, raw: bytes, background_tasks: BackgroundTasks) -> None:
+        frame = self.__codec.loads(raw)
+        body = frame["body"]
+        if frame["type"] == "hubError":
+            # 送った命令をBromineHubが処理できなかった
+            self.__log(f"hub command rejected: {body['error']}, {body['message']}")
+            return
+        if (handlers := self.__handlers.get((frame["type"], body.get("id")))) is None:
+            return
+        for id, func in handlers.items():
+            if self.__filters and (note_filter := self.__filters.get(id)) is not None:
+                if not note_filter.check_channel(body):
+                    continue
+            # チャンネルの場合は共通の識別idをそれぞれの識別idに戻す
+            arg = {**body, "id": id} if frame["type"] == "channel" else body
+            background_tasks.add(asyncio.create_task(func(arg)))
@@ -0,0 +1,282 @@
+import mmap
+import os
+import struct
+from typing import Optional, Union
+
+from brcore.enum import (
+    ExceptionTexts
+)
+
+
+__all__ = ["Journal"]
+
+
+# 長さ(4byte, ビッグエンディアン) + 中身、長さ0はまだ書かれていない場所
+_HEADER = struct.Struct(">I")
+_SEGMENT_SUFFIX = ".seg"
+_OFFSET_FILE = "offset"
+
+
+class Journal:
+    """ハンドラーが追いつかない時に情報をディスクに逃がすやつ
+
+    情報を決まった大きさのセグメントファイル(mmap)に追記していき、
+    ハンドラーが追いついたら書いた順に取り出します。
+    どこまで取り出したか(オフセット)はファイルに保存されるので、プロセスが再起動しても続きから取り出せます。
+
+    Parameters
+    ----------
+    directory: str
+        セグメントファイルを置くディレクトリ、なければ作られます
+    threshold: :obj:`int`, default 1000
+        実行中のタスク(とスケジューラーの待ち行列)の数がこれ以上になったらディスクに逃がす
+    segment_size: :obj:`int`, default 16777216
+        セグメントファイル一つの大きさ(bytes)
+    batch_size: :obj:`int`, default 100
+        一回に取り出す数
+
+    Raises
+    ------
+    ValueError
+        threshold, segment_size, batch_sizeが正の値でない時
+
+    Note
+    ----
+    一つのJournalは一つのBromineでしか使えません。(取り出した情報はそのBromineの振り分け先にしか渡せないので)
+
+    取り出し切ったセグメントファイルは消されます。
+
+    再起動した後に続きを同じ非同期関数に渡すには、ws_connectのidを固定してください。
+
+    プロセスが落ちてもmmapに書いた内容はOSが書き出しますが、マシン自体が落ちた時は最後の方が失われることがあります。"""
+
+    def __init__(self,
+                 directory: str,
+                 threshold: int = 1000,
+                 segment_size: int = 16 * 1024 * 1024,
+                 batch_size: int = 100) -> None:
+        if threshold <= 0 or segment_size <= _HEADER.size or batch_size <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__directory = directory
+        self.__threshold = threshold
+        self.__segment_size = segment_size
+        self.__batch_size = batch_size
+        # セグメント番号: mmap
+        self.__segments: dict[int, mmap.mmap] = {}
+
+        self.__spilled = 0
+        self.__drained = 0
+        # 使っているBromine
+        self.__owner: Optional[object] = None
+
+        os.makedirs(directory, exist_ok=True)
+        indexes = sorted(
+            int(name[:-len(_SEGMENT_SUFFIX)]) for name in os.listdir(directory) if name.endswith(_SEGMENT_SUFFIX)
+        )
+        # 読む位置、保存されていればそこから
+        self.__read_segment, self.__read_position = self.__load_offset(indexes)
+        # 保存した位置と、commitしていない取り出した情報それぞれの後ろの位置
+        self.__committed = (self.__read_segment, self.__read_position)
+        self.__reads: list[tuple[int, int]] = []
+        if not indexes:
+            indexes = [self.__read_segment]
+        # 書く位置は最後のセグメントの書かれていない場所
+        self.__write_segment = indexes[-1]
+        start = self.__read_position if self.__write_segment == self.__read_segment else 0
+        self.__write_position = self.__scan_end(self.__write_segment, start)
+
+    @property
+    def directory(self) -> str:
+        """セグメントファイルを置くディレクトリ"""
+        return self.__directory
+
+    @property
+    def threshold(self) -> int:
+        """ディスクに逃がし始めるタスクの数"""
+        return self.__threshold
+
+    @property
+    def batch_size(self) -> int:
+        """一回に取り出す数"""
+        return self.__batch_size
+
+    @property
+    def pending(self) -> bool:
+        """まだ取り出していない情報があるかどうか"""
+        return (self.__read_segment, self.__read_position) != (self.__write_segment, self.__write_position)
+
+    @property
+    def offset(self) -> tuple[int, int]:
+        """どこまで取り出したか(セグメント番号, 位置)"""
+        return self.__read_segment, self.__read_position
+
+    @property
+    def backlog_bytes(self) -> int:
+        """まだ取り出していない情報の大きさ(bytes、セグメントの余りを含む)"""
+        if self.__read_segment == self.__write_segment:
+            return self.__write_position - self.__read_position
+        total = len(self.__segment(self.__read_segment)) - self.__read_position
+        for index in range(self.__read_segment + 1, self.__write_segment):
+            if index in self.__segments or os.path.exists(self.__path(index)):
+                total += len(self.__segment(index))
+        return total + self.__write_position
+
+    @property
+    def spilled(self) -> int:
+        """このプロセスで逃がした数"""
+        return self.__spilled
+
+    @property
+    def drained(self) -> int:
+        """このプロセスで取り出した数"""
+        return self.__drained
+
+    def bind(self, owner: object) -> None:
+        """使うBromineを記録する
+
+        Raises
+        ------
+        ValueError
+            すでに他のBromineで使われている時"""
+        if self.__owner is not None and self.__owner is not owner:
+            raise ValueError(ExceptionTexts.JOURNAL_ALREADY_BOUND)
+        self.__owner = owner
+
+    def append(self, raw: Union[str, bytes]) -> None:
+        """情報を追記する
+
+        Parameters
+        ----------
+        raw: Union[str, bytes]
+            websocketから来たままの情報"""
+        data = raw.encode() if isinstance(raw, str) else raw
+        need = _HEADER.size + len(data)
+        segment = self.__segment(self.__write_segment)
+        if self.__write_position + need > len(segment):
+            # 入りきらないので次のセグメントへ
+            self.__write_segment += 1
+            self.__write_position = 0
+            segment = self.__segment(self.__write_segment, need)
+        position = self.__write_position
+        segment[position + _HEADER.size:position + need] = data
+        # 中身を書いてから長さを書く
+        _HEADER.pack_into(segment, position, len(data))
+        self.__write_position += need
+        self.__spilled += 1
+
+    def read(self, max_count: Optional[int] = None) -> list[bytes]:
+        """書いた順に取り出す
+
+        取り出した位置はcommitを呼ぶまで保存されません。
+
+        Parameters
+        ----------
+        max_count: :obj:`int`, optional
+            取り出す数の上限、指定しない場合batch_size
+
+        Returns
+        -------
+        list[bytes]
+            取り出した情報"""
+        if max_count is None:
+            max_count = self.__batch_size
+        frames: list[bytes] = []
+        while len(frames) < max_count and self.pending:
+            segment = self.__segment(self.__read_segment)
+            position = self.__read_position
+            size = 0
+            if position + _HEADER.size <= len(segment):
+                size, = _HEADER.unpack_from(segment, position)
+            if size == 0:
+                # このセグメントは終わり
+                self.__read_segment += 1
+                self.__read_position = 0
+                continue
+            start = position + _HEADER.size
+            frames.append(bytes(segment[start:start + size]))
+            self.__read_position = start + size
+            self.__reads.append((self.__read_segment, self.__read_position))
+        self.__drained += len(frames)
+        return frames
+
+    def commit(self, count: Optional[int] = None) -> None:
+        """取り出した位置を保存して、取り出し切ったセグメントファイルを消す
+
+        Parameters
+        ----------
+        count: :obj:`int`, optional
+            前のcommitから取り出した情報のうち、先頭から何個分を保存するか、指定しない場合全部
+
+            残りは次のreadでもう一度取り出されます。(振り分ける途中で止められた時用)"""
+        if count is not None and count < len(self.__reads):
+            # 残りはまだ振り分けていないので読む位置を戻す
+            self.__read_segment, self.__read_position = self.__reads[count - 1] if count > 0 else self.__committed
+            self.__drained -= len(self.__reads) - count
+        self.__reads.clear()
+        self.__committed = (self.__read_segment, self.__read_position)
+        for index in sorted(self.__segments):
+            if index >= self.__read_segment:
+                break
+            self.__segments.pop(index).close()
+            os.remove(self.__path(index))
+        for index in self.__stale_indexes():
+            os.remove(self.__path(index))
+        tmp = os.path.join(self.__directory, _OFFSET_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(f"{self.__read_segment} {self.__read_position}")
+        os.replace(tmp, os.path.join(self.__directory, _OFFSET_FILE))
+
+    def close(self) -> None:
+        """オフセットを保存して、mmapを閉じる"""
+        self.commit()
+        for segment in self.__segments.values():
+            segment.flush()
+            segment.close()
+        self.__segments.clear()
+
+    def __path(self, index: int) -> str:
+        return os.path.join(self.__directory, f"{index:020d}{_SEGMENT_SUFFIX}")
+
+    def __segment(self, index: int, need: int = 0) -> mmap.mmap:
+        """セグメントのmmapを取ってくる、なければ作る"""
+        if (segment := self.__segments.get(index)) is not None:
+            return segment
+        path = self.__path(index)
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+        else:
+            # 一つの情報がセグメントより大きい時はそれが入る大きさで作る
+            size = max(self.__segment_size, need)
+            with open(path, "wb") as f:
+                f.truncate(size)
+        with open(path, "r+b") as f:
+            segment = self.__segments[index] = mmap.mmap(f.fileno(), size)
+        return segment
+
+    def __scan_end(self, index: int, position: int) -> int:
+        """セグメントの書かれていない場所を探す"""
+        segment = self.__segment(index)
+        while position + _HEADER.size <= len(segment):
+            size, = _HEADER.unpack_from(segment, position)
+            if size == 0:
+                break
+            position += _HEADER.size + size
+        return position
+
+    def __load_offset(self, indexes: list[int]) -> tuple[int, int]:
+        try:
+            with open(os.path.join(self.__directory, _OFFSET_FILE)) as f:
+                segment, position = (int(i) for i in f.read().split())
+        except (FileNotFoundError, ValueError):
+            return (indexes[0], 0) if indexes else (0, 0)
+        if indexes and segment < indexes[0]:
+            # 保存した後にセグメントが消えている
+            return indexes[0], 0
+        return segment, position
+
+    def __stale_indexes(self) -> list[int]:
+        """開いていない取り出し済みのセグメント(再起動前のもの)"""
+        return [
+            int(name[:-len(_SEGMENT_SUFFIX)]) for name in os.listdir(self.__directory)
+            if name.endswith(_SEGMENT_SUFFIX) and int(name[:-len(_SEGMENT_SUFFIX)]) < self.__read_segment
+        ]
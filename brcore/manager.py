@@ -0,0 +1,242 @@
+import asyncio
+import logging
+from functools import partial
+from typing import Any, NoReturn, Optional
+
+from brcore.core import (
+    Bromine
+)
+from brcore.dispatch import (
+    DispatchScheduler
+)
+from brcore.metrics import (
+    Metrics
+)
+from brcore.reconnect import (
+    ExponentialBackoff
+)
+from brcore.enum import (
+    ExceptionTexts
+)
+
+
+__all__ = ["BromineManager"]
+
+
+def _sum_counters(counters: dict[str, float], name: str) -> float:
+    """ラベル違いのカウンターを合計する"""
+    prefix = name + "{"
+    return sum(value for key, value in counters.items() if key == name or key.startswith(prefix))
+
+
+class BromineManager:
+    """一つのイベントループでたくさんのアカウントのBromineを動かすやつ
+
+    全てのアカウントで一つのDispatchSchedulerを共有し、
+    接続を少しずつずらして開始するので一斉に接続しに行くことがありません。
+    アカウントごとにMetricsを持つので、どのアカウントがどれだけ使っているかを見られます。
+
+    Parameters
+    ----------
+    scheduler: :obj:`DispatchScheduler`, optional
+        全てのアカウントで共有するスケジューラー、指定しない場合DispatchScheduler(max_total=64)
+    stagger: :obj:`float`, default 0.2
+        アカウントの接続を開始する間隔(秒)
+
+    Raises
+    ------
+    ValueError
+        staggerが負の値の時
+
+    Note
+    ----
+    add_accountで渡すreconnect_policyを指定しない場合、
+    ExponentialBackoff(jitterあり)を使うので、再接続も一斉にはなりません。"""
+
+    def __init__(self, scheduler: Optional[DispatchScheduler] = None, stagger: float = 0.2) -> None:
+        if stagger < 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__scheduler = scheduler if scheduler is not None else DispatchScheduler(max_total=64)
+        self.__stagger = stagger
+        # 名前: Bromine
+        self.__accounts: dict[str, Bromine] = {}
+        # 名前: メイン関数のタスク
+        self.__tasks: dict[str, asyncio.Task] = {}
+        # 名前: メイン関数が止まった時の例外
+        self.__errors: dict[str, BaseException] = {}
+        # 開始待ちの名前、ループの中で作る必要があるので型ヒントのみ
+        self.__start_queue: asyncio.Queue[str]
+        self.__is_running = False
+
+        # logger作成
+        self.__logger = logging.getLogger("Bromine")
+        self.__log = partial(self.__logger.log, logging.DEBUG)
+
+    @property
+    def scheduler(self) -> DispatchScheduler:
+        """全てのアカウントで共有するスケジューラー"""
+        return self.__scheduler
+
+    @property
+    def stagger(self) -> float:
+        """アカウントの接続を開始する間隔(秒)"""
+        return self.__stagger
+
+    @property
+    def accounts(self) -> dict[str, Bromine]:
+        """名前: Bromine"""
+        return self.__accounts.copy()
+
+    @property
+    def errors(self) -> dict[str, BaseException]:
+        """メイン関数が例外で止まったアカウントの名前: 例外"""
+        return self.__errors.copy()
+
+    @property
+    def is_running(self) -> bool:
+        """メイン関数が実行中かどうか"""
+        return self.__is_running
+
+    def __getitem__(self, name: str) -> Bromine:
+        return self.__accounts[name]
+
+    def __len__(self) -> int:
+        return len(self.__accounts)
+
+    def add_account(self,
+                    name: str,
+                    instance: str,
+                    token: Optional[str] = None,
+                    *,
+                    secure_connect: bool = True,
+                    **options: Any) -> Bromine:
+        """アカウントを追加する
+
+        実行中に追加した場合も、順番が来たら接続を開始します。
+
+        Parameters
+        ----------
+        name: str
+            アカウントの名前(管理用)
+        instance: str
+            インスタンス名
+        token: :obj:`str`, optional
+            トークン
+        secure_connect: :obj:`bool`, default True
+            セキュアな接続をするかどうか
+        **options: Any
+            Bromineに渡す引数、schedulerは共有のものが使われます
+
+        Returns
+        -------
+        Bromine
+            追加したアカウントのBromine、ws_connect等はこれに対して使います
+
+        Raises
+        ------
+        ValueError
+            名前がすでに使われている時"""
+        if name in self.__accounts:
+            raise ValueError(ExceptionTexts.ID_ALREADY_RESERVED)
+        options["scheduler"] = self.__scheduler
+        options.setdefault("metrics", Metrics())
+        options.setdefault("reconnect_policy", ExponentialBackoff())
+
+        bromine = Bromine(instance, token, secure_connect=secure_connect, **options)
+        self.__accounts[name] = bromine
+        self.__log(f"add account. name: {name}, instance: {instance}")
+        if self.__is_running:
+            self.__start_queue.put_nowait(name)
+        return bromine
+
+    def remove_account(self, name: str) -> None:
+        """アカウントを取り除く、実行中の場合はメイン関数を止める
+
+        Parameters
+        ----------
+        name: str
+            アカウントの名前
+
+        Raises
+        ------
+        ValueError
+            名前が不適のとき"""
+        if self.__accounts.pop(name, None) is None:
+            raise ValueError(ExceptionTexts.ID_INVALID)
+        self.__errors.pop(name, None)
+        if (task := self.__tasks.pop(name, None)) is not None:
+            task.cancel()
+        self.__log(f"remove account. name: {name}")
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """アカウントごとの使っている量をまとめて返す
+
+        Returns
+        -------
+        dict[str, dict[str, Any]]
+            名前: 情報の辞書
+
+            情報の辞書はrunning, latency, frames_received, handler_count, handler_seconds,
+            send_queue_length, reconnectsを持ちます。Metricsを渡していない場合は数値が0になります。"""
+        result: dict[str, dict[str, Any]] = {}
+        for name, bromine in self.__accounts.items():
+            counters: dict[str, float] = {}
+            gauges: dict[str, float] = {}
+            handler_count = 0
+            handler_seconds = 0.0
+            if (metrics := bromine.metrics) is not None:
+                snapshot = metrics.snapshot()
+                counters = snapshot["counters"]
+                gauges = snapshot["gauges"]
+                for key, histogram in snapshot["histograms"].items():
+                    if key.startswith("handler_seconds"):
+                        handler_count += histogram["count"]
+                        handler_seconds += histogram["sum"]
+            result[name] = {
+                "running": name in self.__tasks,
+                "latency": bromine.latency,
+                "frames_received": _sum_counters(counters, "frames_received_total"),
+                "handler_count": handler_count,
+                "handler_seconds": handler_seconds,
+                "send_queue_length": gauges.get("send_queue_length", 0),
+                "reconnects": _sum_counters(counters, "reconnects_total"),
+            }
+        return result
+
+    async def main(self) -> NoReturn:
+        """全てのアカウントのメイン関数をずらしながら開始する関数
+
+        一つのアカウントのメイン関数が例外で止まっても、他のアカウントは動き続けます。"""
+        self.__log(f"start manager main. accounts: {len(self.__accounts)}")
+        self.__is_running = True
+        self.__start_queue = asyncio.Queue()
+        for name in self.__accounts:
+            self.__start_queue.put_nowait(name)
+        try:
+            while True:
+                name = await self.__start_queue.get()
+                if name not in self.__accounts or name in self.__tasks:
+                    # 開始する前に取り除かれた、もしくはもう動いている
+                    continue
+                self.__tasks[name] = asyncio.create_task(self.__run_account(name, self.__accounts[name]))
+                # 一斉に接続しないように少し待つ
+                await asyncio.sleep(self.__stagger)
+        finally:
+            tasks = tuple(self.__tasks.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.__tasks.clear()
+            self.__is_running = False
+            self.__log("finish manager main.")
+
+    async def __run_account(self, name: str, bromine: Bromine) -> None:
+        try:
+            await bromine.main()
+        except Exception as e:
+            # 他のアカウントは止めない
+            self.__log(f"account main stopped. name: {name}, error: {type(e)}, args: {e.args}")
+            self.__errors[name] = e
+        finally:
+            if self.__tasks.get(name) is asyncio.current_task():
+                self.__tasks.pop(name)
@@ -0,0 +1,193 @@
+from bisect import bisect_left
+from typing import Any, Callable, Optional
+
+
+__all__ = ["Metrics", "Histogram"]
+
+
+# 秒単位の処理時間を測るのにちょうどいいくらいのバケット
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+def _label_text(labels: tuple[tuple[str, str], ...], extra: str = "") -> str:
+    """prometheus形式のラベルの文字列を作る"""
+    texts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        texts.append(extra)
+    return "{" + ",".join(texts) + "}" if texts else ""
+
+
+class Histogram:
+    """値の分布を記録するやつ
+
+    Parameters
+    ----------
+    buckets: tuple[float, ...]
+        バケットの上限値(昇順)"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        # 最後の一つは+Inf用
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """値を記録する"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """q分位点をバケットの上限値で大まかに返す
+
+        一つも記録されていない時はNone、+Infのバケットに入る時はinf"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict[str, Any]:
+        """今の状態を辞書で返す"""
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip((*self.buckets, float("inf")), self.counts)),
+        }
+
+
+class Metrics:
+    """Bromineの中の色々な数値を記録するやつ
+
+    Bromineに渡すと受信した数や処理時間等を記録します。
+    渡さない場合は何も記録しないので速度に影響はありません。
+
+    Parameters
+    ----------
+    buckets: :obj:`tuple[float, ...]`, optional
+        ヒストグラムのバケットの上限値(昇順)"""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.__buckets = buckets
+        # tuple[名前, ラベル]: 値
+        self.__counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+        self.__histograms: dict[tuple[str, tuple[tuple[str, str], ...]], Histogram] = {}
+        # 名前: 値を返す関数
+        self.__gauges: dict[str, Callable[[], float]] = {}
+
+    def inc(self, name: str, labels: tuple[tuple[str, str], ...] = (), value: float = 1) -> None:
+        """カウンターを増やす
+
+        Parameters
+        ----------
+        name: str
+            名前
+        labels: :obj:`tuple[tuple[str, str], ...]`, optional
+            ラベルの組
+        value: :obj:`float`, default 1
+            増やす値"""
+        key = (name, labels)
+        self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: tuple[tuple[str, str], ...] = ()) -> None:
+        """ヒストグラムに値を記録する
+
+        Parameters
+        ----------
+        name: str
+            名前
+        value: float
+            記録する値
+        labels: :obj:`tuple[tuple[str, str], ...]`, optional
+            ラベルの組"""
+        key = (name, labels)
+        if (histogram := self.__histograms.get(key)) is None:
+            histogram = self.__histograms[key] = Histogram(self.__buckets)
+        histogram.observe(value)
+
+    def gauge(self, name: str, func: Callable[[], float]) -> None:
+        """スナップショットを取る時に値を読むゲージを登録する
+
+        Parameters
+        ----------
+        name: str
+            名前
+        func: Callable[[], float]
+            今の値を返す関数"""
+        self.__gauges[name] = func
+
+    def counter(self, name: str, labels: tuple[tuple[str, str], ...] = ()) -> float:
+        """カウンターの値を返す"""
+        return self.__counters.get((name, labels), 0)
+
+    def histogram(self, name: str, labels: tuple[tuple[str, str], ...] = ()) -> Optional[Histogram]:
+        """ヒストグラムを返す、まだ記録されていない時はNone"""
+        return self.__histograms.get((name, labels))
+
+    def reset(self) -> None:
+        """カウンターとヒストグラムを全部消す"""
+        self.__counters.clear()
+        self.__histograms.clear()
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """今の値をまとめて返す
+
+        Returns
+        -------
+        dict[str, dict[str, Any]]
+            `counters`, `gauges`, `histograms`の辞書
+
+            それぞれの辞書のキーは`名前{ラベル}`の形の文字列です。"""
+        return {
+            "counters": {name + _label_text(labels): value for (name, labels), value in self.__counters.items()},
+            "gauges": {name: func() for name, func in self.__gauges.items()},
+            "histograms": {
+                name + _label_text(labels): histogram.snapshot()
+                for (name, labels), histogram in self.__histograms.items()
+            },
+        }
+
+    def to_prometheus(self, prefix: str = "bromine") -> str:
+        """prometheusのテキスト形式で出力する
+
+        Parameters
+        ----------
+        prefix: :obj:`str`, default "bromine"
+            名前の頭に付ける文字列"""
+        lines: list[str] = []
+        typed: set[str] = set()
+
+        for (name, labels), value in sorted(self.__counters.items()):
+            full = f"{prefix}_{name}"
+            if full not in typed:
+                typed.add(full)
+                lines.append(f"# TYPE {full} counter")
+            lines.append(f"{full}{_label_text(labels)} {value}")
+
+        for name, func in sorted(self.__gauges.items()):
+            full = f"{prefix}_{name}"
+            lines.append(f"# TYPE {full} gauge")
+            lines.append(f"{full} {func()}")
+
+        for (name, labels), histogram in sorted(self.__histograms.items(), key=lambda i: i[0]):
+            full = f"{prefix}_{name}"
+            if full not in typed:
+                typed.add(full)
+                lines.append(f"# TYPE {full} histogram")
+            total = 0
+            for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                total += count
+                le = f'le="{bound}"'
+                lines.append(f"{full}_bucket{_label_text(labels, le)} {total}")
+            lines.append(f"{full}_sum{_label_text(labels)} {histogram.sum}")
+            lines.append(f"{full}_count{_label_text(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
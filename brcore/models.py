@@ -0,0 +1,332 @@
+import asyncio
+from typing import AbstractSet, Any, Callable, Coroutine, Hashable, Optional, Union
+
+from brcore.enum import (
+    ExceptionTexts
+)
+
+
+__all__ = [
+    "User",
+    "Note",
+    "Notification",
+    "ChannelEvent",
+    "Reacted",
+    "Unreacted",
+    "Deleted",
+    "PollVoted",
+    "NoteUpdatedEvent",
+    "decode_channel_event",
+    "decode_note_updated",
+    "typed_handler",
+]
+
+
+class User:
+    """ユーザー(UserLite)"""
+    __slots__ = ("id", "username", "name", "host", "avatar_url", "is_bot", "is_cat")
+
+    def __init__(self,
+                 id: str,
+                 username: str,
+                 name: Optional[str],
+                 host: Optional[str],
+                 avatar_url: Optional[str],
+                 is_bot: bool,
+                 is_cat: bool) -> None:
+        self.id = id
+        self.username = username
+        self.name = name
+        self.host = host
+        self.avatar_url = avatar_url
+        self.is_bot = is_bot
+        self.is_cat = is_cat
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "User":
+        return cls(
+            data["id"],
+            data["username"],
+            data.get("name"),
+            data.get("host"),
+            data.get("avatarUrl"),
+            data.get("isBot", False),
+            data.get("isCat", False),
+        )
+
+    def __repr__(self) -> str:
+        return f"User(id={self.id!r}, username={self.username!r}, host={self.host!r})"
+
+
+class Note:
+    """ノート"""
+    __slots__ = (
+        "id", "created_at", "user_id", "user", "text", "cw", "visibility",
+        "reply_id", "renote_id", "reply", "renote", "file_ids",
+        "reactions", "reaction_count", "renote_count", "replies_count", "raw",
+    )
+
+    def __init__(self,
+                 id: str,
+                 created_at: str,
+                 user_id: str,
+                 user: User,
+                 text: Optional[str],
+                 cw: Optional[str],
+                 visibility: str,
+                 reply_id: Optional[str],
+                 renote_id: Optional[str],
+                 reply: Optional["Note"],
+                 renote: Optional["Note"],
+                 file_ids: tuple[str, ...],
+                 reactions: dict[str, int],
+                 reaction_count: int,
+                 renote_count: int,
+                 replies_count: int,
+                 raw: Optional[dict[str, Any]] = None) -> None:
+        self.id = id
+        self.created_at = created_at
+        self.user_id = user_id
+        self.user = user
+        self.text = text
+        self.cw = cw
+        self.visibility = visibility
+        self.reply_id = reply_id
+        self.renote_id = renote_id
+        self.reply = reply
+        self.renote = renote
+        self.file_ids = file_ids
+        self.reactions = reactions
+        self.reaction_count = reaction_count
+        self.renote_count = renote_count
+        self.replies_count = replies_count
+        # モデルに載っていない項目を見たい時用、keep_rawがTrueの時だけ
+        self.raw = raw
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], keep_raw: bool = False) -> "Note":
+        reply = data.get("reply")
+        renote = data.get("renote")
+        return cls(
+            data["id"],
+            data["createdAt"],
+            data["userId"],
+            User.from_dict(data["user"]),
+            data.get("text"),
+            data.get("cw"),
+            data.get("visibility", "public"),
+            data.get("replyId"),
+            data.get("renoteId"),
+            cls.from_dict(reply, keep_raw) if reply else None,
+            cls.from_dict(renote, keep_raw) if renote else None,
+            tuple(data.get("fileIds") or ()),
+            data.get("reactions") or {},
+            data.get("reactionCount", 0),
+            data.get("renoteCount", 0),
+            data.get("repliesCount", 0),
+            data if keep_raw else None,
+        )
+
+    @property
+    def is_pure_renote(self) -> bool:
+        """本文なしのリノートかどうか"""
+        return self.renote_id is not None and self.text is None and not self.file_ids
+
+    def __repr__(self) -> str:
+        return f"Note(id={self.id!r}, user={self.user.username!r}, text={self.text!r})"
+
+
+class Notification:
+    """通知"""
+    __slots__ = ("id", "type", "created_at", "user", "note", "reaction", "raw")
+
+    def __init__(self,
+                 id: str,
+                 type: str,
+                 created_at: str,
+                 user: Optional[User],
+                 note: Optional[Note],
+                 reaction: Optional[str],
+                 raw: Optional[dict[str, Any]] = None) -> None:
+        self.id = id
+        self.type = type
+        self.created_at = created_at
+        self.user = user
+        self.note = note
+        self.reaction = reaction
+        self.raw = raw
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], keep_raw: bool = False) -> "Notification":
+        user = data.get("user")
+        note = data.get("note")
+        return cls(
+            data["id"],
+            data["type"],
+            data["createdAt"],
+            User.from_dict(user) if user else None,
+            Note.from_dict(note, keep_raw) if note else None,
+            data.get("reaction"),
+            data if keep_raw else None,
+        )
+
+    def __repr__(self) -> str:
+        return f"Notification(id={self.id!r}, type={self.type!r})"
+
+
+class ChannelEvent:
+    """チャンネルの情報
+
+    bodyはtypeに応じてNoteかNotification、対応していないtypeの場合はそのままの辞書です。
+    sourcesは重複を弾いている時だけ、ノートが来たチャンネルの識別idの集合です。"""
+    __slots__ = ("id", "type", "body", "sources")
+
+    def __init__(self,
+                 id: str,
+                 type: str,
+                 body: Union[Note, Notification, Any],
+                 sources: Optional[AbstractSet[Hashable]] = None) -> None:
+        self.id = id
+        self.type = type
+        self.body = body
+        self.sources = sources
+
+    def __repr__(self) -> str:
+        return f"ChannelEvent(id={self.id!r}, type={self.type!r}, body={self.body!r})"
+
+
+class Reacted:
+    """noteUpdatedのreacted"""
+    __slots__ = ("reaction", "emoji", "user_id")
+
+    def __init__(self, reaction: str, emoji: Optional[dict[str, Any]], user_id: Optional[str]) -> None:
+        self.reaction = reaction
+        self.emoji = emoji
+        self.user_id = user_id
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Reacted":
+        return cls(data["reaction"], data.get("emoji"), data.get("userId"))
+
+
+class Unreacted(Reacted):
+    """noteUpdatedのunreacted"""
+    __slots__ = ()
+
+
+class Deleted:
+    """noteUpdatedのdeleted"""
+    __slots__ = ("deleted_at",)
+
+    def __init__(self, deleted_at: Optional[str]) -> None:
+        self.deleted_at = deleted_at
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Deleted":
+        return cls(data.get("deletedAt"))
+
+
+class PollVoted:
+    """noteUpdatedのpollVoted"""
+    __slots__ = ("choice", "user_id")
+
+    def __init__(self, choice: int, user_id: Optional[str]) -> None:
+        self.choice = choice
+        self.user_id = user_id
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "PollVoted":
+        return cls(data["choice"], data.get("userId"))
+
+
+class NoteUpdatedEvent:
+    """キャプチャしたノートの情報
+
+    bodyはtypeに応じてReacted, Unreacted, Deleted, PollVoted、対応していないtypeの場合はそのままの辞書です。"""
+    __slots__ = ("id", "type", "body")
+
+    def __init__(self, id: str, type: str, body: Union[Reacted, Deleted, PollVoted, Any]) -> None:
+        self.id = id
+        self.type = type
+        self.body = body
+
+    def __repr__(self) -> str:
+        return f"NoteUpdatedEvent(id={self.id!r}, type={self.type!r})"
+
+
+# チャンネルの情報のtype: モデル
+# タイムライン(MisskeyChannelNames.*_TIMELINE)はnote、
+# メイン(MisskeyChannelNames.MAIN)はnotification, mention, reply, renoteが主に来る
+CHANNEL_EVENT_MODELS: dict[str, Callable[[dict[str, Any], bool], Any]] = {
+    "note": Note.from_dict,
+    "mention": Note.from_dict,
+    "reply": Note.from_dict,
+    "renote": Note.from_dict,
+    "notification": Notification.from_dict,
+}
+
+# noteUpdatedのtype: モデル
+NOTE_UPDATED_MODELS: dict[str, Callable[[dict[str, Any]], Any]] = {
+    "reacted": Reacted.from_dict,
+    "unreacted": Unreacted.from_dict,
+    "deleted": Deleted.from_dict,
+    "pollVoted": PollVoted.from_dict,
+}
+
+
+def decode_channel_event(body: dict[str, Any], keep_raw: bool = False) -> ChannelEvent:
+    """チャンネルの情報(`{"id", "type", "body"}`)をモデルにする
+
+    Parameters
+    ----------
+    body: dict[str, Any]
+        チャンネルの情報
+    keep_raw: :obj:`bool`, default False
+        NoteやNotificationのrawに元の辞書を残すかどうか"""
+    type_ = body["type"]
+    if (model := CHANNEL_EVENT_MODELS.get(type_)) is not None:
+        return ChannelEvent(body["id"], type_, model(body["body"], keep_raw), body.get("sources"))
+    return ChannelEvent(body["id"], type_, body.get("body"), body.get("sources"))
+
+
+def decode_note_updated(body: dict[str, Any], keep_raw: bool = False) -> NoteUpdatedEvent:
+    """noteUpdatedの情報(`{"id", "type", "body"}`)をモデルにする
+
+    keep_rawは引数を揃えるためにあるもので、使われません"""
+    type_ = body["type"]
+    if (model := NOTE_UPDATED_MODELS.get(type_)) is not None:
+        return NoteUpdatedEvent(body["id"], type_, model(body["body"]))
+    return NoteUpdatedEvent(body["id"], type_, body.get("body"))
+
+
+def typed_handler(func: Callable[[Any], Coroutine[Any, Any, None]],
+                  decoder: Callable[[dict[str, Any], bool], Any] = decode_channel_event,
+                  keep_raw: bool = False) -> Callable[[dict[str, Any]], Coroutine[Any, Any, None]]:
+    """辞書の代わりにモデルを受け取るようにする
+
+    Parameters
+    ----------
+    func: CoroutineFunction
+        モデルを受け取る非同期関数
+    decoder: :obj:`Callable`, default decode_channel_event
+        辞書をモデルにする関数
+    keep_raw: :obj:`bool`, default False
+        モデルに元の辞書を残すかどうか
+
+    Returns
+    -------
+    CoroutineFunction
+        ws_connect等に渡せる非同期関数
+
+    Raises
+    ------
+    TypeError
+        非同期関数funcがcoroutinefunctionでない時"""
+    if not asyncio.iscoroutinefunction(func):
+        raise TypeError(ExceptionTexts.FUNCTION_NOT_COROUTINEFUNC)
+
+    async def _wrap(body: dict[str, Any]) -> None:
+        # モデルにするのはタスクの中なので受信ループは止めない
+        await func(decoder(body, keep_raw))
+
+    return _wrap
@@ -0,0 +1,181 @@
+import asyncio
+import random
+from typing import Any, Callable, Coroutine, Optional
+
+from brcore.enum import (
+    ExceptionTexts
+)
+
+
+__all__ = ["ReconnectGiveUp", "ReconnectPolicy", "FixedDelay", "ExponentialBackoff"]
+
+
+class ReconnectGiveUp(Exception):
+    """再接続を諦めた時に投げられる例外
+
+    Attributes
+    ----------
+    attempts: int
+        諦めるまでに失敗した回数"""
+    def __init__(self, attempts: int) -> None:
+        super().__init__(ExceptionTexts.RECONNECT_GIVE_UP, attempts)
+        self.attempts = attempts
+
+
+class ReconnectPolicy:
+    """再接続するまでの待ち時間を決めるやつの基底クラス
+
+    独自のものを作る場合はこれを継承して`delay`を上書きしてください。
+
+    Parameters
+    ----------
+    on_retry: :obj:`CoroutineFunction`, optional
+        再接続まで待つ前に実行される非同期関数
+
+        引数は(失敗した回数, 待つ秒数, 起きた例外)です。
+    on_give_up: :obj:`CoroutineFunction`, optional
+        再接続を諦めた時に実行される非同期関数
+
+        引数は(失敗した回数, 起きた例外)です。
+
+    Raises
+    ------
+    TypeError
+        on_retryかon_give_upがcoroutinefunctionでない時"""
+
+    def __init__(self,
+                 on_retry: Optional[Callable[[int, float, Optional[BaseException]], Coroutine[Any, Any, None]]] = None,
+                 on_give_up: Optional[Callable[[int, Optional[BaseException]], Coroutine[Any, Any, None]]] = None
+                 ) -> None:
+        for func in (on_retry, on_give_up):
+            if func is not None and not asyncio.iscoroutinefunction(func):
+                raise TypeError(ExceptionTexts.FUNCTION_NOT_COROUTINEFUNC)
+        self.on_retry = on_retry
+        self.on_give_up = on_give_up
+
+    def delay(self, attempt: int) -> Optional[float]:
+        """再接続するまで待つ秒数を返す
+
+        Parameters
+        ----------
+        attempt: int
+            連続で失敗した回数(1から始まる)
+
+        Returns
+        -------
+        Optional[float]
+            待つ秒数、再接続を諦める時はNone"""
+        raise NotImplementedError
+
+    async def wait(self, attempt: int, error: Optional[BaseException] = None) -> None:
+        """再接続するまで待つ
+
+        Parameters
+        ----------
+        attempt: int
+            連続で失敗した回数(1から始まる)
+        error: :obj:`BaseException`, optional
+            起きた例外
+
+        Raises
+        ------
+        ReconnectGiveUp
+            再接続を諦めた時"""
+        delay = self.delay(attempt)
+        if delay is None:
+            if self.on_give_up is not None:
+                await self.on_give_up(attempt, error)
+            raise ReconnectGiveUp(attempt) from error
+        if self.on_retry is not None:
+            await self.on_retry(attempt, delay, error)
+        await asyncio.sleep(delay)
+
+
+class FixedDelay(ReconnectPolicy):
+    """毎回同じ時間待つやつ
+
+    Parameters
+    ----------
+    delay_time: float
+        待つ秒数
+    long_delay: :obj:`float`, default 30
+        失敗し続けた時に追加で待つ秒数
+    long_after: :obj:`int`, default 5
+        何回連続で失敗したらlong_delayを追加するか
+    max_attempts: :obj:`int`, optional
+        何回連続で失敗したら諦めるか、指定しない場合諦めない
+    **callbacks: Any
+        on_retry, on_give_up"""
+
+    def __init__(self,
+                 delay_time: float,
+                 long_delay: float = 30,
+                 long_after: int = 5,
+                 max_attempts: Optional[int] = None,
+                 **callbacks: Any) -> None:
+        super().__init__(**callbacks)
+        self.delay_time = delay_time
+        self.long_delay = long_delay
+        self.long_after = long_after
+        self.max_attempts = max_attempts
+
+    def delay(self, attempt: int) -> Optional[float]:
+        if self.max_attempts is not None and attempt > self.max_attempts:
+            return None
+        if attempt > self.long_after:
+            return self.delay_time + self.long_delay
+        return self.delay_time
+
+
+class ExponentialBackoff(ReconnectPolicy):
+    """失敗するたびに待ち時間を倍々にするやつ
+
+    jitterが有効な場合、0から計算した待ち時間までの間でランダムに待ちます(full jitter)。
+    大量のクライアントが同時に再接続しに行くのを防げます。
+
+    Parameters
+    ----------
+    base: :obj:`float`, default 1.0
+        最初に待つ秒数
+    factor: :obj:`float`, default 2.0
+        失敗するたびに待ち時間に掛ける数
+    cap: :obj:`float`, default 60.0
+        待ち時間の上限
+    max_attempts: :obj:`int`, optional
+        何回連続で失敗したら諦めるか、指定しない場合諦めない
+    jitter: :obj:`bool`, default True
+        待ち時間をランダムにするかどうか
+    **callbacks: Any
+        on_retry, on_give_up
+
+    Raises
+    ------
+    ValueError
+        base, factor, capが正の値でない時"""
+
+    def __init__(self,
+                 base: float = 1.0,
+                 factor: float = 2.0,
+                 cap: float = 60.0,
+                 max_attempts: Optional[int] = None,
+                 jitter: bool = True,
+                 **callbacks: Any) -> None:
+        super().__init__(**callbacks)
+        if base <= 0 or factor <= 0 or cap <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+        self.max_attempts = max_attempts
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> Optional[float]:
+        if self.max_attempts is not None and attempt > self.max_attempts:
+            return None
+        # 大きくなりすぎてOverflowErrorにならないように先に上限で切る
+        delay = self.cap
+        if attempt < 64:
+            delay = min(self.cap, self.base * self.factor ** (attempt - 1))
+        if self.jitter:
+            return random.uniform(0, delay)
+        return delay
@@ -0,0 +1,194 @@
+import logging
+import sys
+from typing import Any, Awaitable, Callable, Coroutine, Iterator, Optional, Union
+
+from brcore.util import (
+    InlineHandler
+)
+from brcore.filters import (
+    NoteFilter
+)
+from brcore.enum import (
+    ExceptionTexts,
+    Priority
+)
+
+
+__all__ = ["Route", "RoutingTable"]
+
+
+# ワイルドカードの識別id
+ALLMATCH = sys.intern("ALLMATCH")
+
+
+class Route:
+    """一つの振り分け先(type情報と識別idの組)
+
+    受信ループの中で毎回作っていたものを登録した時に作っておきます。"""
+    __slots__ = ("key", "type", "id", "handlers", "inline", "func", "note_filter", "priority", "labels")
+
+    def __init__(self, type: str, id: str) -> None:
+        self.type = sys.intern(type)
+        self.id = sys.intern(id)
+        # スケジューラー等の識別idに使うtuple[type, id]
+        self.key = (self.type, self.id)
+        # 登録された順のハンドラー
+        self.handlers: list[Union[Callable[[Any], Coroutine[Any, Any, None]], InlineHandler]] = []
+        # タスクを作らずに渡すハンドラー
+        self.inline: tuple[InlineHandler, ...] = ()
+        # タスクを作って渡す非同期関数(複数ある時はまとめたもの)
+        self.func: Optional[Callable[[Any], Coroutine[Any, Any, None]]] = None
+        self.note_filter: Optional[NoteFilter] = None
+        self.priority = Priority.NORMAL
+        # メトリクスのラベル
+        self.labels = (("type", self.type), ("priority", self.priority))
+
+    def add(self, func: Union[Callable[[Any], Coroutine[Any, Any, None]], InlineHandler]) -> None:
+        self.handlers.append(func)
+        self.__compile()
+
+    def discard(self, func: Union[Callable[[Any], Coroutine[Any, Any, None]], InlineHandler]) -> None:
+        """追加したハンドラーを外す、ない時は何もしない"""
+        if func in self.handlers:
+            self.handlers.remove(func)
+            self.__compile()
+
+    def set_priority(self, priority: str) -> None:
+        self.priority = priority
+        self.labels = (("type", self.type), ("priority", priority))
+
+    def push(self, arg: Any) -> Optional[Awaitable[None]]:
+        """InlineHandlerに渡す、待つ必要がある時だけawaitable"""
+        if len(self.inline) == 1:
+            return self.inline[0].push(arg)
+        waits = [wait for handler in self.inline if (wait := handler.push(arg)) is not None]
+        if not waits:
+            return None
+        return _wait_all(waits)
+
+    def close(self) -> None:
+        """InlineHandlerを閉じる"""
+        for handler in self.inline:
+            handler.close()
+
+    def __compile(self) -> None:
+        self.inline = tuple(i for i in self.handlers if isinstance(i, InlineHandler))
+        funcs = tuple(i for i in self.handlers if not isinstance(i, InlineHandler))
+        if not funcs:
+            self.func = None
+        elif len(funcs) == 1:
+            self.func = funcs[0]
+        else:
+            self.func = _fanout(funcs)
+
+
+async def _wait_all(waits: list[Awaitable[None]]) -> None:
+    for wait in waits:
+        await wait
+
+
+def _fanout(funcs: tuple[Callable[[Any], Coroutine[Any, Any, None]], ...]) -> Callable[[Any], Coroutine[Any, Any, None]]:
+    """複数の非同期関数を一つのタスクで順番に実行する非同期関数にする"""
+    logger = logging.getLogger("Bromine")
+
+    async def _run(arg: Any) -> None:
+        error: Optional[Exception] = None
+        for func in funcs:
+            try:
+                await func(arg)
+            except Exception as e:
+                # 一つの失敗で他のハンドラーを止めない
+                logger.debug(f"handler error occured: {type(e)}, args: {e.args}")
+                if error is None:
+                    error = e
+        if error is not None:
+            # 最初の例外をメトリクスやガードに伝える
+            raise error
+
+    return _run
+
+
+class RoutingTable:
+    """type情報と識別idから振り分け先を引く表
+
+    識別idが一致しない場合は、そのtype情報のワイルドカード(`ALLMATCH`)に振り分けます。
+
+    Note
+    ----
+    識別id(uuidやノートID)はtype情報をまたいでもほとんど被らないので、識別idだけをキーにして引き、
+    type情報は見つかった振り分け先と比べるだけにしています。
+    (受信ループではデコードしたばかりの文字列のハッシュを計算することになるので、キーは少ない方が速い)
+
+    同じ識別idが別のtype情報で登録された時だけ、tuple[type, id]をキーにした辞書を使います。"""
+
+    def __init__(self) -> None:
+        # 識別id: Route
+        self.__routes: dict[str, Route] = {}
+        # tuple[type, id]: Route、識別idが他のtype情報ですでに使われている物
+        self.__shadowed: dict[tuple[str, str], Route] = {}
+        # type: ワイルドカードのRoute
+        self.__wildcards: dict[str, Route] = {}
+        # 一度でも登録されたtype情報
+        self.__types: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.__routes) + len(self.__shadowed) + len(self.__wildcards)
+
+    def __iter__(self) -> Iterator[Route]:
+        return iter((*self.__routes.values(), *self.__shadowed.values(), *self.__wildcards.values()))
+
+    def lookup(self, type: str, id: Optional[str]) -> Optional[Route]:
+        """受信した情報の振り分け先を引く、受信ループの中で呼ばれる"""
+        if id:
+            if (route := self.__routes.get(id)) is not None and route.type == type:
+                return route
+            if self.__shadowed and (route := self.__shadowed.get((type, id))) is not None:
+                return route
+        return self.__wildcards.get(type)
+
+    def get(self, type: str, id: str) -> Optional[Route]:
+        """登録した振り分け先を取ってくる(ワイルドカードには振り分けない)"""
+        if id == ALLMATCH:
+            return self.__wildcards.get(type)
+        if (route := self.__routes.get(id)) is not None and route.type == type:
+            return route
+        return self.__shadowed.get((type, id))
+
+    def add(self, type: str, id: str, func: Union[Callable[[Any], Coroutine[Any, Any, None]], InlineHandler]) -> Route:
+        """振り分け先を登録する
+
+        Raises
+        ------
+        ValueError
+            idがすでに予約済みの場合"""
+        if self.get(type, id) is not None:
+            raise ValueError(ExceptionTexts.ID_ALREADY_RESERVED)
+        route = Route(type, id)
+        route.add(func)
+        if route.id == ALLMATCH:
+            self.__wildcards[route.type] = route
+        elif route.id in self.__routes:
+            self.__shadowed[route.key] = route
+        else:
+            self.__routes[route.id] = route
+        self.__types.add(route.type)
+        return route
+
+    def remove(self, type: str, id: str) -> Route:
+        """振り分け先を削除する
+
+        Raises
+        ------
+        ValueError
+            type情報か識別idが不適のとき"""
+        if (route := self.get(type, id)) is None:
+            if type not in self.__types:
+                raise ValueError(ExceptionTexts.TYPE_INVALID)
+            raise ValueError(ExceptionTexts.ID_INVALID)
+        if route.id == ALLMATCH:
+            del self.__wildcards[route.type]
+        elif self.__routes.get(route.id) is route:
+            del self.__routes[route.id]
+        else:
+            del self.__shadowed[route.key]
+        return route
@@ -0,0 +1,141 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from brcore.util import (
+    InlineHandler
+)
+from brcore.enum import (
+    ExceptionTexts
+)
+
+
+__all__ = ["ChannelStream"]
+
+
+# 閉じたことを待っている人に知らせるためのもの
+_CLOSED = object()
+
+
+class ChannelStream(InlineHandler):
+    """チャンネルの情報を`async for`で受け取るためのやつ
+
+    Bromine.streamで作られます。中身は長さに上限のある待ち行列で、
+    一杯になると受信ループが空くまで止まります。
+
+    Parameters
+    ----------
+    maxsize: int
+        溜めておく情報の数の上限
+    decoder: :obj:`Callable[[Any], Any]`, optional
+        取り出す時に情報を変換する関数(brcore.models.decode_channel_event等)
+
+    Raises
+    ------
+    ValueError
+        maxsizeが正の値でない時"""
+
+    def __init__(self, maxsize: int, decoder: Optional[Callable[[Any], Any]] = None) -> None:
+        if maxsize <= 0:
+            raise ValueError(ExceptionTexts.VALUE_NOT_POSITIVE)
+        self.__maxsize = maxsize
+        self.__decoder = decoder
+        self.__buffer: deque[Any] = deque()
+        # 情報を待っている人
+        self.__getters: deque[asyncio.Future] = deque()
+        # 空きを待っている人
+        self.__putters: deque[asyncio.Future] = deque()
+        self.__closed = False
+        # 閉じる時に接続解除する関数(Bromine.streamで設定される)
+        self.__on_close: Optional[Callable[[], None]] = None
+        self.id: Optional[str] = None
+
+    @property
+    def maxsize(self) -> int:
+        """溜めておく情報の数の上限"""
+        return self.__maxsize
+
+    @property
+    def closed(self) -> bool:
+        """閉じているかどうか"""
+        return self.__closed
+
+    def __len__(self) -> int:
+        return len(self.__buffer)
+
+    def bind(self, id: str, on_close: Callable[[], None]) -> None:
+        """接続と結びつける、Bromine.streamで呼ばれるので普通は触らなくても大丈夫です"""
+        self.id = id
+        self.__on_close = on_close
+
+    def push(self, body: Any) -> Optional[Awaitable[None]]:
+        if self.__closed:
+            return None
+        while self.__getters:
+            getter = self.__getters.popleft()
+            if not getter.done():
+                # 待っている人に直接渡す
+                getter.set_result(body)
+                return None
+        if len(self.__buffer) < self.__maxsize:
+            self.__buffer.append(body)
+            return None
+        # 一杯なので受信ループを止める
+        return self.__put_wait(body)
+
+    async def __put_wait(self, body: Any) -> None:
+        while len(self.__buffer) >= self.__maxsize and not self.__closed:
+            putter = asyncio.get_running_loop().create_future()
+            self.__putters.append(putter)
+            await putter
+        if not self.__closed:
+            self.__buffer.append(body)
+
+    def close(self) -> None:
+        """閉じる、溜まっている情報は取り出し切るまで取り出せます"""
+        if self.__closed:
+            return
+        self.__closed = True
+        for getter in self.__getters:
+            if not getter.done():
+                getter.set_result(_CLOSED)
+        for putter in self.__putters:
+            if not putter.done():
+                putter.set_result(None)
+        self.__getters.clear()
+        self.__putters.clear()
+
+    async def aclose(self) -> None:
+        """接続解除して閉じる"""
+        if not self.__closed and self.__on_close is not None:
+            # 接続解除するとcloseが呼ばれる
+            self.__on_close()
+        self.close()
+
+    def __aiter__(self) -> "ChannelStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        if self.__buffer:
+            body = self.__buffer.popleft()
+            while self.__putters:
+                putter = self.__putters.popleft()
+                if not putter.done():
+                    # 空きができたので受信ループを再開させる
+                    putter.set_result(None)
+                    break
+        elif self.__closed:
+            raise StopAsyncIteration
+        else:
+            getter = asyncio.get_running_loop().create_future()
+            self.__getters.append(getter)
+            body = await getter
+            if body is _CLOSED:
+                raise StopAsyncIteration
+        return self.__decoder(body) if self.__decoder is not None else body
+
+    async def __aenter__(self) -> "ChannelStream":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
@@ -1,4 +1,10 @@
 import asyncio
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Coroutine, Optional
+
+from brcore.enum import (
+    ExceptionTexts
+)
 
 
 class BackgroundTasks(set):
@@ -14,3 +20,65 @@ class BackgroundTasks(set):
         """タスク達をキャンセル"""
         for i in self:
             i.cancel()
+
+
+class InlineHandler:
+    """タスクを作らずに受信ループの中で直接情報を受け取るハンドラーの基底クラス
+
+    `_add_ws_type_id`等に非同期関数の代わりに渡せます。"""
+    def push(self, body: Any) -> Optional[Awaitable[None]]:
+        """情報を受け取る
+
+        受信ループの中で呼ばれるので、重い処理はしないでください。
+
+        Returns
+        -------
+        Optional[Awaitable[None]]
+            受信を止めて待たせたい時のみawaitable"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """メイン関数が終わった時や接続解除した時に呼ばれる"""
+        pass
+
+
+def executor_handler(func: Callable[[Any], Any],
+                     executor: Optional[Executor] = None,
+                     callback: Optional[Callable[[Any], Coroutine[Any, Any, None]]] = None
+                     ) -> Callable[[Any], Coroutine[Any, Any, None]]:
+    """普通の関数をexecutorで実行する非同期関数にする
+
+    重い処理をする関数をイベントループの外で実行したい時に使います。
+
+    Parameters
+    ----------
+    func: Callable
+        executorで実行する関数
+
+        ProcessPoolExecutorを使う場合、pickleできる関数である必要があります。
+    executor: :obj:`Executor`, optional
+        ThreadPoolExecutorやProcessPoolExecutor、指定しない場合イベントループのデフォルトのexecutor
+    callback: :obj:`CoroutineFunction`, optional
+        funcの返り値を受け取る非同期関数
+
+    Returns
+    -------
+    CoroutineFunction
+        ws_connect等に渡せる非同期関数
+
+    Raises
+    ------
+    TypeError
+        funcがcoroutinefunctionの時、もしくはcallbackがcoroutinefunctionでない時"""
+    if asyncio.iscoroutinefunction(func):
+        raise TypeError(ExceptionTexts.FUNCTION_IS_COROUTINEFUNC)
+    if callback is not None and not asyncio.iscoroutinefunction(callback):
+        raise TypeError(ExceptionTexts.FUNCTION_NOT_COROUTINEFUNC)
+
+    async def _wrap(body: Any) -> None:
+        # bodyはここで一回だけexecutorに渡される
+        result = await asyncio.get_running_loop().run_in_executor(executor, func, body)
+        if callback is not None:
+            await callback(result)
+
+    return _wrap
@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+
+from brcore import Bromine
+from brcore.backfill import Backfill
+from brcore.dedup import DedupCache
+from brcore.filters import NoteFilter
+from brcore.reconnect import FixedDelay
+
+from benchmarks.recording import synthetic
+from benchmarks.server import StreamingServer
+
+
+async def _async_noop(body: dict) -> None:
+    pass
+
+
+class TestBackfillObserve(unittest.IsolatedAsyncioTestCase):
+    """取りこぼしの記録は渡さなかったノートでも進む"""
+
+    async def asyncSetUp(self) -> None:
+        self.server = StreamingServer()
+        await self.server.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.stop()
+
+    async def test_filtered_and_duplicated_notes_move_cursor(self) -> None:
+        backfill = Backfill()
+        brm = Bromine(self.server.instance, secure_connect=False, backfill=backfill, dedup=DedupCache(),
+                      reconnect_policy=FixedDelay(0.0))
+        # 全部捨てるフィルターと、重複で全部捨てられるチャンネル
+        filtered = brm.ws_connect("localTimeline", _async_noop, note_filter=NoteFilter(user_ids=["nobody"]))
+        first = brm.ws_connect("hybridTimeline", _async_noop)
+        duplicated = brm.ws_connect("globalTimeline", _async_noop)
+        task = asyncio.create_task(brm.main())
+        try:
+            for channel in ("localTimeline", "hybridTimeline", "globalTimeline"):
+                await asyncio.wait_for(self.server.wait_subscribers(channel, 1), 5)
+            notes = synthetic(20)
+            frames = [(0.0, channel, body) for channel in ("localTimeline", "hybridTimeline", "globalTimeline")
+                      for _, _, body in notes]
+            await self.server.replay(frames)
+            last = notes[-1][2]["body"]["id"]
+
+            async def _moved() -> None:
+                while backfill.last_id(duplicated) != last:
+                    await asyncio.sleep(0.01)
+            await asyncio.wait_for(_moved(), 5)
+        finally:
+            task.cancel()
+        self.assertEqual(backfill.last_id(filtered), last)
+        self.assertEqual(backfill.last_id(first), last)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import asyncio
+import unittest
+
+from brcore import Bromine
+from brcore.dispatch import DispatchScheduler
+from brcore.metrics import Metrics
+from brcore.reconnect import FixedDelay
+
+from benchmarks.recording import synthetic
+from benchmarks.server import StreamingServer
+
+
+class TestBatch(unittest.IsolatedAsyncioTestCase):
+    """ws_connect_batchでまとめた情報もスケジューラーとメトリクスを通る"""
+
+    async def asyncSetUp(self) -> None:
+        self.server = StreamingServer()
+        await self.server.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.stop()
+
+    async def test_batches_use_scheduler_and_final_flush(self) -> None:
+        scheduler = DispatchScheduler(max_in_flight=1)
+        metrics = Metrics()
+        brm = Bromine(self.server.instance, secure_connect=False, scheduler=scheduler, metrics=metrics,
+                      reconnect_policy=FixedDelay(0.0))
+        sizes: list[int] = []
+        release = asyncio.Event()
+
+        async def handler(batch: list) -> None:
+            await release.wait()
+            sizes.append(len(batch))
+
+        brm.ws_connect_batch("localTimeline", handler, max_size=5, max_latency=60)
+        task = asyncio.create_task(brm.main())
+        try:
+            await asyncio.wait_for(self.server.wait_subscribers("localTimeline", 1), 5)
+            await self.server.replay(synthetic(12))
+
+            async def _queued() -> None:
+                while scheduler.pending < 1:
+                    await asyncio.sleep(0.01)
+            await asyncio.wait_for(_queued(), 5)
+            # 一つずつしか実行されず、二つ目は待ち行列に入っている
+            self.assertEqual(scheduler.in_flight, 1)
+            release.set()
+
+            async def _handled() -> None:
+                while len(sizes) < 2:
+                    await asyncio.sleep(0.01)
+            await asyncio.wait_for(_handled(), 5)
+        finally:
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        # 最後の溜まっていた分は止める時に渡し切られる
+        self.assertEqual(sizes, [5, 5, 2])
+        histograms = metrics.snapshot()["histograms"]
+        self.assertEqual(histograms['handler_seconds{type="channel",priority="normal"}']["count"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+
+from brcore import Bromine
+from brcore.dedup import DedupCache
+from brcore.models import ChannelEvent
+from brcore.reconnect import FixedDelay
+
+from benchmarks.recording import synthetic
+from benchmarks.server import StreamingServer
+
+
+class TestSourceView(unittest.TestCase):
+    def test_view_follows_duplicates(self) -> None:
+        cache = DedupCache()
+        self.assertTrue(cache.check("n1", "tl"))
+        view = cache.view("n1")
+        self.assertEqual(set(view), {"tl"})
+        self.assertFalse(cache.check("n1", "gtl"))
+        # 渡した後に来たチャンネルも見える
+        self.assertEqual(view, {"tl", "gtl"})
+        self.assertIn("gtl", view)
+        self.assertEqual(cache.sources("n1"), frozenset({"tl", "gtl"}))
+        self.assertEqual(len(cache.view("unknown")), 0)
+
+
+class TestDedupSources(unittest.IsolatedAsyncioTestCase):
+    """重複を弾いたノートにも来たチャンネルの集合がついてくる"""
+
+    async def asyncSetUp(self) -> None:
+        self.server = StreamingServer()
+        await self.server.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.stop()
+
+    async def test_delivered_note_has_sources(self) -> None:
+        dedup = DedupCache()
+        brm = Bromine(self.server.instance, secure_connect=False, dedup=dedup, reconnect_policy=FixedDelay(0.0))
+        bodies: list[dict] = []
+        events: list[ChannelEvent] = []
+
+        async def on_local(body: dict) -> None:
+            bodies.append(body)
+
+        async def on_global(event: ChannelEvent) -> None:
+            events.append(event)
+
+        local = brm.ws_connect("localTimeline", on_local)
+        global_ = brm.ws_connect("globalTimeline", on_global, typed=True)
+        task = asyncio.create_task(brm.main())
+        try:
+            for channel in ("localTimeline", "globalTimeline"):
+                await asyncio.wait_for(self.server.wait_subscribers(channel, 1), 5)
+            notes = synthetic(10)
+            # 半分はlocalTimelineだけ、残りは両方に流れる
+            frames = [(0.0, "localTimeline", body) for _, _, body in notes]
+            frames += [(0.0, "globalTimeline", body) for _, _, body in notes[5:]]
+            frames += [(0.0, "globalTimeline", body) for _, _, body in synthetic(12)[10:]]
+            await self.server.replay(frames)
+
+            async def _handled() -> None:
+                while dedup.hits < 5 or len(events) < 2:
+                    await asyncio.sleep(0.01)
+            await asyncio.wait_for(_handled(), 5)
+        finally:
+            task.cancel()
+        self.assertEqual(len(bodies), 10)
+        self.assertEqual([set(i["sources"]) for i in bodies[:5]], [{local}] * 5)
+        # 先に来たlocalTimelineで渡されたものにも後から来たglobalTimelineが入る
+        self.assertEqual([set(i["sources"]) for i in bodies[5:]], [{local, global_}] * 5)
+        self.assertEqual([set(i.sources) for i in events], [{global_}] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import unittest
+
+from brcore import Bromine
+from brcore.dispatch import DispatchScheduler
+from brcore.enum import OverflowPolicy, Priority
+from brcore.reconnect import FixedDelay
+
+from benchmarks.recording import synthetic
+from benchmarks.server import StreamingServer
+
+
+class _Gate:
+    """実行された順番を記録して、openするまで止めておくハンドラー"""
+
+    def __init__(self) -> None:
+        self.started: list[int] = []
+        self.done: list[int] = []
+        self.opened = asyncio.Event()
+
+    async def __call__(self, arg: int) -> None:
+        self.started.append(arg)
+        await self.opened.wait()
+        self.done.append(arg)
+
+    async def wait_done(self, count: int) -> None:
+        async def _loop() -> None:
+            while len(self.done) < count:
+                await asyncio.sleep(0.001)
+        await asyncio.wait_for(_loop(), 5)
+
+
+class TestOverflow(unittest.IsolatedAsyncioTestCase):
+    async def _submit(self, overflow: str, count: int = 5) -> tuple[DispatchScheduler, _Gate]:
+        scheduler = DispatchScheduler(max_in_flight=1, queue_size=2, overflow=overflow)
+        gate = _Gate()
+        for i in range(count):
+            self.assertIsNone(scheduler.submit("tl", gate, i))
+        return scheduler, gate
+
+    async def test_block_parks_and_keeps_order(self) -> None:
+        scheduler, gate = await self._submit(OverflowPolicy.BLOCK)
+        self.assertEqual((scheduler.in_flight, scheduler.pending, scheduler.parked), (1, 4, 2))
+        self.assertEqual(scheduler.depth("tl"), 4)
+        gate.opened.set()
+        await gate.wait_done(5)
+        self.assertEqual(gate.done, [0, 1, 2, 3, 4])
+        self.assertEqual(scheduler.dropped, 0)
+        self.assertEqual(scheduler.pending, 0)
+
+    async def test_drop_newest(self) -> None:
+        scheduler, gate = await self._submit(OverflowPolicy.DROP_NEWEST)
+        gate.opened.set()
+        await gate.wait_done(3)
+        await asyncio.sleep(0.01)
+        self.assertEqual(gate.done, [0, 1, 2])
+        self.assertEqual(scheduler.dropped, 2)
+        self.assertEqual(scheduler.dropped_counts, {"tl": 2})
+
+    async def test_drop_oldest(self) -> None:
+        scheduler, gate = await self._submit(OverflowPolicy.DROP_OLDEST)
+        gate.opened.set()
+        await gate.wait_done(3)
+        await asyncio.sleep(0.01)
+        self.assertEqual(gate.done, [0, 3, 4])
+        self.assertEqual(scheduler.dropped, 2)
+
+    async def test_max_total_high_first(self) -> None:
+        scheduler = DispatchScheduler(max_in_flight=4, max_total=1)
+        scheduler.set_priority("main", Priority.HIGH)
+        gate = _Gate()
+        for i in range(3):
+            scheduler.submit("tl", gate, i)
+        scheduler.submit("main", gate, 100)
+        await asyncio.sleep(0.01)
+        # 全体で一つしか実行されない
+        self.assertEqual(gate.started, [0])
+        gate.opened.set()
+        await gate.wait_done(4)
+        # 空いたらHIGHが先
+        self.assertEqual(gate.done, [0, 100, 1, 2])
+
+    async def test_cancel(self) -> None:
+        scheduler, gate = await self._submit(OverflowPolicy.BLOCK)
+        scheduler.cancel()
+        self.assertEqual(scheduler.pending, 0)
+        await asyncio.sleep(0.01)
+        self.assertEqual(gate.done, [])
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            DispatchScheduler(max_in_flight=0)
+        with self.assertRaises(ValueError):
+            DispatchScheduler(overflow="wait")
+        with self.assertRaises(ValueError):
+            DispatchScheduler(weights={Priority.NORMAL: 1})
+        with self.assertRaises(ValueError):
+            DispatchScheduler().set_priority("tl", "urgent")
+
+
+class TestPriorityFlood(unittest.IsolatedAsyncioTestCase):
+    """タイムラインが詰まっていてもmainのHIGHが先に読まれる"""
+
+    async def asyncSetUp(self) -> None:
+        self.server = StreamingServer()
+        await self.server.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.stop()
+
+    async def test_mention_not_stuck_behind_flood(self) -> None:
+        scheduler = DispatchScheduler(max_in_flight=1, queue_size=4, max_total=2)
+        brm = Bromine(self.server.instance, secure_connect=False, scheduler=scheduler, reconnect_policy=FixedDelay(0.0))
+        handled = 0
+        mentioned_after: list[int] = []
+        mentioned = asyncio.Event()
+
+        async def timeline(body: dict) -> None:
+            nonlocal handled
+            await asyncio.sleep(0.02)
+            handled += 1
+
+        async def main_channel(body: dict) -> None:
+            mentioned_after.append(handled)
+            mentioned.set()
+
+        brm.ws_connect("localTimeline", timeline)
+        brm.ws_connect("main", main_channel, priority=Priority.HIGH)
+        task = asyncio.create_task(brm.main())
+        try:
+            await asyncio.wait_for(self.server.wait_subscribers("localTimeline", 1), 5)
+            await asyncio.wait_for(self.server.wait_subscribers("main", 1), 5)
+            frames = synthetic(100)
+            frames.append((0.0, "main", {"type": "mention", "body": frames[0][2]["body"]}))
+            await self.server.replay(frames)
+            await asyncio.wait_for(mentioned.wait(), 5)
+            # 溜まっているタイムラインの分は後回しで取っておかれている
+            self.assertGreater(scheduler.parked, 0)
+        finally:
+            task.cancel()
+        # 100個全部(2秒)を待たずに渡された
+        self.assertLess(mentioned_after[0], 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import asyncio
+import unittest
+from typing import Any, Hashable
+
+from brcore import Bromine
+from brcore.enum import CircuitState
+from brcore.guard import HandlerGuard
+from brcore.reconnect import FixedDelay
+
+from benchmarks.recording import synthetic
+from benchmarks.server import StreamingServer
+
+
+async def _fail(arg: Any) -> None:
+    raise RuntimeError(arg)
+
+
+async def _ok(arg: Any) -> None:
+    pass
+
+
+class TestCircuit(unittest.IsolatedAsyncioTestCase):
+    """閉じている→開いている→半開き→閉じているの移り変わり"""
+
+    def _guard(self, **kwargs: Any) -> HandlerGuard:
+        return HandlerGuard(**{"window": 4, "min_calls": 4, "cooldown": 0.05, **kwargs})
+
+    async def _open(self, guard: HandlerGuard, key: Hashable = "tl") -> None:
+        for i in range(4):
+            self.assertTrue(guard.allow(key))
+            await guard.run(key, _fail, i)
+        self.assertEqual(guard.state(key), CircuitState.OPEN)
+
+    async def test_open_sheds(self) -> None:
+        guard = self._guard()
+        await self._open(guard)
+        self.assertFalse(guard.allow("tl"))
+        self.assertEqual(guard.shed_counts, {"tl": 1})
+        self.assertEqual(guard.errors, 4)
+        self.assertEqual(guard.open_keys, ("tl",))
+        # 他の識別idには関係ない
+        self.assertTrue(guard.allow("main"))
+
+    async def test_half_open_success_closes(self) -> None:
+        guard = self._guard()
+        await self._open(guard)
+        await asyncio.sleep(0.06)
+        self.assertTrue(guard.allow("tl"))
+        self.assertEqual(guard.state("tl"), CircuitState.HALF_OPEN)
+        # 試しに渡すのは一つだけ
+        self.assertFalse(guard.allow("tl"))
+        await guard.run("tl", _ok, None)
+        self.assertEqual(guard.state("tl"), CircuitState.CLOSED)
+        self.assertTrue(guard.allow("tl"))
+
+    async def test_half_open_failure_reopens(self) -> None:
+        guard = self._guard()
+        await self._open(guard)
+        await asyncio.sleep(0.06)
+        self.assertTrue(guard.allow("tl"))
+        await guard.run("tl", _fail, None)
+        self.assertEqual(guard.state("tl"), CircuitState.OPEN)
+        self.assertFalse(guard.allow("tl"))
+
+    async def test_lost_trial_is_retried(self) -> None:
+        guard = self._guard()
+        await self._open(guard)
+        await asyncio.sleep(0.06)
+        # 試しに渡したものが実行されなかった
+        self.assertTrue(guard.allow("tl"))
+        self.assertFalse(guard.allow("tl"))
+        await asyncio.sleep(0.06)
+        self.assertTrue(guard.allow("tl"))
+
+    async def test_timeout_and_slow_count_as_failures(self) -> None:
+        errors: list[BaseException] = []
+
+        async def on_error(key: Hashable, arg: Any, error: BaseException) -> None:
+            errors.append(error)
+
+        async def slow(arg: Any) -> None:
+            await asyncio.sleep(arg)
+
+        guard = self._guard(timeout=0.02, slow_threshold=0.01, on_error=on_error)
+        await guard.run("tl", slow, 1.0)
+        self.assertIsInstance(errors[0], asyncio.TimeoutError)
+        for _ in range(3):
+            await guard.run("tl", slow, 0.015)
+        # タイムアウト1回と遅すぎるの3回で開く
+        self.assertEqual(guard.state("tl"), CircuitState.OPEN)
+        self.assertEqual(len(errors), 1)
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            HandlerGuard(failure_rate=1.5)
+        with self.assertRaises(ValueError):
+            HandlerGuard(timeout=0)
+        with self.assertRaises(TypeError):
+            HandlerGuard(on_error=lambda *args: None)
+
+
+class TestGuardedBromine(unittest.IsolatedAsyncioTestCase):
+    """ローカルのstreamingサーバーから来た情報で開く"""
+
+    async def asyncSetUp(self) -> None:
+        self.server = StreamingServer()
+        await self.server.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.stop()
+
+    async def test_failing_channel_is_shed(self) -> None:
+        guard = HandlerGuard(window=5, min_calls=5, cooldown=60)
+        brm = Bromine(self.server.instance, secure_connect=False, guard=guard, reconnect_policy=FixedDelay(0.0))
+        calls = 0
+
+        async def handler(body: dict) -> None:
+            nonlocal calls
+            calls += 1
+            raise RuntimeError("broken")
+
+        id = brm.ws_connect("localTimeline", handler)
+        task = asyncio.create_task(brm.main())
+        try:
+            await asyncio.wait_for(self.server.wait_subscribers("localTimeline", 1), 5)
+            # 前のハンドラーの結果が出てから次が届くように間隔を空ける
+            await self.server.replay(synthetic(50), rate=200)
+
+            async def _shed() -> None:
+                while calls + guard.shed < 50:
+                    await asyncio.sleep(0.01)
+            await asyncio.wait_for(_shed(), 5)
+        finally:
+            task.cancel()
+        self.assertEqual(guard.state(("channel", id)), CircuitState.OPEN)
+        # 開いた時に実行中だった分は渡されることがある
+        self.assertGreaterEqual(calls, 5)
+        self.assertLess(calls, 10)
+        self.assertEqual(guard.shed, 50 - calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
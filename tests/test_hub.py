@@ -0,0 +1,92 @@
+import asyncio
+import os
+import struct
+import tempfile
+import unittest
+
+from brcore import Bromine
+from brcore.hub import BromineHub, HubClient
+from brcore.reconnect import FixedDelay
+
+from benchmarks.server import StreamingServer
+
+
+def _pack(message: bytes) -> bytes:
+    return struct.pack(">I", len(message)) + message
+
+
+async def _wait_for(predicate, timeout: float = 5.0) -> None:
+    async def _loop() -> None:
+        while not predicate():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(_loop(), timeout)
+
+
+class TestHub(unittest.IsolatedAsyncioTestCase):
+    """ローカルのstreamingサーバーに繋いだBromineHubに購読者を繋ぐ"""
+
+    async def asyncSetUp(self) -> None:
+        self.server = StreamingServer()
+        await self.server.start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "hub.sock")
+        self.brm = Bromine(self.server.instance, secure_connect=False, reconnect_policy=FixedDelay(0.0))
+        self.hub = BromineHub(self.brm, self.path)
+        self.tasks: list[asyncio.Task] = []
+
+    async def asyncTearDown(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.server.stop()
+        self.tmp.cleanup()
+
+    async def test_bad_command_keeps_session(self) -> None:
+        self.tasks.append(asyncio.create_task(self.hub.main()))
+        await _wait_for(lambda: os.path.exists(self.path))
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        # 壊れた命令の後に普通の命令を送る
+        writer.write(_pack(b'{"id": "x"}'))
+        writer.write(_pack(b'{"op": "connect", "channel": "localTimeline", "params": {}}'))
+        writer.write(_pack(b'{"op": "subnote", "id": "n1"}'))
+        size, = struct.unpack(">I", await asyncio.wait_for(reader.readexactly(4), 5))
+        self.assertIn(b"hubError", await reader.readexactly(size))
+        await _wait_for(lambda: self.hub.subscriptions == 2)
+        self.assertEqual(self.hub.clients, 1)
+        writer.close()
+
+    async def test_share_existing_capture(self) -> None:
+        owner: list[dict] = []
+        shared: list[dict] = []
+
+        async def on_owner(body: dict) -> None:
+            owner.append(body)
+
+        async def on_shared(body: dict) -> None:
+            shared.append(body)
+
+        # Bromine側でもうキャプチャしているノートを購読者もキャプチャする
+        self.brm.ws_subnote("n1", on_owner)
+        client = HubClient(self.path, cooltime=0.05)
+        client.ws_subnote("n1", on_shared)
+        self.tasks.append(asyncio.create_task(self.hub.main()))
+        await _wait_for(lambda: os.path.exists(self.path))
+        self.tasks.append(asyncio.create_task(client.main()))
+        await _wait_for(lambda: self.hub.subscriptions == 1 and self.hub.clients == 1)
+        await asyncio.wait_for(self.server.wait_received("subNote", 1), 5)
+
+        update = {"type": "noteUpdated", "body": {"id": "n1", "type": "reacted", "body": {"reaction": "👍"}}}
+        await self.server.replay([(0.0, None, update)])
+        await _wait_for(lambda: owner and shared)
+
+        # 購読者がやめてもBromine側のキャプチャはそのまま
+        client.ws_unsubnote("n1")
+        await _wait_for(lambda: self.hub.subscriptions == 0)
+        await self.server.replay([(0.0, None, update)])
+        await _wait_for(lambda: len(owner) == 2)
+        self.assertEqual(len(shared), 1)
+        self.assertEqual(self.server.received.get("unsubNote", 0), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import tempfile
+import unittest
+
+from brcore import Bromine
+from brcore.journal import Journal
+from brcore.reconnect import FixedDelay
+
+from benchmarks.server import StreamingServer
+
+
+def _frame(id: str, index: int) -> str:
+    note = {"id": f"n{index:04d}", "text": str(index)}
+    return json.dumps({"type": "channel", "body": {"id": id, "type": "note", "body": note}})
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_resume_after_restart(self) -> None:
+        journal = Journal(self.tmp.name, segment_size=256)
+        for i in range(10):
+            journal.append(_frame("tl", i))
+        self.assertEqual(len(journal.read(4)), 4)
+        journal.commit()
+        journal.close()
+
+        # 再起動したら続きから(セグメントをまたいでも)取り出せる
+        journal = Journal(self.tmp.name, segment_size=256)
+        self.assertTrue(journal.pending)
+        frames = journal.read(100)
+        self.assertEqual([json.loads(i)["body"]["body"]["text"] for i in frames], [str(i) for i in range(4, 10)])
+        journal.commit()
+        self.assertFalse(journal.pending)
+        journal.close()
+
+    def test_partial_commit(self) -> None:
+        journal = Journal(self.tmp.name)
+        for i in range(10):
+            journal.append(_frame("tl", i))
+        journal.read(6)
+        # 振り分けたのは先頭の2個だけ
+        journal.commit(2)
+        journal.close()
+
+        journal = Journal(self.tmp.name)
+        frames = journal.read(100)
+        self.assertEqual(json.loads(frames[0])["body"]["body"]["text"], "2")
+        self.assertEqual(len(frames), 8)
+        journal.close()
+
+    def test_bind_once(self) -> None:
+        journal = Journal(self.tmp.name)
+        journal.bind(object())
+        with self.assertRaises(ValueError):
+            journal.bind(object())
+        journal.close()
+
+
+class TestJournalDrain(unittest.IsolatedAsyncioTestCase):
+    """Bromineのメイン関数で取り出している途中に止める"""
+
+    async def asyncSetUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = StreamingServer()
+        await self.server.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.stop()
+        self.tmp.cleanup()
+
+    async def test_cancel_mid_batch_keeps_rest(self) -> None:
+        journal = Journal(self.tmp.name)
+        for i in range(10):
+            journal.append(_frame("tl", i))
+        brm = Bromine(self.server.instance, secure_connect=False, journal=journal, reconnect_policy=FixedDelay(0.0))
+        # 読まないストリームなので2個入ったら取り出すのが止まる
+        stream = brm.stream("localTimeline", maxsize=2, id="tl")
+        task = asyncio.create_task(brm.main())
+
+        async def _filled() -> None:
+            while len(stream) < 2:
+                await asyncio.sleep(0.01)
+        await asyncio.wait_for(_filled(), 5)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        # 渡せなかった3個目からは次に起動した時に取り出される
+        journal = Journal(self.tmp.name)
+        frames = journal.read(100)
+        self.assertEqual([json.loads(i)["body"]["body"]["text"] for i in frames], [str(i) for i in range(2, 10)])
+        journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
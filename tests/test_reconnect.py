@@ -0,0 +1,187 @@
+import asyncio
+import unittest
+from http import HTTPStatus
+from typing import Any, Optional
+
+from brcore import Bromine
+from brcore.reconnect import ExponentialBackoff, FixedDelay, ReconnectGiveUp
+
+from benchmarks.server import StreamingServer
+
+
+class _Recorder:
+    """on_retryとon_give_upに渡された引数を記録するやつ"""
+
+    def __init__(self) -> None:
+        self.retries: list[tuple[int, float]] = []
+        self.give_ups: list[int] = []
+        self.retried = asyncio.Event()
+
+    async def on_retry(self, attempt: int, delay: float, error: Optional[BaseException]) -> None:
+        self.retries.append((attempt, delay))
+        self.retried.set()
+
+    async def on_give_up(self, attempt: int, error: Optional[BaseException]) -> None:
+        self.give_ups.append(attempt)
+
+    async def wait_retries(self, count: int) -> tuple[int, float]:
+        """count回目のon_retryまで待って、その引数を返す"""
+        while len(self.retries) < count:
+            self.retried.clear()
+            await asyncio.wait_for(self.retried.wait(), 5)
+        return self.retries[count - 1]
+
+
+async def _async_noop(body: dict) -> None:
+    pass
+
+
+class TestExponentialBackoff(unittest.TestCase):
+    def test_growth(self) -> None:
+        policy = ExponentialBackoff(base=0.5, factor=2.0, cap=5.0, jitter=False)
+        self.assertEqual([policy.delay(i) for i in range(1, 7)], [0.5, 1.0, 2.0, 4.0, 5.0, 5.0])
+
+    def test_huge_attempt_is_capped(self) -> None:
+        policy = ExponentialBackoff(base=1.0, cap=60.0, jitter=False)
+        self.assertEqual(policy.delay(10000), 60.0)
+
+    def test_jitter_bounds(self) -> None:
+        policy = ExponentialBackoff(base=1.0, factor=2.0, cap=10.0, jitter=True)
+        for attempt, upper in ((1, 1.0), (3, 4.0), (8, 10.0)):
+            delays = [policy.delay(attempt) for _ in range(500)]
+            self.assertTrue(all(0 <= delay <= upper for delay in delays))
+            # 全部同じ値にはならない
+            self.assertGreater(len(set(delays)), 1)
+
+    def test_give_up(self) -> None:
+        policy = ExponentialBackoff(max_attempts=3, jitter=False)
+        self.assertIsNotNone(policy.delay(3))
+        self.assertIsNone(policy.delay(4))
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            ExponentialBackoff(base=0)
+        with self.assertRaises(TypeError):
+            ExponentialBackoff(on_retry=lambda *args: None)
+
+
+class TestFixedDelay(unittest.TestCase):
+    def test_long_delay(self) -> None:
+        policy = FixedDelay(1.0, long_delay=30, long_after=2)
+        self.assertEqual([policy.delay(i) for i in range(1, 5)], [1.0, 1.0, 31.0, 31.0])
+
+    def test_give_up(self) -> None:
+        policy = FixedDelay(1.0, max_attempts=2)
+        self.assertIsNone(policy.delay(3))
+
+
+class TestPolicyWait(unittest.IsolatedAsyncioTestCase):
+    async def test_give_up_raises(self) -> None:
+        recorder = _Recorder()
+        policy = FixedDelay(0.0, max_attempts=1, on_retry=recorder.on_retry, on_give_up=recorder.on_give_up)
+        await policy.wait(1)
+        error = OSError("refused")
+        with self.assertRaises(ReconnectGiveUp) as cm:
+            await policy.wait(2, error)
+        self.assertEqual(cm.exception.attempts, 2)
+        self.assertIs(cm.exception.__cause__, error)
+        self.assertEqual(recorder.retries, [(1, 0.0)])
+        self.assertEqual(recorder.give_ups, [2])
+
+
+class TestReconnect(unittest.IsolatedAsyncioTestCase):
+    """ローカルのstreamingサーバーに対して再接続する"""
+
+    async def asyncSetUp(self) -> None:
+        self.server = StreamingServer()
+        await self.server.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.stop()
+
+    def _bromine(self, policy: ExponentialBackoff) -> Bromine:
+        brm = Bromine(self.server.instance, secure_connect=False, reconnect_policy=policy)
+        brm.ws_connect("localTimeline", _async_noop)
+        return brm
+
+    async def test_backoff_grows_while_down(self) -> None:
+        recorder = _Recorder()
+        policy = ExponentialBackoff(base=0.01, factor=2.0, cap=0.04, jitter=False, on_retry=recorder.on_retry)
+        brm = self._bromine(policy)
+        await self.server.stop()
+        task = asyncio.create_task(brm.main())
+        try:
+            await recorder.wait_retries(4)
+        finally:
+            task.cancel()
+        self.assertEqual(recorder.retries[:4], [(1, 0.01), (2, 0.02), (3, 0.04), (4, 0.04)])
+
+    async def test_give_up_stops_main(self) -> None:
+        recorder = _Recorder()
+        policy = ExponentialBackoff(base=0.01, max_attempts=2, jitter=False,
+                                    on_retry=recorder.on_retry, on_give_up=recorder.on_give_up)
+        brm = self._bromine(policy)
+        await self.server.stop()
+        with self.assertRaises(ReconnectGiveUp):
+            await asyncio.wait_for(brm.main(), 5)
+        self.assertEqual([attempt for attempt, _ in recorder.retries], [1, 2])
+        self.assertEqual(recorder.give_ups, [3])
+
+    async def test_retry_on_5xx(self) -> None:
+        # 再起動中のインスタンスみたいに最初の何回かは502と503を返す
+        statuses = [HTTPStatus.BAD_GATEWAY, HTTPStatus.SERVICE_UNAVAILABLE]
+
+        def process_request(connection: Any, request: Any) -> Any:
+            if statuses:
+                return connection.respond(statuses.pop(0), "restarting\n")
+            return None
+
+        await self.server.stop()
+        self.server = StreamingServer(process_request=process_request)
+        await self.server.start()
+        recorder = _Recorder()
+        policy = ExponentialBackoff(base=0.01, jitter=False, on_retry=recorder.on_retry)
+        brm = self._bromine(policy)
+        task = asyncio.create_task(brm.main())
+        try:
+            await asyncio.wait_for(self.server.wait_subscribers("localTimeline", 1), 5)
+        finally:
+            task.cancel()
+        self.assertEqual([attempt for attempt, _ in recorder.retries], [1, 2])
+
+    async def test_raise_on_4xx(self) -> None:
+        def process_request(connection: Any, request: Any) -> Any:
+            return connection.respond(HTTPStatus.UNAUTHORIZED, "invalid token\n")
+
+        await self.server.stop()
+        self.server = StreamingServer(process_request=process_request)
+        await self.server.start()
+        recorder = _Recorder()
+        brm = self._bromine(ExponentialBackoff(base=0.01, jitter=False, on_retry=recorder.on_retry))
+        with self.assertRaises(Exception) as cm:
+            await asyncio.wait_for(brm.main(), 5)
+        self.assertEqual(cm.exception.response.status_code, 401)
+        self.assertEqual(recorder.retries, [])
+
+    async def test_reset_after_success(self) -> None:
+        recorder = _Recorder()
+        policy = ExponentialBackoff(base=0.05, factor=2.0, cap=0.2, jitter=False, on_retry=recorder.on_retry)
+        brm = self._bromine(policy)
+        await self.server.stop()
+        task = asyncio.create_task(brm.main())
+        try:
+            # 落ちている間は失敗が続く
+            self.assertEqual((await recorder.wait_retries(2))[0], 2)
+            # 立ち上がったら接続して購読し直す
+            await self.server.start()
+            await asyncio.wait_for(self.server.wait_subscribers("localTimeline", 1), 5)
+            # 接続に成功した後に切れたら一回目からやり直す
+            connected_at = len(recorder.retries)
+            await self.server.drop_connections()
+            self.assertEqual(await recorder.wait_retries(connected_at + 1), (1, 0.05))
+        finally:
+            task.cancel()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+import unittest
+
+from brcore import Bromine
+from brcore.enum import ExceptionTexts
+from brcore.reconnect import FixedDelay
+from brcore.routing import ALLMATCH, RoutingTable
+
+from benchmarks.recording import synthetic
+from benchmarks.server import StreamingServer
+
+
+async def _async_noop(body: dict) -> None:
+    pass
+
+
+class TestRoutingTable(unittest.TestCase):
+    def test_lookup(self) -> None:
+        table = RoutingTable()
+        route = table.add("channel", "a", _async_noop)
+        self.assertIs(table.lookup("channel", "a"), route)
+        self.assertIs(table.get("channel", "a"), route)
+        # type情報が違う物には振り分けない
+        self.assertIsNone(table.lookup("noteUpdated", "a"))
+        self.assertIsNone(table.lookup("channel", "b"))
+        self.assertEqual(len(table), 1)
+
+    def test_wildcard(self) -> None:
+        table = RoutingTable()
+        route = table.add("channel", "a", _async_noop)
+        wildcard = table.add("emojiAdded", ALLMATCH, _async_noop)
+        self.assertIs(table.lookup("emojiAdded", None), wildcard)
+        self.assertIs(table.lookup("emojiAdded", "a"), wildcard)
+        self.assertIs(table.lookup("channel", "a"), route)
+        # getはワイルドカードに振り分けない
+        self.assertIsNone(table.get("emojiAdded", "a"))
+        self.assertIs(table.get("emojiAdded", ALLMATCH), wildcard)
+        table.remove("emojiAdded", ALLMATCH)
+        self.assertIsNone(table.lookup("emojiAdded", None))
+
+    def test_shadowed(self) -> None:
+        table = RoutingTable()
+        channel = table.add("channel", "same", _async_noop)
+        note = table.add("noteUpdated", "same", _async_noop)
+        self.assertIs(table.lookup("channel", "same"), channel)
+        self.assertIs(table.lookup("noteUpdated", "same"), note)
+        self.assertEqual(set(table), {channel, note})
+
+    def test_remove_shadowing(self) -> None:
+        table = RoutingTable()
+        table.add("channel", "same", _async_noop)
+        note = table.add("noteUpdated", "same", _async_noop)
+        # 先に登録した方を消しても後の方は残る
+        table.remove("channel", "same")
+        self.assertIsNone(table.lookup("channel", "same"))
+        self.assertIs(table.lookup("noteUpdated", "same"), note)
+        # 消した方はもう一度登録できる
+        channel = table.add("channel", "same", _async_noop)
+        self.assertIs(table.lookup("channel", "same"), channel)
+        self.assertIs(table.lookup("noteUpdated", "same"), note)
+        self.assertEqual(len(table), 2)
+
+    def test_remove_shadowed(self) -> None:
+        table = RoutingTable()
+        channel = table.add("channel", "same", _async_noop)
+        table.add("noteUpdated", "same", _async_noop)
+        table.remove("noteUpdated", "same")
+        self.assertIsNone(table.lookup("noteUpdated", "same"))
+        self.assertIs(table.lookup("channel", "same"), channel)
+        self.assertEqual(len(table), 1)
+
+    def test_invalid(self) -> None:
+        table = RoutingTable()
+        table.add("channel", "a", _async_noop)
+        with self.assertRaises(ValueError) as cm:
+            table.add("channel", "a", _async_noop)
+        self.assertEqual(str(cm.exception), ExceptionTexts.ID_ALREADY_RESERVED)
+        with self.assertRaises(ValueError) as cm:
+            table.remove("noteUpdated", "a")
+        self.assertEqual(str(cm.exception), ExceptionTexts.TYPE_INVALID)
+        with self.assertRaises(ValueError) as cm:
+            table.remove("channel", "b")
+        self.assertEqual(str(cm.exception), ExceptionTexts.ID_INVALID)
+        # 一度消したら識別idが不適
+        table.remove("channel", "a")
+        with self.assertRaises(ValueError) as cm:
+            table.remove("channel", "a")
+        self.assertEqual(str(cm.exception), ExceptionTexts.ID_INVALID)
+
+
+class TestSharedId(unittest.IsolatedAsyncioTestCase):
+    """チャンネルの識別idとキャプチャしたノートIDが同じでも別々に振り分ける"""
+
+    async def asyncSetUp(self) -> None:
+        self.server = StreamingServer()
+        await self.server.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.stop()
+
+    async def test_channel_and_note_share_id(self) -> None:
+        brm = Bromine(self.server.instance, secure_connect=False, reconnect_policy=FixedDelay(0.0))
+        channel: list[dict] = []
+        updated: list[dict] = []
+        arrived = asyncio.Event()
+
+        async def on_channel(body: dict) -> None:
+            channel.append(body)
+            arrived.set()
+
+        async def on_updated(body: dict) -> None:
+            updated.append(body)
+            arrived.set()
+
+        brm.ws_connect("localTimeline", on_channel, id="same")
+        brm.ws_subnote("same", on_updated)
+        reacted = {"type": "noteUpdated", "body": {"id": "same", "type": "reacted", "body": {"reaction": "👍"}}}
+
+        async def _wait(items: list[dict], count: int) -> None:
+            while len(items) < count:
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(brm.main())
+        try:
+            await asyncio.wait_for(self.server.wait_subscribers("localTimeline", 1), 5)
+            await asyncio.wait_for(self.server.wait_received("subNote", 1), 5)
+            await self.server.replay([*synthetic(1), (0.0, None, reacted)])
+            await asyncio.wait_for(_wait(channel, 1), 5)
+            await asyncio.wait_for(_wait(updated, 1), 5)
+            self.assertEqual(channel[0]["type"], "note")
+            self.assertEqual(updated[0]["type"], "reacted")
+
+            # チャンネルから切断してもキャプチャは続く
+            brm.ws_disconnect("same")
+            await asyncio.wait_for(self.server.wait_received("disconnect", 1), 5)
+            await self.server.replay([(0.0, None, reacted)])
+            await asyncio.wait_for(_wait(updated, 2), 5)
+        finally:
+            task.cancel()
+        self.assertEqual(len(channel), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()